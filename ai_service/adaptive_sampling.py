@@ -0,0 +1,165 @@
+"""
+Adaptive Sampling - Frame sampling driven by scene activity
+Samples quiet stretches sparsely and densifies around change points, so
+inference is spent where incidents happen
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+ADAPTIVE_SAMPLING = os.getenv('ADAPTIVE_SAMPLING', 'false').lower() == 'true'
+ADAPTIVE_STRIDE_FACTOR = int(os.getenv('ADAPTIVE_STRIDE_FACTOR', 4))  # stride range: frame_skip / 4 .. frame_skip * 4
+ADAPTIVE_MOTION_TRIGGER = float(os.getenv('ADAPTIVE_MOTION_TRIGGER', 0.05))  # changed fraction forcing a sample
+ADAPTIVE_QUIET_MOTION = float(os.getenv('ADAPTIVE_QUIET_MOTION', 0.01))  # changed fraction counted as quiet
+ADAPTIVE_COUNT_CHANGE = int(os.getenv('ADAPTIVE_COUNT_CHANGE', 2))  # vehicle-count jump marking a change point
+ADAPTIVE_SEGMENT_SECONDS = float(os.getenv('ADAPTIVE_SEGMENT_SECONDS', 1.0))
+MOTION_THUMBNAIL = (64, 36)  # motion energy is computed on a tiny grey frame
+MOTION_PIXEL_THRESHOLD = 25  # grey-level change counted as motion
+
+
+def motion_thumbnail(frame: np.ndarray) -> np.ndarray:
+    """Tiny greyscale version of a frame for motion energy"""
+    return cv2.cvtColor(cv2.resize(frame, MOTION_THUMBNAIL, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+
+def motion_energy(thumbnail: np.ndarray, reference: np.ndarray) -> float:
+    """Fraction of the thumbnail that changed since the reference"""
+    return float(np.mean(cv2.absdiff(thumbnail, reference) > MOTION_PIXEL_THRESHOLD))
+
+
+class AdaptiveSampler:
+    """
+    Chooses which decoded frames of a video are analyzed.
+
+    Every decoded frame is compared (as a tiny grey thumbnail) with the last
+    analyzed frame. A frame is analyzed when the stride has elapsed, or
+    earlier when enough of the scene changed (motion trigger).
+
+    After each analyzed frame the stride adapts:
+    - a vehicle-count jump of ADAPTIVE_COUNT_CHANGE is a change point: the
+      stride drops to its minimum
+    - a quiet scene (little motion, same count) doubles the stride up to its
+      maximum
+    - otherwise the stride moves back towards frame_skip
+
+    Decoded and analyzed frames are counted per ADAPTIVE_SEGMENT_SECONDS
+    segment, giving the sampling density over the video.
+    """
+
+    def __init__(
+        self,
+        frame_skip: int,
+        fps: float,
+        start_frame: int = 0,
+        stride_factor: int = ADAPTIVE_STRIDE_FACTOR,
+        motion_trigger: float = ADAPTIVE_MOTION_TRIGGER,
+        quiet_motion: float = ADAPTIVE_QUIET_MOTION,
+        count_change: int = ADAPTIVE_COUNT_CHANGE,
+        segment_seconds: float = ADAPTIVE_SEGMENT_SECONDS
+    ):
+        stride_factor = max(1, stride_factor)
+        self.base_stride = max(1, frame_skip)
+        self.min_stride = max(1, self.base_stride // stride_factor)
+        self.max_stride = self.base_stride * stride_factor
+        self.stride = self.base_stride
+        self.fps = fps
+        self.start_frame = start_frame
+        self.motion_trigger = motion_trigger
+        self.quiet_motion = quiet_motion
+        self.count_change = count_change
+        self.segment_frames = max(1, int(round(segment_seconds * fps)))
+
+        self._next_sample = start_frame
+        self._last_sampled: Optional[int] = None
+        self._reference: Optional[np.ndarray] = None
+        self._thumbnail: Optional[np.ndarray] = None
+        self._motion = 0.0
+        self._last_count: Optional[int] = None
+        self._segments: Dict[int, Dict] = {}
+        self.change_points: List[int] = []
+        self.motion_triggered = 0
+
+    def due(self, frame: np.ndarray, frame_index: int) -> bool:
+        """Call for every decoded frame; True if it should be analyzed"""
+        segment = self._segment(frame_index)
+        segment['frames'] += 1
+
+        self._thumbnail = motion_thumbnail(frame)
+        if self._reference is None:
+            self._motion = 0.0
+            return frame_index >= self._next_sample
+        self._motion = motion_energy(self._thumbnail, self._reference)
+        segment['peak_motion'] = max(segment['peak_motion'], self._motion)
+
+        if frame_index >= self._next_sample:
+            return True
+        if (self._motion >= self.motion_trigger
+                and frame_index - self._last_sampled >= self.min_stride):
+            self.motion_triggered += 1
+            return True
+        return False
+
+    def advance(self, frame_index: int, vehicle_count: Optional[int], scale: int = 1):
+        """
+        Call after analyzing a frame.
+
+        Args:
+            frame_index: The analyzed frame
+            vehicle_count: Vehicles found, None if the frame yielded no analysis
+            scale: Extra stride multiplier (the scheduler's load shedding)
+        """
+        self._segment(frame_index)['sampled'] += 1
+
+        if vehicle_count is not None:
+            changed = (self._last_count is not None
+                       and abs(vehicle_count - self._last_count) >= self.count_change)
+            if changed:
+                self.stride = self.min_stride
+                self.change_points.append(frame_index)
+            elif self._motion < self.quiet_motion and vehicle_count == self._last_count:
+                self.stride = min(self.max_stride, self.stride * 2)
+            elif self.stride < self.base_stride:
+                self.stride = min(self.base_stride, self.stride * 2)
+            elif self.stride > self.base_stride:
+                self.stride = max(self.base_stride, self.stride // 2)
+            self._last_count = vehicle_count
+
+        self._reference = self._thumbnail
+        self._last_sampled = frame_index
+        self._next_sample = frame_index + self.stride * max(1, scale)
+
+    def _segment(self, frame_index: int) -> Dict:
+        index = (frame_index - self.start_frame) // self.segment_frames
+        if index not in self._segments:
+            self._segments[index] = {'frames': 0, 'sampled': 0, 'peak_motion': 0.0}
+        return self._segments[index]
+
+    def report(self) -> Dict:
+        """Sampling summary with the per-segment density record"""
+        segments = []
+        for index in sorted(self._segments):
+            segment = self._segments[index]
+            first = self.start_frame + index * self.segment_frames
+            segments.append({
+                'start': round(first / self.fps, 2),
+                'end': round((first + segment['frames']) / self.fps, 2),
+                'frames': segment['frames'],
+                'sampled': segment['sampled'],
+                'density': round(segment['sampled'] / segment['frames'], 3) if segment['frames'] else 0.0,
+                'peak_motion': round(segment['peak_motion'], 3),
+            })
+        return {
+            'mode': 'adaptive',
+            'min_stride': self.min_stride,
+            'max_stride': self.max_stride,
+            'change_points': [round(i / self.fps, 2) for i in self.change_points],
+            'motion_triggered': self.motion_triggered,
+            'segments': segments,
+        }
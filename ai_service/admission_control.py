@@ -0,0 +1,221 @@
+"""
+Admission Control - Load shedding for analysis requests
+Estimates the work an upload adds and rejects it with a Retry-After
+estimate when the node is already saturated
+"""
+
+import math
+import os
+import threading
+from typing import Dict, Optional, Any
+
+import cv2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+MAX_VIDEO_DURATION = float(os.getenv('MAX_VIDEO_DURATION', 30))  # seconds
+MAX_INFLIGHT_ANALYSES = int(os.getenv('MAX_INFLIGHT_ANALYSES', 8))
+MAX_QUEUED_FRAMES = int(os.getenv('MAX_QUEUED_FRAMES', 64))
+MAX_BACKLOG_SECONDS = float(os.getenv('MAX_BACKLOG_SECONDS', 120))
+DEFAULT_FRAME_COST = float(os.getenv('DEFAULT_FRAME_COST', 0.08))  # seconds per analyzed frame
+DECODE_COST_PER_MEGAPIXEL = 0.002  # seconds to decode one 1 MP frame
+# Stages making up frame_cost; decoding is estimated separately from the resolution
+FRAME_COST_STAGES = ('preprocess', 'inference', 'postprocess')
+MAX_RETRY_AFTER = 300  # seconds
+
+
+class AdmissionRejected(Exception):
+    """Raised when an analysis should be shed; carries the HTTP status and Retry-After"""
+
+    def __init__(self, detail: str, status_code: int = 429, retry_after: Optional[int] = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+
+
+def probe_video(video_path: str) -> Dict[str, Any]:
+    """
+    Read container metadata without decoding frames.
+
+    Returns:
+        dict with frames, fps, duration, width, height
+
+    Raises:
+        ValueError: If the video cannot be opened
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video file: {video_path}")
+    try:
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        cap.release()
+
+    return {
+        'frames': frames,
+        'fps': fps,
+        'duration': frames / fps if fps > 0 else 0.0,
+        'width': width,
+        'height': height,
+    }
+
+
+class AdmissionTicket:
+    """An admitted analysis and the work it was estimated to cost"""
+
+    def __init__(self, lane: str, estimated_seconds: float, sampled_frames: int):
+        self.lane = lane
+        self.estimated_seconds = estimated_seconds
+        self.sampled_frames = sampled_frames
+        self.released = False
+
+
+class AdmissionController:
+    """
+    Decides whether a new analysis may start.
+
+    Three signals are checked: analyses in flight, frames already queued
+    on the inference scheduler, and the estimated seconds of work admitted
+    but not finished. The per-frame cost estimate is learned from
+    completed analyses.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        inference_workers: int,
+        max_inflight: int = MAX_INFLIGHT_ANALYSES,
+        max_queued_frames: int = MAX_QUEUED_FRAMES,
+        max_backlog_seconds: float = MAX_BACKLOG_SECONDS,
+        max_video_duration: float = MAX_VIDEO_DURATION
+    ):
+        self.scheduler = scheduler
+        self.inference_workers = max(1, inference_workers)
+        self.max_inflight = max_inflight
+        self.max_queued_frames = max_queued_frames
+        self.max_backlog_seconds = max_backlog_seconds
+        self.max_video_duration = max_video_duration
+
+        self.frame_cost = DEFAULT_FRAME_COST  # EWMA seconds per analyzed frame
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._backlog_seconds = 0.0
+        self.stats = {
+            'admitted': 0,
+            'rejected_capacity': 0,
+            'rejected_duration': 0,
+        }
+
+    def check_capacity(self):
+        """
+        Cheap pre-check before the upload is written to disk.
+
+        Raises:
+            AdmissionRejected: If in-flight or queued work is at its limit
+        """
+        with self._lock:
+            inflight = self._inflight
+            backlog = self._backlog_seconds
+        queued_frames = self._queued_frames()
+
+        if inflight >= self.max_inflight or queued_frames >= self.max_queued_frames:
+            self._reject_capacity(
+                f"AI service busy ({inflight} analyses in flight, {queued_frames} frames queued)",
+                backlog
+            )
+
+    def admit(self, lane: str, video: Dict[str, Any], frame_skip: int) -> AdmissionTicket:
+        """
+        Admit an analysis of a probed video or shed it.
+
+        Args:
+            lane: Scheduler lane the analysis will run in
+            video: Output of probe_video()
+            frame_skip: Sampling stride the analyzer will use
+
+        Raises:
+            AdmissionRejected: 413 for videos over MAX_VIDEO_DURATION,
+                429 with Retry-After when capacity is exceeded
+        """
+        if self.max_video_duration and video['duration'] > self.max_video_duration:
+            with self._lock:
+                self.stats['rejected_duration'] += 1
+            raise AdmissionRejected(
+                f"Video too long ({video['duration']:.1f}s). Maximum: {self.max_video_duration:.0f}s",
+                status_code=413
+            )
+
+        sampled_frames = math.ceil(video['frames'] / max(1, frame_skip))
+        estimate = self.estimate_seconds(video, sampled_frames)
+
+        with self._lock:
+            over_inflight = self._inflight >= self.max_inflight
+            # Always admit into an idle node, however large the video
+            over_backlog = self._inflight > 0 and self._backlog_seconds + estimate > self.max_backlog_seconds
+            if not (over_inflight or over_backlog):
+                self._inflight += 1
+                self._backlog_seconds += estimate
+                self.stats['admitted'] += 1
+                return AdmissionTicket(lane, estimate, sampled_frames)
+            backlog = self._backlog_seconds
+
+        self._reject_capacity(
+            f"AI service busy (~{backlog:.0f}s of analysis queued, this video needs ~{estimate:.0f}s)",
+            backlog
+        )
+
+    def release(self, ticket: AdmissionTicket, elapsed: Optional[float] = None,
+                frames_analyzed: Optional[int] = None):
+        """
+        Return an admitted ticket and learn from its measured cost (idempotent).
+
+        Args:
+            ticket: Ticket returned by admit()
+            elapsed: Seconds spent in the FRAME_COST_STAGES (not decoding,
+                which estimate_seconds() adds on its own)
+            frames_analyzed: Frames those seconds were spent on
+        """
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._inflight = max(0, self._inflight - 1)
+            self._backlog_seconds = max(0.0, self._backlog_seconds - ticket.estimated_seconds)
+            if elapsed and frames_analyzed:
+                self.frame_cost = 0.8 * self.frame_cost + 0.2 * (elapsed / frames_analyzed)
+
+    def estimate_seconds(self, video: Dict[str, Any], sampled_frames: int) -> float:
+        """Inference on sampled frames plus decoding every frame at its resolution"""
+        megapixels = video['width'] * video['height'] / 1e6
+        decode = video['frames'] * megapixels * DECODE_COST_PER_MEGAPIXEL
+        return sampled_frames * self.frame_cost + decode
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'inflight': self._inflight,
+                'backlog_seconds': round(self._backlog_seconds, 1),
+                'frame_cost_ms': round(self.frame_cost * 1000, 1),
+                'queued_frames': self._queued_frames(),
+            }
+
+    def _queued_frames(self) -> int:
+        lanes = self.scheduler.lane_status()
+        return sum(lane['queued_frames'] for lane in lanes.values())
+
+    def _reject_capacity(self, detail: str, backlog: float):
+        with self._lock:
+            self.stats['rejected_capacity'] += 1
+        # Time for the workers to drain what is already admitted
+        retry_after = min(MAX_RETRY_AFTER, max(1, math.ceil(backlog / self.inference_workers)))
+        raise AdmissionRejected(detail, status_code=429, retry_after=retry_after)
@@ -0,0 +1,118 @@
+"""
+Analysis Region - Time-range and region-of-interest restrictions
+Limits an analysis to a window of the video and to a polygon of the frame
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def frame_window(total_frames: int, fps: float, start_time: Optional[float] = None,
+                 end_time: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Convert a start/end time in seconds into a [start, end) frame range.
+
+    Raises:
+        ValueError: If the window is empty or starts after the video ends
+    """
+    start_frame = int(round((start_time or 0.0) * fps))
+    end_frame = total_frames if end_time is None else min(total_frames, int(round(end_time * fps)))
+
+    if start_frame < 0 or (end_time is not None and start_time is not None and end_time <= start_time):
+        raise ValueError(f"Invalid time range: start={start_time}, end={end_time}")
+    if start_frame >= end_frame:
+        raise ValueError(
+            f"Time range {start_time or 0}s-{end_time}s is outside the video ({total_frames / fps:.1f}s)"
+        )
+    return start_frame, end_frame
+
+
+def clip_probe(video: Dict, start_time: Optional[float] = None,
+               end_time: Optional[float] = None) -> Dict:
+    """probe_video() output restricted to the analyzed time window"""
+    if start_time is None and end_time is None:
+        return video
+    start_frame, end_frame = frame_window(video['frames'], video['fps'], start_time, end_time)
+    frames = end_frame - start_frame
+    return {**video, 'frames': frames, 'duration': frames / video['fps']}
+
+
+def parse_polygon(polygon) -> List[List[float]]:
+    """
+    Validate a polygon given as [[x, y], ...].
+
+    Raises:
+        ValueError: If it is not a list of at least 3 numeric points
+    """
+    if not isinstance(polygon, list) or len(polygon) < 3:
+        raise ValueError("ROI must be a list of at least 3 [x, y] points")
+    points = []
+    for point in polygon:
+        if (not isinstance(point, (list, tuple)) or len(point) != 2
+                or not all(isinstance(v, (int, float)) for v in point)):
+            raise ValueError(f"Invalid ROI point: {point}")
+        points.append([float(point[0]), float(point[1])])
+    return points
+
+
+def seek(cap: cv2.VideoCapture, frame_index: int):
+    """Position a capture on a frame so earlier frames are never returned"""
+    if frame_index > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+
+class RegionOfInterest:
+    """
+    Polygon region of a frame.
+
+    Inference runs on the polygon's bounding box only, with pixels outside
+    the polygon blacked out. Detections are mapped back to full-frame
+    coordinates and kept only if their center lies inside the polygon.
+    """
+
+    def __init__(self, polygon: Sequence[Sequence[float]], frame_width: int, frame_height: int):
+        points = np.array(polygon, dtype=np.float32)
+        if points.ndim != 2 or points.shape[0] < 3 or points.shape[1] != 2:
+            raise ValueError("ROI must be a polygon of at least 3 [x, y] points")
+
+        # Coordinates in [0, 1] are fractions of the frame size
+        if points.max() <= 1.0:
+            points *= [frame_width, frame_height]
+        points[:, 0] = points[:, 0].clip(0, frame_width - 1)
+        points[:, 1] = points[:, 1].clip(0, frame_height - 1)
+
+        self.polygon = points
+        x, y, w, h = cv2.boundingRect(points.astype(np.int32))
+        if w < 2 or h < 2:
+            raise ValueError("ROI is empty after clipping to the frame")
+        self.x, self.y, self.w, self.h = x, y, w, h
+
+        self.mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillPoly(self.mask, [(points - [x, y]).astype(np.int32)], 255)
+        # Rectangular ROIs need no masking, only cropping
+        self.is_rectangle = bool(self.mask.all())
+        self.area_fraction = float(np.count_nonzero(self.mask)) / (frame_width * frame_height)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """Bounding-box crop of the frame with pixels outside the polygon zeroed"""
+        region = frame[self.y:self.y + self.h, self.x:self.x + self.w]
+        if self.is_rectangle:
+            return region
+        return cv2.bitwise_and(region, region, mask=self.mask)
+
+    def to_frame(self, bbox: List[float]) -> List[float]:
+        """Map a crop-relative [x1, y1, x2, y2] box to frame coordinates"""
+        x1, y1, x2, y2 = bbox
+        return [x1 + self.x, y1 + self.y, x2 + self.x, y2 + self.y]
+
+    def contains(self, x: float, y: float) -> bool:
+        return cv2.pointPolygonTest(self.polygon, (float(x), float(y)), False) >= 0
+
+    def describe(self) -> Dict:
+        return {
+            'polygon': [[round(float(px), 1), round(float(py), 1)] for px, py in self.polygon],
+            'bbox': [self.x, self.y, self.w, self.h],
+            'area_fraction': round(self.area_fraction, 4),
+        }
@@ -0,0 +1,204 @@
+"""
+Annotation Writer - Annotated output videos encoded off the inference thread
+Receives every frame of a video with the latest detections, holds the last
+boxes over frames that were not analyzed, and draws, resizes and encodes on
+its own thread
+"""
+
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+ANNOTATION_SCALE = float(os.getenv('ANNOTATION_SCALE', 1.0))  # output size relative to the input
+ANNOTATION_CODEC = os.getenv('ANNOTATION_CODEC', 'mp4v')  # OpenCV fourcc
+ANNOTATION_BITRATE = os.getenv('ANNOTATION_BITRATE', '')  # e.g. 800k; encodes with ffmpeg when set
+ANNOTATION_QUEUE_SIZE = int(os.getenv('ANNOTATION_QUEUE_SIZE', 64))  # frames waiting to be encoded
+
+# (x1, y1, x2, y2, label) in input-frame pixels
+Box = Tuple[float, float, float, float, str]
+# (text, BGR color) drawn top-left
+Label = Tuple[str, Tuple[int, int, int]]
+
+BOX_COLOR = (0, 200, 255)
+_STOP = object()
+
+
+def boxes_from_results(results) -> List[Box]:
+    """Every box of one frame's YOLO results, labelled like results.plot()"""
+    boxes = []
+    for xyxy, cls, conf in zip(results.boxes.xyxy.tolist(), results.boxes.cls.tolist(), results.boxes.conf.tolist()):
+        boxes.append((*xyxy, f"{results.names[int(cls)]} {conf:.2f}"))
+    return boxes
+
+
+class AnnotatedVideoWriter:
+    """
+    Writes an annotated copy of a video on a background thread.
+
+    Call write() for every frame read from the input, passing the boxes
+    when the frame was analyzed and None otherwise; unanalyzed frames are
+    drawn with the last boxes, so the output has the input's frame count
+    and timing. Frames wait in a bounded queue, and write() only blocks
+    when the encoder falls more than queue_size frames behind.
+
+    With a bitrate the frames are piped to ffmpeg (libx264); otherwise
+    they are encoded by cv2.VideoWriter with the given fourcc.
+    """
+
+    def __init__(self, output_path: str, fps: float, frame_size: Tuple[int, int],
+                 scale: float = ANNOTATION_SCALE, codec: str = ANNOTATION_CODEC,
+                 bitrate: str = ANNOTATION_BITRATE, queue_size: int = ANNOTATION_QUEUE_SIZE):
+        """
+        Args:
+            output_path: Path of the annotated video
+            fps: Frame rate of the input video
+            frame_size: (width, height) of the input frames
+            scale: Output size relative to the input (0-1]
+            codec: OpenCV fourcc when not encoding with ffmpeg
+            bitrate: Target bitrate for ffmpeg (e.g. '800k'), empty for OpenCV
+            queue_size: Frames buffered between the caller and the encoder
+        """
+        self.output_path = output_path
+        self.fps = fps or 30
+        self.input_size = frame_size
+        self.scale = min(1.0, max(0.05, scale))
+        # Even dimensions, which most encoders require
+        width, height = frame_size
+        self.size = (max(2, int(width * self.scale) // 2 * 2), max(2, int(height * self.scale) // 2 * 2))
+        self.error: Optional[str] = None
+
+        self._ffmpeg = None
+        self._writer = None
+        ffmpeg = shutil.which('ffmpeg') if bitrate else None
+        if bitrate and not ffmpeg:
+            logger.warning("⚠️ ffmpeg not found, ignoring ANNOTATION_BITRATE=%s", bitrate)
+        if ffmpeg:
+            self._ffmpeg = subprocess.Popen(
+                [ffmpeg, '-y', '-loglevel', 'error',
+                 '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.size[0]}x{self.size[1]}',
+                 '-r', str(self.fps), '-i', '-',
+                 '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-b:v', bitrate,
+                 output_path],
+                stdin=subprocess.PIPE,
+            )
+        else:
+            self._writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), self.fps, self.size)
+
+        self._boxes: List[Box] = []
+        self._labels: List[Label] = []
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        self.stats = {'frames': 0, 'analyzed_frames': 0, 'blocked_ms': 0.0, 'encode_ms': 0.0}
+        self._thread = threading.Thread(target=self._run, name='annotation-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, frame, boxes: Optional[List[Box]] = None, labels: Optional[List[Label]] = None):
+        """
+        Queue one input frame.
+
+        Args:
+            frame: The frame as read (not modified)
+            boxes: Detections of this frame, or None to keep the last ones
+            labels: Text lines for this frame, or None to keep the last ones
+        """
+        try:
+            self._queue.put_nowait((frame, boxes, labels))
+        except queue.Full:
+            started = time.perf_counter()
+            self._queue.put((frame, boxes, labels))
+            self.stats['blocked_ms'] += (time.perf_counter() - started) * 1000
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            if self.error:
+                continue  # keep draining so write() never blocks on a dead encoder
+            frame, boxes, labels = item
+            started = time.perf_counter()
+            try:
+                self._encode(self._annotate(frame, boxes, labels))
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                logger.error("❌ Annotated video %s failed: %s", self.output_path, self.error)
+            self.stats['encode_ms'] += (time.perf_counter() - started) * 1000
+
+    def _annotate(self, frame, boxes: Optional[List[Box]], labels: Optional[List[Label]]):
+        if boxes is not None:
+            self._boxes = boxes
+            self.stats['analyzed_frames'] += 1
+        if labels is not None:
+            self._labels = labels
+
+        # Draw on the resized copy: cheaper, and the input frame stays untouched
+        if self.size != tuple(self.input_size):
+            image = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        else:
+            image = frame.copy()
+        sx = self.size[0] / self.input_size[0]
+        sy = self.size[1] / self.input_size[1]
+        font_scale = max(0.35, 0.6 * sx)
+
+        for x1, y1, x2, y2, label in self._boxes:
+            p1 = (int(x1 * sx), int(y1 * sy))
+            cv2.rectangle(image, p1, (int(x2 * sx), int(y2 * sy)), BOX_COLOR, 2)
+            cv2.putText(image, label, (p1[0], max(12, p1[1] - 4)), cv2.FONT_HERSHEY_SIMPLEX,
+                        font_scale, BOX_COLOR, 1)
+
+        y = int(30 * sy) or 12
+        for text, color in self._labels:
+            cv2.putText(image, text, (10, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale * 1.2, color, 2)
+            y += int(35 * sy) or 14
+        return image
+
+    def _encode(self, image):
+        if self._ffmpeg is not None:
+            self._ffmpeg.stdin.write(image.tobytes())
+        else:
+            self._writer.write(image)
+        self.stats['frames'] += 1
+
+    def close(self) -> Dict:
+        """
+        Encode the queued frames and finish the file.
+
+        Returns:
+            Dict: Frames written, analyzed frames among them, time write()
+            spent blocked and time spent encoding, and any error
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._ffmpeg is not None:
+            try:
+                self._ffmpeg.stdin.close()
+            except OSError:
+                pass
+            if self._ffmpeg.wait() != 0 and not self.error:
+                self.error = f"ffmpeg exited with {self._ffmpeg.returncode}"
+        else:
+            self._writer.release()
+
+        report = {
+            'path': self.output_path,
+            'size': list(self.size),
+            'frames': self.stats['frames'],
+            'analyzed_frames': self.stats['analyzed_frames'],
+            'blocked_ms': round(self.stats['blocked_ms'], 1),
+            'encode_ms': round(self.stats['encode_ms'], 1),
+        }
+        if self.error:
+            report['error'] = self.error
+        return report
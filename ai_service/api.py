@@ -1,7 +1,10 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import MultiPartException, MultiPartParser
 import uvicorn
+import logging
 import os
 import sys
 from datetime import datetime
@@ -9,6 +12,13 @@ from datetime import datetime
 # Import the incident detector
 sys.path.insert(0, os.path.dirname(__file__))
 from incident_detector import IncidentDetector
+from frame_batch import (
+    BATCH_MAX_IMAGES, BATCH_MAX_BYTES, BATCH_INFERENCE_SIZE, split_jpeg_stream, decode_images
+)
+from service_logging import configure_logging, tag_request
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="TrafficGuard AI Service",
@@ -25,6 +35,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tag log records with the request's X-Request-ID
+app.middleware("http")(tag_request)
+
 # Initialize detector
 MODEL_PATH = os.getenv('MODEL_PATH', 'models/best.pt')
 detector = IncidentDetector(MODEL_PATH)
@@ -80,13 +93,13 @@ async def analyze_video(file: UploadFile = File(...)):
             content = await file.read()
             f.write(content)
         
-        print(f"📥 Received video: {file.filename} ({len(content)/1024/1024:.2f} MB)")
-        print(f"🎬 Starting analysis...")
+        logger.info("📥 Received video: %s (%.2f MB)", file.filename, len(content) / 1024 / 1024)
+        logger.info("🎬 Starting analysis...")
         
         # Analyze video with lower confidence for better detection
         incidents = detector.analyze_video(filepath, confidence_threshold=0.3)
         
-        print(f"✅ Analysis complete: {len(incidents)} incidents detected")
+        logger.info("✅ Analysis complete: %d incidents detected", len(incidents))
         
         # Clean up temp file
         try:
@@ -110,7 +123,7 @@ async def analyze_video(file: UploadFile = File(...)):
             except:
                 pass
         
-        print(f"❌ Error analyzing video: {e}")
+        logger.exception("❌ Error analyzing video: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/analyze-frame")
@@ -147,8 +160,97 @@ async def analyze_frame(file: UploadFile = File(...)):
         })
         
     except Exception as e:
-        print(f"❌ Error analyzing frame: {e}")
+        logger.exception("❌ Error analyzing frame: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def read_batch(request: Request) -> list:
+    """
+    Read the encoded images of a batch request, enforcing the size limits
+    
+    Multipart bodies may carry any number of image fields; any other body
+    is treated as concatenated JPEG files.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Batch too large. Maximum: {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+    content_length = request.headers.get('content-length')
+    if content_length:
+        try:
+            declared = int(content_length)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+        if declared > BATCH_MAX_BYTES:
+            raise too_large
+    
+    # Stop reading as soon as the limit is passed (no Content-Length when chunked),
+    # for multipart bodies too, which are only parsed once fully read
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > BATCH_MAX_BYTES:
+            raise too_large
+    
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        async def replay():
+            yield bytes(body)
+        try:
+            form = await MultiPartParser(request.headers, replay()).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=e.message)
+        try:
+            uploads = [value for _, value in form.multi_items() if hasattr(value, 'read')]
+            if len(uploads) > BATCH_MAX_IMAGES:
+                raise HTTPException(status_code=413, detail=f"Too many images. Maximum: {BATCH_MAX_IMAGES}")
+            return [await upload.read() for upload in uploads]
+        finally:
+            await form.close()
+    
+    try:
+        blobs = split_jpeg_stream(bytes(body))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(blobs) > BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Too many images. Maximum: {BATCH_MAX_IMAGES}")
+    return blobs
+
+@app.post("/analyze-frames")
+async def analyze_frames(request: Request):
+    """
+    Analyze a batch of frames/images in one request
+    
+    Body: multipart/form-data with one or more image files, or
+    concatenated JPEG files (e.g. Content-Type: image/jpeg).
+    Images are decoded in parallel and analyzed with batched inference.
+    
+    Returns:
+        JSON with per-image detections in request order
+    """
+    blobs = await read_batch(request)
+    if not blobs:
+        raise HTTPException(status_code=400, detail="No images in request")
+    
+    try:
+        frames = await run_in_threadpool(decode_images, blobs)
+        valid = [i for i, frame in enumerate(frames) if frame is not None]
+        detections = await run_in_threadpool(
+            detector.analyze_frames, [frames[i] for i in valid], batch_size=BATCH_INFERENCE_SIZE
+        )
+    except Exception as e:
+        logger.exception("❌ Error analyzing frame batch: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+    
+    by_index = dict(zip(valid, detections))
+    results = []
+    for i in range(len(blobs)):
+        if i in by_index:
+            results.append({"index": i, "count": len(by_index[i]), "detections": by_index[i]})
+        else:
+            results.append({"index": i, "error": "Invalid image file"})
+    
+    return JSONResponse(content={
+        "success": True,
+        "count": len(results),
+        "failed": len(blobs) - len(valid),
+        "results": results
+    })
 
 if __name__ == "__main__":
     print("\n🚦 TrafficGuard AI Service Starting...")
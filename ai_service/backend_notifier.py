@@ -5,22 +5,71 @@ Enables real-time notifications when AI analysis completes
 
 import httpx
 import asyncio
+import atexit
+import concurrent.futures
+import logging
 import os
-from typing import Optional, Dict, Any
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List, Set
+
+from notification_outbox import NotificationOutbox
+from notification_payload import PayloadEncoder
+from stage_timing import metrics
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:3000')
 WEBHOOK_ENDPOINT = '/webhook/analysis-complete'
+BATCH_WEBHOOK_ENDPOINT = '/webhook/analysis-complete/batch'
 TIMEOUT = 10  # seconds
 
+# Background dispatcher configuration
+NOTIFY_QUEUE_SIZE = int(os.getenv('NOTIFY_QUEUE_SIZE', 1000))
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', 2))
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', 20))
+NOTIFY_BATCH_WAIT = float(os.getenv('NOTIFY_BATCH_WAIT', 0.05))  # seconds
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', 5))
+NOTIFY_SHUTDOWN_TIMEOUT = float(os.getenv('NOTIFY_SHUTDOWN_TIMEOUT', 10))  # seconds
+NOTIFY_OUTBOX_ENABLED = os.getenv('NOTIFY_OUTBOX_ENABLED', 'true').lower() == 'true'
 
-async def notify_backend(
+# Delivery outcome of a payload the backend answered with a 5xx (besides True
+# delivered, False rejected with a 4xx, None not attempted or unreachable)
+SERVER_ERROR = 'server_error'
+
+# Wire format (schema, content type, compression) from NOTIFY_* settings
+default_encoder = PayloadEncoder()
+
+
+def build_payload(
     incident_id: int,
     result: Dict[str, Any],
     confidence: float = 0.0,
     vehicle_count: int = 0,
     incident_detected: bool = False,
     detected_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the webhook body expected by the backend"""
+    return {
+        'incident_id': incident_id,
+        'result': result,
+        'confidence': confidence,
+        'vehicle_count': vehicle_count,
+        'incident_detected': incident_detected,
+        'detected_type': detected_type,
+    }
+
+
+async def notify_backend(
+    incident_id: int,
+    result: Dict[str, Any],
+    confidence: float = 0.0,
+    vehicle_count: int = 0,
+    incident_detected: bool = False,
+    detected_type: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None
 ) -> bool:
     """
     Send analysis result to backend webhook for real-time notification.
@@ -32,6 +81,7 @@ async def notify_backend(
         vehicle_count: Number of vehicles detected
         incident_detected: Whether an incident was detected
         detected_type: Type of incident detected (if any)
+        client: Reusable HTTP client (a short-lived one is created if omitted)
         
     Returns:
         bool: True if notification was sent successfully
@@ -39,62 +89,135 @@ async def notify_backend(
     try:
         url = f"{BACKEND_URL}{WEBHOOK_ENDPOINT}"
         
-        payload = {
-            'incident_id': incident_id,
-            'result': result,
-            'confidence': confidence,
-            'vehicle_count': vehicle_count,
-            'incident_detected': incident_detected,
-            'detected_type': detected_type,
-        }
+        payload = build_payload(
+            incident_id, result, confidence, vehicle_count, incident_detected, detected_type
+        )
+        body, headers = default_encoder.encode(default_encoder.shape(payload))
+        
+        if client is not None:
+            response = await client.post(url, content=body, headers=headers)
+        else:
+            async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+                response = await client.post(url, content=body, headers=headers)
         
-        async with httpx.AsyncClient(timeout=TIMEOUT) as client:
-            response = await client.post(url, json=payload)
+        if response.status_code == 200:
+            logger.debug("✅ Backend notified successfully for incident %s", incident_id)
+            return True
+        else:
+            logger.warning("⚠️ Backend notification failed: %s - %s", response.status_code, response.text,
+                           extra={'event': 'notification_failed'})
+            return False
             
-            if response.status_code == 200:
-                print(f"✅ Backend notified successfully for incident {incident_id}")
-                return True
-            else:
-                print(f"⚠️ Backend notification failed: {response.status_code} - {response.text}")
-                return False
-                
     except httpx.ConnectError:
-        print(f"⚠️ Could not connect to backend at {BACKEND_URL}")
+        logger.warning("⚠️ Could not connect to backend at %s", BACKEND_URL, extra={'event': 'backend_unreachable'})
         return False
     except httpx.TimeoutException:
-        print(f"⚠️ Backend notification timed out")
+        logger.warning("⚠️ Backend notification timed out", extra={'event': 'notification_timeout'})
         return False
     except Exception as e:
-        print(f"❌ Error notifying backend: {str(e)}")
+        logger.error("❌ Error notifying backend: %s", e, extra={'event': 'notification_failed'})
         return False
 
 
+class _BackgroundLoop:
+    """
+    Event loop running on a daemon thread, shared by synchronous callers.
+    
+    Keeps one loop and one pooled HTTP client for the whole process instead
+    of rebuilding both on every notify_backend_sync() call.
+    """
+    
+    _instance: Optional['_BackgroundLoop'] = None
+    _instance_lock = threading.Lock()
+    
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.client: Optional[httpx.AsyncClient] = None
+        self._pending: Set[concurrent.futures.Future] = set()
+        self._thread = threading.Thread(
+            target=self._run, name='backend-notifier-loop', daemon=True
+        )
+        self._thread.start()
+    
+    @classmethod
+    def get(cls) -> '_BackgroundLoop':
+        """Return the process-wide loop, starting it on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                atexit.register(cls._instance.shutdown)
+            return cls._instance
+    
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        # Created on the loop thread so its connection pool belongs to this loop
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=TIMEOUT)
+        return self.client
+    
+    async def _notify(self, *args) -> bool:
+        client = await self._get_client()
+        return await notify_backend(*args, client=client)
+    
+    def submit(self, *args) -> concurrent.futures.Future:
+        """Schedule notify_backend(*args) on the background loop"""
+        future = asyncio.run_coroutine_threadsafe(self._notify(*args), self.loop)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+    
+    def shutdown(self, timeout: float = NOTIFY_SHUTDOWN_TIMEOUT):
+        """Wait for fire-and-forget notifications, then stop the loop"""
+        if not self.loop.is_running():
+            return
+        
+        concurrent.futures.wait(list(self._pending), timeout=timeout)
+        
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
 def notify_backend_sync(
     incident_id: int,
     result: Dict[str, Any],
     confidence: float = 0.0,
     vehicle_count: int = 0,
     incident_detected: bool = False,
-    detected_type: Optional[str] = None
+    detected_type: Optional[str] = None,
+    wait: bool = True
 ) -> bool:
     """
     Synchronous wrapper for notify_backend.
-    Use this when calling from non-async context.
+    Use this when calling from non-async context (scripts, batch runners).
+    
+    Notifications run on a shared background event loop with a persistent
+    HTTP client, so repeated calls reuse connections.
+    
+    Args:
+        wait: Block until delivered (True) or fire-and-forget (False).
+              Fire-and-forget notifications are flushed at interpreter exit.
+        
+    Returns:
+        bool: Delivery result when waiting; True once submitted otherwise
     """
+    future = _BackgroundLoop.get().submit(
+        incident_id, result, confidence, vehicle_count, incident_detected, detected_type
+    )
+    
+    if not wait:
+        return True
+    
     try:
-        return asyncio.get_event_loop().run_until_complete(
-            notify_backend(incident_id, result, confidence, vehicle_count, incident_detected, detected_type)
-        )
-    except RuntimeError:
-        # No event loop running, create a new one
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                notify_backend(incident_id, result, confidence, vehicle_count, incident_detected, detected_type)
-            )
-        finally:
-            loop.close()
+        return future.result(timeout=TIMEOUT + 5)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        logger.warning("⚠️ Backend notification timed out", extra={'event': 'notification_timeout'})
+        return False
 
 
 class BackendNotifier:
@@ -136,11 +259,354 @@ class BackendNotifier:
             try:
                 response = await self._client.post(url, json=payload)
                 if response.status_code == 200:
-                    print(f"✅ Backend notified (attempt {attempt + 1})")
+                    logger.debug("✅ Backend notified (attempt %d)", attempt + 1)
                     return True
             except Exception as e:
-                print(f"⚠️ Notification attempt {attempt + 1} failed: {e}")
+                logger.warning("⚠️ Notification attempt %d failed: %s", attempt + 1, e,
+                               extra={'event': 'notification_retry'})
                 if attempt < self.max_retries - 1:
                     await asyncio.sleep(1 * (attempt + 1))  # Exponential backoff
         
         return False
+
+
+class NotificationDispatcher:
+    """
+    Delivers webhook notifications in the background.
+    
+    Request handlers call enqueue() and return immediately. Without an
+    outbox, worker tasks drain a bounded in-memory queue. With an outbox,
+    notifications are persisted first and a single sender task replays
+    them in order, so results survive backend restarts. Either way up to
+    NOTIFY_BATCH_SIZE payloads are grouped into one POST when the backend
+    exposes the batch endpoint, and failures are retried with backoff.
+    """
+    
+    def __init__(
+        self,
+        backend_url: Optional[str] = None,
+        queue_size: int = NOTIFY_QUEUE_SIZE,
+        workers: int = NOTIFY_WORKERS,
+        batch_size: int = NOTIFY_BATCH_SIZE,
+        batch_wait: float = NOTIFY_BATCH_WAIT,
+        max_retries: int = NOTIFY_MAX_RETRIES,
+        outbox: Optional[NotificationOutbox] = None,
+        encoder: Optional[PayloadEncoder] = None
+    ):
+        self.backend_url = backend_url or BACKEND_URL
+        self.queue_size = queue_size
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.max_retries = max(1, max_retries)
+        self.outbox = outbox
+        self.encoder = encoder or default_encoder
+        
+        # Assume batching is available until the backend says otherwise
+        self.batch_supported = batch_size > 1
+        
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        self.stats = {
+            'enqueued': 0,
+            'delivered': 0,
+            'failed': 0,
+            'dropped': 0,
+            'retries': 0,
+        }
+    
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+    
+    async def start(self):
+        """Create the HTTP client and spawn delivery tasks"""
+        if self.running:
+            return
+        
+        self._loop = asyncio.get_running_loop()
+        self._client = httpx.AsyncClient(timeout=TIMEOUT)
+        
+        if self.outbox:
+            # One sender keeps deliveries in outbox order
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._outbox_sender())]
+            pending = await asyncio.to_thread(self.outbox.pending_count)
+            logger.info("📨 Notification dispatcher started (outbox=%s, %d pending)", self.outbox.path, pending)
+        else:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [
+                asyncio.create_task(self._worker(i)) for i in range(self.workers)
+            ]
+            logger.info("📨 Notification dispatcher started (%d workers, queue=%d)", self.workers, self.queue_size)
+    
+    async def stop(self, timeout: float = NOTIFY_SHUTDOWN_TIMEOUT):
+        """
+        Drain pending notifications, then stop delivery.
+        
+        With an outbox, anything still undelivered after the timeout stays
+        on disk and is replayed on the next start.
+        
+        Args:
+            timeout: Maximum seconds to wait for pending notifications
+        """
+        if not self.running:
+            return
+        
+        try:
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            if self.outbox:
+                logger.warning("⚠️ Outbox not drained after %ss, pending notifications kept for replay", timeout)
+            else:
+                logger.warning("⚠️ Notification queue not drained after %ss, %d notification(s) discarded",
+                               timeout, self._queue.qsize())
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        if self.outbox:
+            await asyncio.to_thread(self.outbox.close)
+        
+        await self._client.aclose()
+        self._client = None
+        logger.info("📨 Notification dispatcher stopped (%d delivered)", self.stats['delivered'])
+    
+    def enqueue(
+        self,
+        incident_id: int,
+        result: Dict[str, Any],
+        confidence: float = 0.0,
+        vehicle_count: int = 0,
+        incident_detected: bool = False,
+        detected_type: Optional[str] = None
+    ) -> bool:
+        """
+        Queue a notification without waiting for delivery.
+        
+        Without an outbox, a full queue drops its oldest pending
+        notification, since the dashboard cares most about the latest results.
+        
+        Returns:
+            bool: True if the notification was queued
+        """
+        if not self.running:
+            return False
+        
+        payload = self.encoder.shape(build_payload(
+            incident_id, result, confidence, vehicle_count, incident_detected, detected_type
+        ))
+        
+        if self.outbox:
+            self.outbox.append(payload)
+            self._wakeup.set()
+            self.stats['enqueued'] += 1
+            return True
+        
+        if self._queue.full():
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.stats['dropped'] += 1
+            except asyncio.QueueEmpty:
+                pass
+        
+        self._queue.put_nowait(payload)
+        self.stats['enqueued'] += 1
+        return True
+    
+    def enqueue_threadsafe(self, *args, **kwargs) -> bool:
+        """
+        enqueue() for callers on other threads (e.g. stream analyzers).
+        
+        Returns:
+            bool: True if the notification was handed to the dispatcher loop
+        """
+        if not self.running or self._loop.is_closed():
+            return False
+        self._loop.call_soon_threadsafe(lambda: self.enqueue(*args, **kwargs))
+        return True
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Dispatcher counters plus current backlog"""
+        stats = {
+            **self.stats,
+            'queued': self._queue.qsize() if self._queue else 0,
+            'batch_supported': self.batch_supported,
+        }
+        if self.outbox and self.running:
+            stats['outbox'] = self.outbox.get_stats()
+        return stats
+    
+    async def _drain(self):
+        """Wait until every pending notification has been attempted"""
+        if not self.outbox:
+            await self._queue.join()
+            return
+        
+        while await asyncio.to_thread(self.outbox.pending_count) > 0:
+            self._wakeup.set()
+            await asyncio.sleep(0.1)
+    
+    async def _worker(self, worker_id: int):
+        """Pull payloads off the in-memory queue and deliver them in batches"""
+        while True:
+            batch = [await self._queue.get()]
+            
+            # Collect whatever else arrives within the batch window
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                outcomes = await self._deliver(batch)
+                for payload, outcome in zip(batch, outcomes):
+                    if outcome is True:
+                        self.stats['delivered'] += 1
+                    else:
+                        self.stats['failed'] += 1
+                        logger.warning("⚠️ Giving up on notification for incident %s", payload['incident_id'],
+                                       extra={'event': 'notification_failed'})
+            except Exception as e:
+                logger.exception("❌ Notification worker %d error: %s", worker_id, e)
+                self.stats['failed'] += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _outbox_sender(self):
+        """Replay outbox entries in order until each is delivered, rejected or dead-lettered"""
+        failures = 0
+        while True:
+            self._wakeup.clear()
+            entries = await asyncio.to_thread(self.outbox.fetch_pending, self.batch_size)
+            
+            if not entries:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                # Let concurrent enqueues land in the same batch
+                await asyncio.sleep(self.batch_wait)
+                continue
+            
+            try:
+                outcomes = await self._deliver([payload for _, payload in entries])
+            except Exception as e:
+                logger.exception("❌ Outbox sender error: %s", e, extra={'event': 'outbox_sender_error'})
+                outcomes = [None] * len(entries)
+            
+            delivered = [seq for (seq, _), o in zip(entries, outcomes) if o is True]
+            rejected = [seq for (seq, _), o in zip(entries, outcomes) if o is False]
+            errored = [seq for (seq, _), o in zip(entries, outcomes) if o == SERVER_ERROR]
+            dead = await asyncio.to_thread(self.outbox.mark, delivered, rejected, errored)
+            
+            self.stats['delivered'] += len(delivered)
+            self.stats['failed'] += len(rejected) + len(dead)
+            for seq in dead:
+                logger.error("❌ Outbox entry %d dead-lettered after %d backend errors", seq, self.outbox.max_attempts,
+                             extra={'event': 'outbox_dead_letter'})
+            
+            if len(delivered) + len(rejected) < len(entries):
+                # Backend unavailable: keep entries and back off before replaying
+                failures += 1
+                self.stats['retries'] += 1
+                backoff = min(60.0, 0.5 * (2 ** min(failures, 7)))
+                await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+            else:
+                failures = 0
+    
+    async def _deliver(self, batch: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        """
+        Deliver a batch, falling back to single POSTs if batching is unavailable.
+        
+        Returns:
+            Per-payload outcome: True delivered, False rejected by the backend,
+            SERVER_ERROR answered with a 5xx, None not attempted or backend
+            unreachable
+        """
+        started = time.perf_counter()
+        try:
+            return await self._deliver_batch(batch)
+        finally:
+            metrics.observe('webhook', 'notify', time.perf_counter() - started)
+    
+    async def _deliver_batch(self, batch: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        """Body of _deliver(), timed as the webhook notify stage"""
+        if len(batch) > 1 and self.batch_supported:
+            url = f"{self.backend_url}{BATCH_WEBHOOK_ENDPOINT}"
+            status = await self._post_with_retry(url, {'notifications': batch})
+            if status == 200:
+                return [True] * len(batch)
+            if status is None:
+                return [None] * len(batch)
+            if status in (404, 405):
+                logger.info("ℹ️ Backend has no batch webhook, sending notifications individually")
+                self.batch_supported = False
+            # Other 4xx and 5xx: resend individually to isolate the bad payload
+        
+        url = f"{self.backend_url}{WEBHOOK_ENDPOINT}"
+        outcomes: List[Optional[bool]] = []
+        for payload in batch:
+            headers = {}
+            if payload.get('idempotency_key'):
+                headers['Idempotency-Key'] = payload['idempotency_key']
+            status = await self._post_with_retry(url, payload, headers)
+            if status == 200:
+                outcomes.append(True)
+            elif status is not None and status < 500:
+                outcomes.append(False)
+            else:
+                # Stop here so later notifications are not delivered out of order
+                outcomes.append(SERVER_ERROR if status is not None else None)
+                break
+        
+        return outcomes + [None] * (len(batch) - len(outcomes))
+    
+    async def _post_with_retry(
+        self,
+        url: str,
+        body: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Optional[int]:
+        """
+        POST with exponential backoff on connection errors and 5xx responses.
+        
+        Returns:
+            Final HTTP status code, or None if the backend was unreachable
+        """
+        data, encoding_headers = self.encoder.encode(body)
+        headers = {**encoding_headers, **(headers or {})}
+        
+        status = None
+        for attempt in range(self.max_retries):
+            try:
+                response = await self._client.post(url, content=data, headers=headers)
+                status = response.status_code
+                if status < 500:
+                    return status
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                status = None
+                if attempt == 0:
+                    logger.warning("⚠️ Backend unreachable at %s: %s", self.backend_url, type(e).__name__,
+                                   extra={'event': 'backend_unreachable'})
+            
+            if attempt < self.max_retries - 1:
+                self.stats['retries'] += 1
+                backoff = min(30.0, 0.5 * (2 ** attempt))
+                await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+        
+        return status
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Batch Video Analysis
+====================
+Analyzes directories of archived clips in parallel for backfills.
+
+Videos are handed out one at a time to a pool of worker processes. Each
+worker loads its analyzer (and model) once and reuses it for every clip.
+Every video gets a JSON result named after its content hash and the
+analysis settings. Clips whose result already exists are skipped, so an
+interrupted backfill resumes where it stopped and renamed or duplicated
+files are not analyzed twice.
+
+Usage:
+    python batch_analyze.py --input ./archive --output ./backfill
+    python batch_analyze.py --input ./archive/2024 ./archive/2025 --output ./backfill \\
+        --analyzer traffic --workers 4
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+ANALYZERS = ('incident', 'improved', 'traffic', 'enhanced')
+
+# Modules whose environment settings change analysis results
+SETTING_MODULES = ('adaptive_sampling', 'tiled_inference', 'screen_preprocessing')
+
+# Set in each worker process by init_worker
+_worker = {}
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of the file contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def settings_key(settings: dict) -> str:
+    """Short fingerprint of the analysis settings, so changing them re-analyzes"""
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def discover_videos(inputs: list) -> list:
+    """Video files under the input directories (or given directly), sorted"""
+    videos = []
+    for entry in inputs:
+        path = Path(entry)
+        if path.is_file():
+            videos.append(path)
+        elif path.is_dir():
+            videos.extend(p for p in path.rglob('*') if p.suffix.lower() in VIDEO_EXTENSIONS and p.is_file())
+        else:
+            print(f"⚠️  Not found: {entry}")
+    return sorted(set(videos))
+
+
+def load_analyzer(name: str, model_path: str = None, confidence: float = None) -> tuple:
+    """Construct an analyzer; returns it with a function running it on one video"""
+    if name == 'incident':
+        from incident_detector import IncidentDetector
+        analyzer = IncidentDetector(model_path) if model_path else IncidentDetector()
+        if confidence is not None:
+            return analyzer, lambda path: analyzer.analyze_video(path, confidence_threshold=confidence)
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    if name == 'improved':
+        from incident_detector_improved import ImprovedIncidentDetector
+        analyzer = ImprovedIncidentDetector(model_path) if model_path else ImprovedIncidentDetector()
+        if confidence is not None:
+            analyzer.confidence_min = confidence
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    if name == 'traffic':
+        from traffic_analyzer import TrafficAnalyzer
+        analyzer = TrafficAnalyzer()
+        if confidence is not None:
+            analyzer.min_confidence = confidence
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    if name == 'enhanced':
+        from enhanced_traffic_analyzer import EnhancedTrafficAnalyzer
+        analyzer = EnhancedTrafficAnalyzer()
+        if confidence is not None:
+            analyzer.min_confidence = confidence
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    raise ValueError(f"Unknown analyzer: {name}")
+
+
+def effective_settings(analyzer, model_path: str = None) -> dict:
+    """
+    Settings a loaded analyzer actually runs with, read back from it.
+    
+    Covers its plain attributes (frame skip, input size, thresholds...),
+    the model it loaded with a hash of the weights, and the environment
+    settings of the modules it analyzes with.
+    """
+    settings = {}
+    for name, value in vars(analyzer).items():
+        if name.startswith('_'):
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue  # models, helpers and other non-settings
+        settings[name] = value
+
+    # The incident detectors keep no model path; fall back to their default
+    model_path = settings.get('model_path') or model_path or \
+        inspect.signature(type(analyzer)).parameters['model_path'].default
+    settings['model_path'] = model_path
+    settings['model_sha1'] = file_digest(model_path)[:16] if os.path.isfile(model_path) else None
+
+    for module_name in (type(analyzer).__module__, *SETTING_MODULES):
+        module = sys.modules.get(module_name)
+        for name, value in (vars(module).items() if module else ()):
+            if name.isupper() and isinstance(value, (bool, int, float, str)):
+                settings[f"{module_name}.{name}"] = value
+    return settings
+
+
+def incident_types(analyzer: str, result) -> list:
+    """Incident types found in one analyzer result"""
+    if result is None:
+        return []
+    if analyzer == 'incident':
+        return sorted({incident['type'] for incident in result})
+    if analyzer == 'improved':
+        return sorted(kind for kind, count in result['incidents'].items() if count)
+    return [result['incident_type']] if result.get('incident_detected') else []
+
+
+def init_worker(settings: dict, threads: int, verbose: bool):
+    """Load the analyzer once per worker process"""
+    # Split the CPU between workers instead of every worker using every core
+    os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    cv2.setNumThreads(threads)
+    if verbose:
+        from service_logging import configure_logging
+        configure_logging()
+    analyzer, _worker['analyze'] = load_analyzer(settings['analyzer'], settings['model'], settings['confidence'])
+    # Key results on what the analyzer runs with, not only the CLI flags, so
+    # changed env settings or model weights re-analyze
+    _worker['settings'] = {**settings, 'effective': effective_settings(analyzer, settings['model'])}
+
+
+def process_video(task: tuple) -> dict:
+    """Analyze one video unless its result already exists (runs in a worker)"""
+    path, results_dir, force = task
+    settings = _worker['settings']
+    record = {'video': path, 'worker': os.getpid()}
+    try:
+        digest = file_digest(path)
+        result_path = os.path.join(results_dir, f"{digest[:16]}_{settings_key(settings)}.json")
+        record.update(sha1=digest, result_path=result_path)
+        if os.path.exists(result_path) and not force:
+            with open(result_path) as f:
+                previous = json.load(f)
+            return {**record, 'status': 'skipped', 'incidents': previous['incident_types'],
+                    'frames': previous['frames'], 'duration': previous['duration']}
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError("Cannot open video")
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+
+        started = time.perf_counter()
+        result = _worker['analyze'](path)
+        seconds = time.perf_counter() - started
+        if result is None:
+            raise ValueError("Video could not be analyzed")
+
+        output = {
+            'video': path,
+            'sha1': digest,
+            'settings': settings,
+            'frames': frames,
+            'duration': round(frames / fps, 2) if fps else None,
+            'seconds': round(seconds, 3),
+            'incident_types': incident_types(settings['analyzer'], result),
+            'analyzed_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'result': result,
+        }
+        with open(result_path + '.part', 'w') as f:
+            json.dump(output, f, indent=2, default=float)
+        os.replace(result_path + '.part', result_path)
+        return {**record, 'status': 'analyzed', 'seconds': output['seconds'], 'incidents': output['incident_types'],
+                'frames': frames, 'duration': output['duration']}
+    except Exception as e:
+        return {**record, 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze directories of videos in parallel, skipping already-analyzed clips"
+    )
+    parser.add_argument('--input', nargs='+', required=True, help='Video directories (searched recursively) or files')
+    parser.add_argument('--output', required=True, help='Directory for per-video results and summary.json')
+    parser.add_argument('--analyzer', choices=ANALYZERS, default='incident', help='Analyzer to run')
+    parser.add_argument('--model', help='Model path for the incident detectors (defaults to their own)')
+    parser.add_argument('--confidence', type=float, help="Confidence threshold (defaults to the analyzer's own)")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Worker processes, each with its own model')
+    parser.add_argument('--force', action='store_true', help='Re-analyze videos that already have a result')
+    parser.add_argument('--limit', type=int, help='Only process the first N videos found')
+    parser.add_argument('--verbose', action='store_true', help="Show the analyzers' own log output")
+    args = parser.parse_args()
+
+    videos = discover_videos(args.input)
+    if args.limit:
+        videos = videos[:args.limit]
+    if not videos:
+        print("❌ No video files found")
+        sys.exit(1)
+
+    results_dir = os.path.join(args.output, 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    settings = {'analyzer': args.analyzer, 'model': args.model, 'confidence': args.confidence}
+    workers = max(1, min(args.workers, len(videos)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    print(f"📁 Found {len(videos)} videos")
+    print(f"⚙️  {args.analyzer} analyzer on {workers} worker(s), {threads} thread(s) each")
+    print(f"💾 Results: {results_dir}\n")
+
+    # Spawned workers start clean (no forked model or CUDA state); videos are
+    # handed out one at a time so long clips do not hold up a whole shard
+    tasks = [(str(video), results_dir, args.force) for video in videos]
+    context = multiprocessing.get_context('spawn')
+    records = []
+    started = time.perf_counter()
+    with context.Pool(workers, initializer=init_worker, initargs=(settings, threads, args.verbose)) as pool:
+        for i, record in enumerate(pool.imap_unordered(process_video, tasks), 1):
+            records.append(record)
+            name = os.path.basename(record['video'])
+            if record['status'] == 'analyzed':
+                found = ', '.join(record['incidents']) or 'no incident'
+                print(f"[{i}/{len(tasks)}] ✅ {name}: {found} ({record['seconds']:.1f}s)")
+            elif record['status'] == 'skipped':
+                print(f"[{i}/{len(tasks)}] ⏭️  {name}: already analyzed")
+            else:
+                print(f"[{i}/{len(tasks)}] ❌ {name}: {record['error']}")
+    wall = time.perf_counter() - started
+
+    analyzed = [r for r in records if r['status'] == 'analyzed']
+    statuses = Counter(r['status'] for r in records)
+    frames = sum(r['frames'] for r in analyzed)
+    video_seconds = sum(r['duration'] or 0 for r in analyzed)
+    incidents = Counter(kind for r in records if r['status'] != 'failed' for kind in r['incidents'])
+
+    summary = {
+        'settings': settings,
+        'workers': workers,
+        'videos': len(records),
+        'analyzed': statuses['analyzed'],
+        'skipped': statuses['skipped'],
+        'failed': statuses['failed'],
+        'wall_seconds': round(wall, 1),
+        'throughput': {
+            'videos_per_min': round(len(analyzed) / wall * 60, 2) if wall > 0 else 0.0,
+            'frames_per_sec': round(frames / wall, 1) if wall > 0 else 0.0,
+            'video_seconds_per_sec': round(video_seconds / wall, 2) if wall > 0 else 0.0,
+        },
+        'incident_types': dict(incidents),
+        'failures': [{'video': r['video'], 'error': r['error']} for r in records if r['status'] == 'failed'],
+        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    with open(os.path.join(args.output, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{'='*60}")
+    print(f"✅ Analyzed {summary['analyzed']}, skipped {summary['skipped']}, failed {summary['failed']} "
+          f"in {wall:.1f}s")
+    print(f"⚡ {summary['throughput']['videos_per_min']:.1f} videos/min, "
+          f"{summary['throughput']['frames_per_sec']:.0f} frames/s, "
+          f"{summary['throughput']['video_seconds_per_sec']:.1f}x real time")
+    if incidents:
+        print("🚨 " + ', '.join(f"{kind}: {count}" for kind, count in incidents.most_common()))
+    print(f"💾 Summary: {os.path.join(args.output, 'summary.json')}")
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Analyzer Throughput Benchmark
+Runs TrafficAnalyzer, EnhancedTrafficAnalyzer, IncidentDetector and
+ImprovedIncidentDetector over deterministic synthetic traffic videos and
+reports frames/sec, per-frame inference latency percentiles and peak RSS.
+
+Each analyzer runs in its own process so its peak RSS is not inflated by
+the others. Save the JSON on one commit and pass it as --compare on the
+next to see throughput changes.
+
+Usage:
+    python benchmarks/bench_analyzers.py
+    python benchmarks/bench_analyzers.py --preset full --output bench_main.json
+    python benchmarks/bench_analyzers.py --analyzers traffic enhanced --compare bench_main.json
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_video import scenario_matrix, ensure_videos
+
+ANALYZERS = ('traffic', 'enhanced', 'incident', 'improved')
+DEFAULT_VIDEO_DIR = os.path.join(tempfile.gettempdir(), 'trafficguard_synthetic')
+
+
+class TimedModel:
+    """Wraps a YOLO model and records the latency of every call"""
+
+    def __init__(self, model):
+        self._model = model
+        self.latencies = []
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._model(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_analyzer(name: str, model_path: str = None):
+    """Construct an analyzer and a function running it on one video"""
+    if name == 'traffic':
+        from traffic_analyzer import TrafficAnalyzer
+        analyzer = TrafficAnalyzer()
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    if name == 'enhanced':
+        from enhanced_traffic_analyzer import EnhancedTrafficAnalyzer
+        analyzer = EnhancedTrafficAnalyzer()
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    if name == 'incident':
+        from incident_detector import IncidentDetector
+        analyzer = IncidentDetector(model_path) if model_path else IncidentDetector()
+        return analyzer, lambda path: analyzer.analyze_video(path, confidence_threshold=0.5)
+    if name == 'improved':
+        from incident_detector_improved import ImprovedIncidentDetector
+        analyzer = ImprovedIncidentDetector(model_path) if model_path else ImprovedIncidentDetector()
+        return analyzer, lambda path: analyzer.analyze_video(path)
+    raise ValueError(f"Unknown analyzer: {name}")
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run_analyzer(name: str, videos: list, model_path: str = None, verbose: bool = False) -> dict:
+    """Benchmark one analyzer on every video (runs in a child process)"""
+    import cv2
+
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        analyzer, analyze = load_analyzer(name, model_path)
+        analyzer.model = timed = TimedModel(analyzer.model)
+        rss_loaded = peak_rss_mb()
+
+        # Warm-up on the first video so lazy model initialization is not measured
+        analyze(videos[0]['path'])
+
+        results = []
+        for video in videos:
+            cap = cv2.VideoCapture(video['path'])
+            frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
+
+            timed.latencies = []
+            start = time.perf_counter()
+            analyze(video['path'])
+            elapsed = time.perf_counter() - start
+            latencies_ms = [l * 1000 for l in timed.latencies]
+
+            results.append({
+                'video': video['name'],
+                'frames': frames,
+                'analyzed_frames': len(latencies_ms),
+                'seconds': round(elapsed, 3),
+                'fps': round(frames / elapsed, 1) if elapsed > 0 else 0.0,
+                'analyzed_fps': round(len(latencies_ms) / elapsed, 2) if elapsed > 0 else 0.0,
+                'latency_ms': {
+                    'p50': round(percentile(latencies_ms, 50), 1),
+                    'p95': round(percentile(latencies_ms, 95), 1),
+                    'p99': round(percentile(latencies_ms, 99), 1),
+                },
+            })
+
+    return {
+        'analyzer': name,
+        'rss_after_load_mb': round(rss_loaded, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'videos': results,
+    }
+
+
+def environment() -> dict:
+    """What the numbers were measured on"""
+    import cv2
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline_path: str):
+    """Print fps changes against a previous run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {
+        (run['analyzer'], video['video']): video
+        for run in baseline['results'] for video in run['videos']
+    }
+
+    print(f"\n📈 Change vs {baseline_path} (commit {baseline['environment'].get('commit')})")
+    print(f"{'analyzer':<10} {'video':<44} {'fps':>9} {'was':>9} {'change':>8}")
+    for run in results:
+        for video in run['videos']:
+            before = previous.get((run['analyzer'], video['video']))
+            if not before or not before['fps']:
+                continue
+            change = (video['fps'] - before['fps']) / before['fps'] * 100
+            print(f"{run['analyzer']:<10} {video['video']:<44} {video['fps']:>9.1f} {before['fps']:>9.1f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analyzers on synthetic traffic videos")
+    parser.add_argument('--preset', choices=['quick', 'full'], default='quick', help='Video matrix to run')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each synthetic video')
+    parser.add_argument('--analyzers', nargs='+', choices=ANALYZERS, default=list(ANALYZERS))
+    parser.add_argument('--video-dir', default=DEFAULT_VIDEO_DIR, help='Where generated videos are cached')
+    parser.add_argument('--model', help='Model path for the incident detectors (defaults to their own)')
+    parser.add_argument('--compare', help='Previous JSON output to compare against')
+    parser.add_argument('--verbose', action='store_true', help="Show the analyzers' own output")
+    parser.add_argument('--output', type=str, help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    specs = scenario_matrix(args.preset, args.seconds)
+    paths = ensure_videos(specs, args.video_dir)
+    videos = [{**video, 'path': path} for video, path in zip(specs, paths)]
+
+    # A fresh interpreter per analyzer keeps peak RSS comparable
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in args.analyzers:
+        print(f"⏱️  Benchmarking {name} on {len(videos)} videos...")
+        with context.Pool(1) as pool:
+            results.append(pool.apply(run_analyzer, (name, videos, args.model, args.verbose)))
+
+    print(f"\n{'analyzer':<10} {'video':<44} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for run in results:
+        for video in run['videos']:
+            latency = video['latency_ms']
+            print(f"{run['analyzer']:<10} {video['video']:<44} {video['fps']:>8.1f} "
+                  f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f}")
+        print(f"{'':<10} peak RSS {run['peak_rss_mb']:.0f} MB (after model load {run['rss_after_load_mb']:.0f} MB)")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'environment': environment(),
+                'preset': args.preset,
+                'videos': specs,
+                'results': results,
+            }, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
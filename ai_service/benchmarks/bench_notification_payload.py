@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Webhook Payload Benchmark
+Compares body size and encode latency of the notification encodings
+against the current plain-JSON body sent by notify_backend.
+
+Usage:
+    python benchmarks/bench_notification_payload.py
+    python benchmarks/bench_notification_payload.py --frames 900 --output payload_bench.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend_notifier import build_payload
+from notification_payload import PayloadEncoder, zstandard, msgpack
+
+
+def make_result(frames: int, seed: int = 42) -> dict:
+    """Synthetic analysis result with per-frame vehicle detections"""
+    rng = random.Random(seed)
+    frame_analyses = []
+    for frame_id in range(0, frames * 5, 5):
+        vehicles = []
+        for _ in range(rng.randint(0, 15)):
+            x1, y1 = rng.uniform(0, 1200), rng.uniform(0, 650)
+            x2, y2 = x1 + rng.uniform(20, 200), y1 + rng.uniform(20, 120)
+            vehicles.append({
+                'class': rng.choice([2, 3, 5, 7]),
+                'confidence': rng.uniform(0.5, 0.99),
+                'bbox': [x1, y1, x2, y2],
+                'center': [(x1 + x2) / 2, (y1 + y2) / 2],
+            })
+        frame_analyses.append({
+            'frame_id': frame_id,
+            'vehicle_count': len(vehicles),
+            'vehicles': vehicles,
+        })
+
+    return {
+        'incident_detected': True,
+        'incident_type': 'congestion',
+        'confidence': 0.87,
+        'severity': 'high',
+        'vehicle_count': 14,
+        'max_vehicle_count': 21,
+        'avg_speed': 5.0,
+        'stationary_count': 4,
+        'frames_analyzed': len(frame_analyses),
+        'total_frames': frames * 5,
+        'analysis_time': 12.5,
+        'video_filename': 'kigali_junction.mp4',
+        'video_size_mb': 18.2,
+        'frame_analyses': frame_analyses,
+    }
+
+
+def current_body(payload: dict) -> bytes:
+    """Body as sent before the encoder existed (httpx json=)"""
+    return json.dumps(payload).encode('utf-8')
+
+
+def time_encode(fn, repeat: int) -> float:
+    """Median encode time in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark webhook payload encodings")
+    parser.add_argument('--frames', type=int, default=300, help='Per-frame entries in the result')
+    parser.add_argument('--repeat', type=int, default=50, help='Encode repetitions per variant')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    result = make_result(args.frames)
+    payload = build_payload(
+        incident_id=1234,
+        result=result,
+        confidence=result['confidence'],
+        vehicle_count=result['vehicle_count'],
+        incident_detected=True,
+        detected_type=result['incident_type'],
+    )
+
+    variants = [('current json', None)]
+    variants.append(('full json+gzip', PayloadEncoder('full', 'gzip', 'json')))
+    variants.append(('slim json', PayloadEncoder('slim', 'none', 'json')))
+    variants.append(('slim json+gzip', PayloadEncoder('slim', 'gzip', 'json', min_bytes=0)))
+    if zstandard is not None:
+        variants.append(('full json+zstd', PayloadEncoder('full', 'zstd', 'json')))
+        variants.append(('slim json+zstd', PayloadEncoder('slim', 'zstd', 'json', min_bytes=0)))
+    if msgpack is not None:
+        variants.append(('slim msgpack', PayloadEncoder('slim', 'none', 'msgpack')))
+        variants.append(('full msgpack+gzip', PayloadEncoder('full', 'gzip', 'msgpack')))
+
+    baseline = len(current_body(payload))
+    rows = []
+    for name, encoder in variants:
+        if encoder is None:
+            encode = lambda: current_body(payload)
+            size = baseline
+        else:
+            encode = lambda enc=encoder: enc.encode(enc.shape(payload))
+            size = len(encode()[0])
+        rows.append({
+            'variant': name,
+            'bytes': size,
+            'ratio': round(size / baseline, 4),
+            'encode_ms': round(time_encode(encode, args.repeat), 3),
+        })
+
+    print(f"\n📦 Webhook payload benchmark ({args.frames} per-frame entries)")
+    print(f"{'variant':<20} {'bytes':>10} {'ratio':>8} {'encode ms':>10}")
+    for row in rows:
+        print(f"{row['variant']:<20} {row['bytes']:>10} {row['ratio']:>8.3f} {row['encode_ms']:>10.3f}")
+    if zstandard is None or msgpack is None:
+        print("\nℹ️ Install 'zstandard' and 'msgpack' to include the optional variants")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'frames': args.frames, 'results': rows}, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
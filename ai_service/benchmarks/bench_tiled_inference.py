@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Tiled Inference Benchmark
+Compares vehicle recall and per-frame latency of tiled inference against
+running the whole frame at a larger imgsz.
+
+Recall is measured against the detections of the largest full-frame imgsz
+(pseudo ground truth), so use a high-resolution clip with distant traffic.
+
+Usage:
+    python benchmarks/bench_tiled_inference.py --video 4k_junction.mp4
+    python benchmarks/bench_tiled_inference.py --video 4k_junction.mp4 --imgsz 640 1280 2560 --output tiles.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tiled_inference import TiledDetector, TILE_SIZE
+
+VEHICLE_CLASSES = {2, 3, 5, 7}
+MIN_CONFIDENCE = float(os.getenv('MIN_CONFIDENCE', 0.5))
+
+
+def sample_frames(video_path: str, count: int) -> list:
+    """Consecutive frames from the middle of the video (motion skipping needs a sequence)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video file: {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, max(0, total // 2 - count // 2))
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def vehicles(detections) -> list:
+    return [d[2] for d in detections if d[0] in VEHICLE_CLASSES and d[1] >= MIN_CONFIDENCE]
+
+
+def full_frame_detect(model, imgsz: int):
+    def detect(frame):
+        result = model(frame, imgsz=imgsz, verbose=False)[0]
+        return [(int(b.cls[0]), float(b.conf[0]), b.xyxy[0].tolist()) for b in result.boxes]
+    return detect
+
+
+def tiled_detect(model, frame_shape, motion_skip: bool):
+    height, width = frame_shape[:2]
+    tiler = TiledDetector(width, height, motion_skip=motion_skip)
+
+    def detect(frame):
+        return tiler.detect(frame, lambda tiles: model(tiles, imgsz=TILE_SIZE, verbose=False))
+    return detect, tiler
+
+
+def iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def recall(predicted: list, reference: list, threshold: float = 0.5) -> float:
+    """Share of reference boxes greedily matched by a predicted box"""
+    if not reference:
+        return 1.0
+    unmatched = list(predicted)
+    matched = 0
+    for ref in reference:
+        best = max(range(len(unmatched)), key=lambda i: iou(ref, unmatched[i]), default=None)
+        if best is not None and iou(ref, unmatched[best]) >= threshold:
+            unmatched.pop(best)
+            matched += 1
+    return matched / len(reference)
+
+
+def run(detect, frames) -> tuple:
+    """Per-frame vehicle boxes and median latency in milliseconds"""
+    detect(frames[0])  # warm-up
+    boxes, samples = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        boxes.append(vehicles(detect(frame)))
+        samples.append((time.perf_counter() - start) * 1000)
+    return boxes, float(np.median(samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tiled inference against larger imgsz")
+    parser.add_argument('--video', required=True, help='High-resolution traffic video')
+    parser.add_argument('--frames', type=int, default=30, help='Consecutive frames to analyze')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640, 1280, 1920],
+                        help='Full-frame input sizes; the largest is the recall reference')
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH', './models/yolov8n.pt'))
+    parser.add_argument('--output', type=str, help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    frames = sample_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit("No frames could be read")
+    height, width = frames[0].shape[:2]
+
+    sizes = sorted(args.imgsz)
+    runs = {f'full imgsz={size}': run(full_frame_detect(model, size), frames) for size in sizes}
+    reference = runs[f'full imgsz={sizes[-1]}'][0]
+
+    tiling_stats = {}
+    for name, motion_skip in (('tiled', False), ('tiled + motion skip', True)):
+        detect, tiler = tiled_detect(model, frames[0].shape, motion_skip)
+        runs[f'{name} ({TILE_SIZE}px)'] = run(detect, frames)
+        tiling_stats[f'{name} ({TILE_SIZE}px)'] = dict(tiler.stats)
+
+    rows = []
+    for name, (boxes, latency) in runs.items():
+        rows.append({
+            'variant': name,
+            'latency_ms': round(latency, 1),
+            'vehicles_per_frame': round(float(np.mean([len(b) for b in boxes])), 2),
+            'recall': round(float(np.mean([recall(p, r) for p, r in zip(boxes, reference)])), 3),
+            'tiling': tiling_stats.get(name),
+        })
+
+    print(f"\n🧩 Tiled inference benchmark ({width}x{height}, {len(frames)} frames)")
+    print(f"   Recall reference: full frame at imgsz={sizes[-1]}")
+    print(f"{'variant':<30} {'ms/frame':>10} {'vehicles':>9} {'recall':>8}")
+    for row in rows:
+        print(f"{row['variant']:<30} {row['latency_ms']:>10.1f} {row['vehicles_per_frame']:>9.2f} {row['recall']:>8.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'video': args.video, 'resolution': [width, height], 'results': rows}, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
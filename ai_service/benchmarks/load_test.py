@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Replays synthetic or recorded clips against /ai/quick-analyze and
+/ai/analyze-traffic at fixed arrival rates and reports, per rate,
+throughput, p50/p95/p99 latency, error rate and backend notification lag.
+
+A stub webhook server in this process stands in for the Node backend's
+/webhook/analysis-complete (and its batch variant). Every upload gets a
+unique file name, and the final notification of an analysis carries it
+back as result.video_filename. Notification lag is the time from the
+upload's HTTP response to the webhook arriving at the stub.
+
+Arrivals are open-loop (Poisson by default): requests keep arriving at
+the configured rate however slowly the service answers, so a step past
+saturation shows up as rising latency and 429s instead of a slower
+client. The highest rate meeting the p95 targets and error budget is
+reported as the sustainable rate.
+
+Usage:
+    python benchmarks/load_test.py --spawn --rates 0.5 1 2 4 --duration 60
+    python benchmarks/load_test.py --spawn --clips ./recorded_clips --quick-share 1.0 --rates 2 4 8
+    # Against a running node started with BACKEND_URL=http://<this host>:3900
+    python benchmarks/load_test.py --url http://ai-node:8000 --webhook-host 0.0.0.0 --rates 1 2
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import httpx
+
+try:
+    import zstandard
+except ImportError:  # Only needed when the service compresses with zstd
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # Only needed when the service sends MessagePack
+    msgpack = None
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_VIDEO_DIR = os.path.join(tempfile.gettempdir(), 'trafficguard_synthetic')
+CLIP_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+ENDPOINTS = {'quick': '/ai/quick-analyze', 'analyze': '/ai/analyze-traffic'}
+
+
+def decode_webhook(body: bytes, headers) -> Dict:
+    """Undo the service's webhook encoding (gzip/zstd, JSON/MessagePack)"""
+    encoding = headers.get('Content-Encoding')
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Webhooks are zstd-compressed; install 'zstandard'")
+        body = zstandard.ZstdDecompressor().decompress(body)
+
+    if 'msgpack' in (headers.get('Content-Type') or ''):
+        if msgpack is None:
+            raise RuntimeError("Webhooks are MessagePack; install 'msgpack'")
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+class StubBackend:
+    """
+    Minimal stand-in for the Node backend's analysis webhooks.
+
+    Records when the final notification for each uploaded file name
+    arrives; provisional notifications are only counted.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, delay: float = 0.0):
+        self.delay = delay  # simulated backend processing time per webhook
+        self.arrivals: Dict[str, float] = {}
+        self.stats = {'requests': 0, 'batches': 0, 'notifications': 0, 'provisional': 0, 'bytes': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-backend', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        received = time.monotonic()
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        try:
+            payload = decode_webhook(body, request.headers)
+        except (ValueError, RuntimeError) as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            print(f"⚠️ Stub backend could not decode a webhook: {e}")
+            request.send_response(400)
+            request.end_headers()
+            return
+
+        if request.path.endswith('/batch'):
+            notifications = payload.get('notifications', [])
+        elif request.path.endswith('/webhook/analysis-complete'):
+            notifications = [payload]
+        else:
+            request.send_response(404)
+            request.end_headers()
+            return
+
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes'] += len(body)
+            self.stats['batches'] += request.path.endswith('/batch')
+            for notification in notifications:
+                self.stats['notifications'] += 1
+                result = notification.get('result') or {}
+                if result.get('provisional'):
+                    self.stats['provisional'] += 1
+                elif result.get('video_filename'):
+                    self.arrivals.setdefault(result['video_filename'], received)
+
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.end_headers()
+        request.wfile.write(b'{"success": true}')
+
+    def arrival(self, filename: str) -> Optional[float]:
+        with self._lock:
+            return self.arrivals.get(filename)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def load_clips(directory: Optional[str], synthetic_seconds: float) -> List[Dict]:
+    """Clip bytes held in memory, so reading them is not part of the measurement"""
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith(CLIP_EXTENSIONS))
+        if not names:
+            raise SystemExit(f"No clips ({', '.join(CLIP_EXTENSIONS)}) in {directory}")
+        paths = [os.path.join(directory, name) for name in names]
+    else:
+        from synthetic_video import spec, ensure_videos
+        paths = ensure_videos([
+            spec('720p', 30, 6, synthetic_seconds, seed=11),
+            spec('720p', 30, 14, synthetic_seconds, seed=12),
+            spec('720p', 30, 10, synthetic_seconds, stop_at=1.0, seed=13),
+        ], DEFAULT_VIDEO_DIR)
+
+    clips = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            clips.append({'name': os.path.basename(path), 'data': f.read()})
+    return clips
+
+
+def arrival_times(rate: float, duration: float, poisson: bool, rng: random.Random) -> List[float]:
+    """Send offsets (seconds) of an open-loop arrival process"""
+    times = []
+    at = rng.expovariate(rate) if poisson else 0.0
+    while at < duration:
+        times.append(at)
+        at += rng.expovariate(rate) if poisson else 1.0 / rate
+    return times
+
+
+async def send(client: httpx.AsyncClient, url: str, endpoint: str, clip: Dict,
+               filename: str, time_budget: Optional[float]) -> Dict:
+    """Upload one clip and time the response"""
+    data = {'time_budget': str(time_budget)} if time_budget else {}
+    started = time.monotonic()
+    try:
+        response = await client.post(
+            url + ENDPOINTS[endpoint], data=data,
+            files={'video': (filename, clip['data'], 'video/mp4')},
+        )
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    finished = time.monotonic()
+    return {'endpoint': endpoint, 'filename': filename, 'status': status,
+            'latency': finished - started, 'finished': finished}
+
+
+async def run_step(client: httpx.AsyncClient, url: str, clips: List[Dict], rate: float, args,
+                   step: int, rng: random.Random) -> List[Dict]:
+    """Fire one rate step's arrivals and wait for every response"""
+    in_flight = asyncio.Semaphore(args.max_in_flight)
+    step_started = time.monotonic()
+    tasks = []
+
+    async def fire(index: int, offset: float, endpoint: str):
+        await asyncio.sleep(max(0.0, step_started + offset - time.monotonic()))
+        clip = clips[index % len(clips)]
+        filename = f"load_s{step}_{index:05d}_{clip['name']}"
+        budget = args.quick_budget if endpoint == 'quick' else None
+        async with in_flight:
+            return await send(client, url, endpoint, clip, filename, budget)
+
+    for index, offset in enumerate(arrival_times(rate, args.duration, not args.uniform, rng)):
+        endpoint = 'quick' if rng.random() < args.quick_share else 'analyze'
+        tasks.append(asyncio.create_task(fire(index, offset, endpoint)))
+    return await asyncio.gather(*tasks)
+
+
+async def wait_for_notifications(stub: StubBackend, records: List[Dict], timeout: float):
+    """Give the notification dispatcher time to deliver the step's results"""
+    expected = [r['filename'] for r in records if r['endpoint'] == 'analyze' and r['status'] == 200]
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and any(stub.arrival(name) is None for name in expected):
+        await asyncio.sleep(0.2)
+
+
+def summarize(rate: float, records: List[Dict], stub: StubBackend, wall: float) -> Dict:
+    """Throughput, latency, errors and notification lag of one rate step"""
+    summary = {'rate': rate, 'sent': len(records), 'wall_seconds': round(wall, 1), 'endpoints': {}}
+    for endpoint in ENDPOINTS:
+        sent = [r for r in records if r['endpoint'] == endpoint]
+        if not sent:
+            continue
+        ok = [r for r in sent if r['status'] == 200]
+        latencies = [r['latency'] for r in ok]
+        statuses = {}
+        for r in sent:
+            if r['status'] != 200:
+                statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+        stats = {
+            'sent': len(sent),
+            'ok': len(ok),
+            'throughput_rps': round(len(ok) / wall, 2) if wall > 0 else 0.0,
+            'error_rate': round(1 - len(ok) / len(sent), 3),
+            'errors': statuses,
+            'latency_s': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+            },
+        }
+        if endpoint == 'analyze':
+            lags = []
+            missing = 0
+            for r in ok:
+                arrived = stub.arrival(r['filename'])
+                if arrived is None:
+                    missing += 1
+                else:
+                    # The webhook is queued before the response is sent, so it can win the race
+                    lags.append(max(0.0, arrived - r['finished']))
+            stats['notifications'] = {
+                'delivered': len(lags),
+                'missing': missing,
+                'lag_s': {
+                    'p50': round(percentile(lags, 50), 3),
+                    'p95': round(percentile(lags, 95), 3),
+                    'p99': round(percentile(lags, 99), 3),
+                },
+            }
+        summary['endpoints'][endpoint] = stats
+    return summary
+
+
+def meets_targets(summary: Dict, args) -> bool:
+    targets = {'quick': args.quick_p95, 'analyze': args.analyze_p95}
+    for endpoint, stats in summary['endpoints'].items():
+        if stats['error_rate'] > args.max_error_rate:
+            return False
+        if targets[endpoint] and stats['latency_s']['p95'] > targets[endpoint]:
+            return False
+    return True
+
+
+def spawn_service(port: int, backend_url: str, workdir: str) -> subprocess.Popen:
+    """Start main.py with its webhooks pointed at the stub backend"""
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        HOST='127.0.0.1',
+        BACKEND_URL=backend_url,
+        NOTIFY_OUTBOX_PATH=os.path.join(workdir, 'outbox.db'),
+    )
+    return subprocess.Popen([sys.executable, 'main.py'], cwd=SERVICE_DIR, env=env)
+
+
+async def wait_until_ready(url: str, service: Optional[subprocess.Popen], timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5) as client:
+        while time.monotonic() < deadline:
+            if service is not None and service.poll() is not None:
+                raise SystemExit(f"AI service exited with code {service.returncode}")
+            try:
+                if (await client.get(url + '/health')).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(1)
+    raise SystemExit(f"AI service at {url} not ready after {timeout:.0f}s")
+
+
+async def run(args, clips: List[Dict], stub: StubBackend) -> List[Dict]:
+    rng = random.Random(args.seed)
+    summaries = []
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        for step, rate in enumerate(args.rates):
+            print(f"🚦 {rate:g} uploads/s for {args.duration:g}s...")
+            started = time.monotonic()
+            records = await run_step(client, args.url, clips, rate, args, step, rng)
+            wall = time.monotonic() - started
+            await wait_for_notifications(stub, records, args.notify_timeout)
+            summary = summarize(rate, records, stub, wall)
+            summary['meets_targets'] = meets_targets(summary, args)
+            summaries.append(summary)
+            if args.cooldown:
+                await asyncio.sleep(args.cooldown)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the AI service with a stub webhook backend")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='AI service base URL')
+    parser.add_argument('--spawn', action='store_true', help='Start main.py on the --url port, wired to the stub')
+    parser.add_argument('--clips', help='Directory of recorded clips (default: generated clips)')
+    parser.add_argument('--clip-seconds', type=float, default=5.0, help='Duration of generated clips')
+    parser.add_argument('--rates', type=float, nargs='+', default=[0.5, 1, 2], help='Arrival rates to step through (uploads/s)')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of arrivals per rate')
+    parser.add_argument('--quick-share', type=float, default=0.5, help='Fraction of uploads sent to /ai/quick-analyze')
+    parser.add_argument('--quick-budget', type=float, help='time_budget sent with quick uploads (e.g. 3)')
+    parser.add_argument('--uniform', action='store_true', help='Evenly spaced arrivals instead of Poisson')
+    parser.add_argument('--max-in-flight', type=int, default=64, help='Cap on concurrent uploads')
+    parser.add_argument('--request-timeout', type=float, default=300.0)
+    parser.add_argument('--quick-p95', type=float, default=3.0, help='p95 latency target for quick uploads (s)')
+    parser.add_argument('--analyze-p95', type=float, help='p95 latency target for full analyses (s)')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Error budget, 429s included')
+    parser.add_argument('--webhook-host', default='127.0.0.1', help='Stub backend bind address')
+    parser.add_argument('--webhook-port', type=int, default=3900, help='Stub backend port')
+    parser.add_argument('--webhook-delay', type=float, default=0.0, help='Simulated backend time per webhook (s)')
+    parser.add_argument('--notify-timeout', type=float, default=30.0, help='Wait for late webhooks after each step (s)')
+    parser.add_argument('--cooldown', type=float, default=5.0, help='Idle seconds between rate steps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, help='Write results as JSON to this path')
+    args = parser.parse_args()
+    if min(args.rates) <= 0:
+        parser.error("--rates must be positive")
+    args.url = args.url.rstrip('/')
+
+    clips = load_clips(args.clips, args.clip_seconds)
+    stub = StubBackend(args.webhook_host, args.webhook_port, args.webhook_delay)
+    stub.start()
+    print(f"🪝 Stub backend on port {stub.port}")
+
+    service = None
+    workdir = tempfile.mkdtemp(prefix='trafficguard_load_')
+    try:
+        if args.spawn:
+            port = int(args.url.rsplit(':', 1)[1])
+            service = spawn_service(port, f"http://127.0.0.1:{stub.port}", workdir)
+        asyncio.run(wait_until_ready(args.url, service, timeout=180))
+        summaries = asyncio.run(run(args, clips, stub))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait(timeout=30)
+        stub.stop()
+
+    print(f"\n{'rate/s':>7} {'endpoint':<9} {'sent':>5} {'ok/s':>6} {'err %':>6} "
+          f"{'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'notify p95 s':>13} {'missing':>8}")
+    for summary in summaries:
+        for endpoint, stats in summary['endpoints'].items():
+            latency = stats['latency_s']
+            notifications = stats.get('notifications')
+            lag = f"{notifications['lag_s']['p95']:>13.3f}" if notifications else f"{'-':>13}"
+            missing = f"{notifications['missing']:>8}" if notifications else f"{'-':>8}"
+            print(f"{summary['rate']:>7g} {endpoint:<9} {stats['sent']:>5} {stats['throughput_rps']:>6.2f} "
+                  f"{stats['error_rate'] * 100:>6.1f} {latency['p50']:>7.2f} {latency['p95']:>7.2f} "
+                  f"{latency['p99']:>7.2f} {lag} {missing}")
+    print(f"\n🪝 Stub backend: {stub.stats['notifications']} notifications in {stub.stats['requests']} "
+          f"requests ({stub.stats['batches']} batched, {stub.stats['provisional']} provisional)")
+
+    sustained = [s['rate'] for s in summaries if s['meets_targets']]
+    if sustained:
+        print(f"✅ Highest rate within targets: {max(sustained):g} uploads/s")
+    else:
+        print("❌ No rate met the latency targets and error budget")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'url': args.url,
+                'clips': [c['name'] for c in clips],
+                'settings': {k: v for k, v in vars(args).items() if k not in ('output',)},
+                'stub_backend': stub.stats,
+                'steps': summaries,
+            }, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
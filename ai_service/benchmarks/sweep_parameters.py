@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Accuracy vs Cost Sweep
+Runs a labelled clip set through TrafficAnalyzer across a grid of
+FRAME_SKIP, INPUT_RESOLUTION and MIN_CONFIDENCE values and prints the
+Pareto frontier of incident-detection accuracy against CPU-seconds per
+minute of video.
+
+Inference runs once per clip and input resolution, on every frame any
+FRAME_SKIP in the grid would sample, at the lowest confidence in the grid.
+The per-frame detections and CPU times are cached on disk. Frame skip and
+confidence points are then scored from the cache with the analyzer's own
+consolidation, so widening the threshold grid costs no inference.
+
+Labels are a JSON file mapping clip file names to the expected incident
+type ('none', 'congestion', 'accident', 'road_blockage'):
+    {"junction_morning.mp4": "congestion", "empty_road.mp4": "none"}
+
+Usage:
+    python benchmarks/sweep_parameters.py --clips ./labelled_clips --labels ./labelled_clips/labels.json
+    python benchmarks/sweep_parameters.py --clips ./labelled_clips --labels labels.json \\
+        --frame-skip 2 5 10 --imgsz 320 480 640 --confidence 0.3 0.5 0.7 --output sweep.json
+    python benchmarks/sweep_parameters.py --synthetic   # harness check on generated clips
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from functools import reduce
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from traffic_analyzer import TrafficAnalyzer
+from synthetic_video import spec, ensure_videos
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'trafficguard_sweep_cache')
+MODEL_PATH = os.getenv('MODEL_PATH', './models/yolov8n.pt')
+
+
+def file_digest(path: str) -> str:
+    """Content hash of a clip, so renamed or replaced clips are cached correctly"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class DetectionCache:
+    """Per-clip detections and CPU times for one (imgsz, stride, confidence floor)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._analyzer = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, imgsz: int, stride: int, floor: float) -> dict:
+        model = os.path.splitext(os.path.basename(MODEL_PATH))[0]
+        key = f"{file_digest(path)}_{model}_{imgsz}_{stride}_{floor:g}.json"
+        cache_path = os.path.join(self.directory, key)
+        if os.path.exists(cache_path):
+            self.hits += 1
+            with open(cache_path) as f:
+                return json.load(f)
+
+        self.misses += 1
+        entry = self._detect(path, imgsz, stride, floor)
+        with open(cache_path + '.part', 'w') as f:
+            json.dump(entry, f)
+        os.replace(cache_path + '.part', cache_path)
+        return entry
+
+    def _detect(self, path: str, imgsz: int, stride: int, floor: float) -> dict:
+        if self._analyzer is None:
+            self._analyzer = TrafficAnalyzer()
+        analyzer = self._analyzer
+        analyzer.min_confidence = floor
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise SystemExit(f"Could not open video file: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+
+        # CPU time (all threads of this process) rather than wall time
+        decode_cpu = 0.0
+        frames = {}
+        frame_id = 0
+        while True:
+            start = time.process_time()
+            ret, frame = cap.read()
+            decode_cpu += time.process_time() - start
+            if not ret:
+                break
+            if frame_id % stride == 0:
+                start = time.process_time()
+                analysis = analyzer._analyze_frame(frame, frame_id, imgsz)
+                frames[str(frame_id)] = {
+                    'cpu': time.process_time() - start,
+                    'vehicles': analysis['vehicles'] if analysis else [],
+                }
+            frame_id += 1
+        cap.release()
+
+        return {'fps': fps, 'total_frames': frame_id, 'decode_cpu': decode_cpu, 'frames': frames}
+
+
+def score(scorer: TrafficAnalyzer, entry: dict, frame_skip: int, confidence: float) -> tuple:
+    """(predicted incident type, CPU seconds) for one clip at one operating point"""
+    scorer.frame_skip = frame_skip
+    frame_analyses = []
+    cpu = entry['decode_cpu']
+    for frame_id in range(0, entry['total_frames'], frame_skip):
+        cached = entry['frames'].get(str(frame_id))
+        if cached is None:
+            continue
+        cpu += cached['cpu']
+        vehicles = [v for v in cached['vehicles'] if v['confidence'] >= confidence]
+        frame_analyses.append({'frame_id': frame_id, 'vehicle_count': len(vehicles), 'vehicles': vehicles})
+    result = scorer._consolidate_results(frame_analyses, entry['fps'], entry['total_frames'])
+    return result['incident_type'], cpu
+
+
+def pareto_frontier(points: list) -> list:
+    """Points not beaten on both accuracy (higher) and cost (lower)"""
+    frontier = []
+    best = -1.0
+    for point in sorted(points, key=lambda p: (p['cpu_s_per_video_min'], -p['accuracy'])):
+        if point['accuracy'] > best:
+            frontier.append(point)
+            best = point['accuracy']
+    return frontier
+
+
+def synthetic_clips(directory: str) -> tuple:
+    """Small generated clip set with nominal labels, for checking the harness end to end"""
+    specs = [
+        (spec('720p', 30, 2, 10.0, seed=1), 'none'),
+        (spec('720p', 30, 3, 10.0, seed=2), 'none'),
+        (spec('720p', 30, 16, 10.0, stop_at=2.0, seed=3), 'accident'),
+        (spec('720p', 30, 8, 10.0, stop_at=1.0, seed=4), 'accident'),
+    ]
+    paths = ensure_videos([s for s, _ in specs], directory)
+    return paths, {os.path.basename(p): label for p, (_, label) in zip(paths, specs)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep sampling/resolution/confidence against accuracy and cost")
+    parser.add_argument('--clips', help='Directory of labelled clips')
+    parser.add_argument('--labels', help='JSON mapping clip file name to incident type')
+    parser.add_argument('--synthetic', action='store_true', help='Use generated clips instead of --clips')
+    parser.add_argument('--frame-skip', type=int, nargs='+', default=[2, 5, 10])
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[320, 480, 640])
+    parser.add_argument('--confidence', type=float, nargs='+', default=[0.3, 0.4, 0.5, 0.6, 0.7],
+                        help='MIN_CONFIDENCE values (YOLO drops boxes below 0.25 regardless)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Where per-frame detections are cached')
+    parser.add_argument('--output', type=str, help='Write all points and the frontier as JSON')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        paths, labels = synthetic_clips(os.path.join(tempfile.gettempdir(), 'trafficguard_synthetic'))
+    else:
+        if not args.clips or not args.labels:
+            parser.error("--clips and --labels are required unless --synthetic is given")
+        with open(args.labels) as f:
+            labels = json.load(f)
+        paths = [os.path.join(args.clips, name) for name in sorted(labels)]
+        missing = [p for p in paths if not os.path.exists(p)]
+        if missing:
+            raise SystemExit(f"Labelled clips not found: {', '.join(missing)}")
+
+    # One inference pass per resolution covers every frame skip in the grid
+    stride = reduce(math.gcd, args.frame_skip)
+    floor = min(args.confidence)
+    cache = DetectionCache(args.cache_dir)
+    scorer = TrafficAnalyzer(load_model=False)
+
+    points = []
+    for imgsz in sorted(args.imgsz):
+        print(f"🔎 Detections at imgsz={imgsz} (every {stride} frame(s), conf >= {floor:g})")
+        entries = {path: cache.get(path, imgsz, stride, floor) for path in paths}
+        video_minutes = sum(e['total_frames'] / e['fps'] for e in entries.values()) / 60
+
+        for frame_skip, confidence in itertools.product(sorted(args.frame_skip), sorted(args.confidence)):
+            correct = 0
+            cpu = 0.0
+            predictions = {}
+            for path, entry in entries.items():
+                predicted, clip_cpu = score(scorer, entry, frame_skip, confidence)
+                name = os.path.basename(path)
+                predictions[name] = predicted
+                correct += predicted == labels[name]
+                cpu += clip_cpu
+            points.append({
+                'frame_skip': frame_skip,
+                'imgsz': imgsz,
+                'min_confidence': confidence,
+                'accuracy': round(correct / len(paths), 3),
+                'cpu_s_per_video_min': round(cpu / video_minutes, 2) if video_minutes else 0.0,
+                'predictions': predictions,
+            })
+
+    frontier = pareto_frontier(points)
+    on_frontier = {id(p) for p in frontier}
+
+    print(f"\n📊 {len(points)} operating points on {len(paths)} clips "
+          f"(cache: {cache.hits} hits, {cache.misses} misses)")
+    print(f"{'':2}{'FRAME_SKIP':>10} {'imgsz':>6} {'conf':>5} {'accuracy':>9} {'CPU s/video min':>16}")
+    for point in sorted(points, key=lambda p: p['cpu_s_per_video_min']):
+        mark = '★ ' if id(point) in on_frontier else '  '
+        print(f"{mark}{point['frame_skip']:>10} {point['imgsz']:>6} {point['min_confidence']:>5.2f} "
+              f"{point['accuracy']:>9.3f} {point['cpu_s_per_video_min']:>16.2f}")
+    print("\n★ = Pareto frontier (no other point is both cheaper and more accurate)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'clips': len(paths), 'labels': labels, 'points': points, 'frontier': frontier}, f, indent=2)
+        print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
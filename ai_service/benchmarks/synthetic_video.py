@@ -0,0 +1,191 @@
+"""
+Synthetic Traffic Videos
+Deterministic test videos drawn with OpenCV: car sprites moving along the
+lanes of a road at a chosen resolution, frame rate and vehicle density,
+optionally inside a screen-recording frame (black bars and player controls).
+
+The same spec and seed always produce the same frames, so benchmark runs
+on different commits analyze identical input.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+VEHICLE_COLORS = [
+    (40, 40, 200), (200, 60, 30), (230, 230, 230), (30, 30, 30),
+    (60, 160, 60), (0, 200, 230), (150, 150, 150), (120, 40, 120),
+]
+
+RESOLUTIONS = {
+    '360p': (640, 360),
+    '720p': (1280, 720),
+    '1080p': (1920, 1080),
+}
+
+
+def spec(resolution: str = '720p', fps: int = 30, vehicles: int = 10, seconds: float = 10.0,
+         screen: bool = False, stop_at: Optional[float] = None, seed: int = 0) -> Dict:
+    """
+    Describe a synthetic video.
+
+    Args:
+        resolution: Key of RESOLUTIONS
+        fps: Frame rate
+        vehicles: Number of vehicles on the road
+        seconds: Duration
+        screen: Wrap the road in a screen-recording frame
+        stop_at: Optional time at which the two leading vehicles stop
+            (a stationary-vehicle incident)
+        seed: Random seed for vehicle placement, speed and colour
+    """
+    width, height = RESOLUTIONS[resolution]
+    name = f"synthetic_{resolution}_{fps}fps_{vehicles}veh_{seconds:g}s"
+    if screen:
+        name += '_screen'
+    if stop_at is not None:
+        name += f'_stop{stop_at:g}'
+    name += f'_seed{seed}'
+    return {
+        'name': name, 'resolution': resolution, 'width': width, 'height': height,
+        'fps': fps, 'vehicles': vehicles, 'seconds': seconds, 'screen': screen,
+        'stop_at': stop_at, 'seed': seed,
+    }
+
+
+def scenario_matrix(preset: str = 'quick', seconds: float = 10.0) -> List[Dict]:
+    """Video specs for a benchmark preset ('quick' or 'full')"""
+    if preset == 'quick':
+        return [
+            spec('360p', 15, 5, seconds),
+            spec('720p', 30, 15, seconds),
+            spec('720p', 30, 10, seconds, screen=True),
+        ]
+    if preset == 'full':
+        specs = [
+            spec(resolution, fps, vehicles, seconds)
+            for resolution in RESOLUTIONS for fps in (15, 30) for vehicles in (3, 12, 30)
+        ]
+        specs += [spec(resolution, 30, 12, seconds, screen=True) for resolution in ('720p', '1080p')]
+        return specs
+    raise ValueError(f"Unknown preset: {preset}")
+
+
+class _Road:
+    """Static background and vehicle plan for one spec"""
+
+    def __init__(self, video: Dict):
+        self.width, self.height = video['width'], video['height']
+        self.fps = video['fps']
+        rng = np.random.RandomState(video['seed'])
+
+        lanes = 4
+        self.road_top = int(self.height * 0.3)
+        self.road_bottom = int(self.height * 0.9)
+        self.lane_height = (self.road_bottom - self.road_top) / lanes
+
+        # Static textured background: verge, asphalt and dashed lane markings
+        background = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        background[:] = (70, 120, 70)
+        background[self.road_top:self.road_bottom] = (75, 75, 75)
+        noise = rng.randint(-12, 13, size=(self.height, self.width, 1))
+        background = np.clip(background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        dash = max(10, self.width // 32)
+        for lane in range(1, lanes):
+            y = int(self.road_top + lane * self.lane_height)
+            for x in range(0, self.width, dash * 2):
+                cv2.line(background, (x, y), (x + dash, y), (220, 220, 220), max(1, self.height // 360))
+        self.background = background
+
+        vehicle_height = int(self.lane_height * 0.6)
+        self.vehicles = []
+        for i in range(video['vehicles']):
+            lane = i % lanes
+            length = int(vehicle_height * rng.uniform(1.8, 3.0))
+            direction = 1 if lane < lanes // 2 else -1
+            self.vehicles.append({
+                'lane': lane,
+                'length': length,
+                'height': vehicle_height,
+                'offset': rng.uniform(0, self.width + length),
+                'speed': rng.uniform(0.08, 0.25) * self.width * direction,  # pixels per second
+                'color': VEHICLE_COLORS[rng.randint(len(VEHICLE_COLORS))],
+            })
+
+        # The two leading vehicles stop at stop_at seconds
+        self.stop_frame = None if video['stop_at'] is None else int(video['stop_at'] * self.fps)
+
+    def frame(self, index: int) -> np.ndarray:
+        frame = self.background.copy()
+        for i, vehicle in enumerate(self.vehicles):
+            moving_frames = index
+            if self.stop_frame is not None and i < 2:
+                moving_frames = min(index, self.stop_frame)
+            span = self.width + vehicle['length']
+            travelled = (vehicle['offset'] + vehicle['speed'] * moving_frames / self.fps) % span
+            x = int(travelled - vehicle['length'])
+            y = int(self.road_top + vehicle['lane'] * self.lane_height + self.lane_height * 0.2)
+            _draw_car(frame, x, y, vehicle['length'], vehicle['height'], vehicle['color'])
+        return frame
+
+
+def _draw_car(frame: np.ndarray, x: int, y: int, length: int, height: int, color):
+    """Side view of a car: body, cabin with windows and wheels"""
+    dark = tuple(int(c * 0.6) for c in color)
+    cv2.rectangle(frame, (x, y + height // 3), (x + length, y + height - height // 6), color, -1)
+    cv2.rectangle(frame, (x + length // 5, y), (x + length * 4 // 5, y + height // 3), dark, -1)
+    window = (180, 200, 210)
+    cv2.rectangle(frame, (x + length // 4, y + height // 12), (x + length // 2 - 2, y + height // 3), window, -1)
+    cv2.rectangle(frame, (x + length // 2 + 2, y + height // 12), (x + length * 3 // 4, y + height // 3), window, -1)
+    radius = max(2, height // 6)
+    for wheel_x in (x + length // 5, x + length * 4 // 5):
+        cv2.circle(frame, (wheel_x, y + height - height // 6), radius, (20, 20, 20), -1)
+
+
+def _screen_frame(content: np.ndarray, index: int, total: int) -> np.ndarray:
+    """Letterbox the road inside black bars with a video player control bar"""
+    height, width = content.shape[:2]
+    canvas = np.zeros_like(content)
+    inner_w, inner_h = int(width * 0.7), int(height * 0.7)
+    x0, y0 = (width - inner_w) // 2, (height - inner_h) // 2
+    canvas[y0:y0 + inner_h, x0:x0 + inner_w] = cv2.resize(content, (inner_w, inner_h), interpolation=cv2.INTER_AREA)
+
+    bar_y = y0 + inner_h + max(4, height // 60)
+    cv2.rectangle(canvas, (x0, bar_y), (x0 + inner_w, bar_y + max(3, height // 120)), (90, 90, 90), -1)
+    progress = x0 + int(inner_w * index / max(1, total - 1))
+    cv2.rectangle(canvas, (x0, bar_y), (progress, bar_y + max(3, height // 120)), (40, 40, 220), -1)
+    return canvas
+
+
+def generate_video(video: Dict, path: str) -> str:
+    """Write the video described by spec() to path (mp4)"""
+    road = _Road(video)
+    total = int(round(video['seconds'] * video['fps']))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), video['fps'], (video['width'], video['height']))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open a video writer for {path}")
+    try:
+        for index in range(total):
+            frame = road.frame(index)
+            if video['screen']:
+                frame = _screen_frame(frame, index, total)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def ensure_videos(specs: List[Dict], directory: str) -> List[str]:
+    """Generate the videos that do not exist yet in directory; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for video in specs:
+        path = os.path.join(directory, f"{video['name']}.mp4")
+        if not os.path.exists(path):
+            print(f"🎬 Generating {video['name']}")
+            generate_video(video, path + '.part.mp4')
+            os.replace(path + '.part.mp4', path)
+        paths.append(path)
+    return paths
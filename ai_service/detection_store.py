@@ -0,0 +1,243 @@
+"""
+Detection Store - Per-frame detections kept for re-consolidation
+Writes the vehicle detections of an analysis as memory-mapped NumPy columns,
+so incident thresholds can be re-tuned by re-running consolidation over the
+stored detections instead of re-running YOLO on the videos
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from array import array
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+DETECTION_STORE = os.getenv('DETECTION_STORE', 'false').lower() == 'true'
+DETECTION_STORE_DIR = os.getenv('DETECTION_STORE_DIR', './detections')
+
+# Analyzer settings re-consolidation may override
+THRESHOLDS = (
+    'congestion_vehicle_threshold', 'congestion_speed_threshold', 'accident_stationary_threshold',
+    'min_confidence',
+)
+
+# Thresholds that only affect consolidation, so are left out of the store
+# name: re-analyzing with new values replaces the earlier store
+CONSOLIDATION_ONLY = (
+    'congestion_vehicle_threshold', 'congestion_speed_threshold', 'accident_stationary_threshold',
+)
+
+# Column files of a store; rows of the detection columns belong to frame i
+# from frame_offset[i] to frame_offset[i + 1]
+FRAME_COLUMNS = ('frame_id', 'frame_offset')
+DETECTION_COLUMNS = ('class', 'confidence', 'bbox')
+
+
+def video_digest(path: str) -> str:
+    """Content hash of a video, so renamed or re-uploaded videos map to the same store"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class DetectionRecorder:
+    """
+    Collects the vehicle detections of one analysis, frame by frame.
+
+    Values go into typed arrays (a few bytes per value) as frames are
+    analyzed, so recording stays cheap next to the analyzers' own frame
+    log; save() writes them as .npy columns.
+    """
+
+    def __init__(self):
+        self.frame_ids = array('q')
+        self.offsets = array('q', [0])
+        self.classes = array('h')
+        self.confidences = array('f')
+        self.boxes = array('f')
+
+    def add(self, analysis: Dict):
+        """Record one frame analysis (before the frame log compacts it)"""
+        self.frame_ids.append(analysis['frame_id'])
+        for vehicle in analysis['vehicles']:
+            self.classes.append(vehicle['class'])
+            self.confidences.append(vehicle['confidence'])
+            self.boxes.extend(vehicle['bbox'])
+        self.offsets.append(len(self.classes))
+
+    def save(self, video_path: str, meta: Dict, directory: str = DETECTION_STORE_DIR) -> str:
+        """
+        Write the columns and metadata of this analysis.
+
+        Args:
+            video_path: Analyzed video (hashed for the store name)
+            meta: Analyzer, sampling and threshold settings of the analysis
+            directory: Root directory of the stores
+
+        Returns:
+            str: Path of the store, replacing any earlier store of the same
+            video and detection settings
+        """
+        capture = {key: value for key, value in meta.items() if key not in CONSOLIDATION_ONLY}
+        fingerprint = hashlib.sha1(json.dumps(capture, sort_keys=True, default=str).encode()).hexdigest()[:8]
+        path = os.path.join(directory, f"{video_digest(video_path)}_{meta['analyzer']}_{fingerprint}")
+        partial = path + '.part'
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+
+        columns = {
+            'frame_id': np.frombuffer(self.frame_ids, dtype=np.int64),
+            'frame_offset': np.frombuffer(self.offsets, dtype=np.int64),
+            'class': np.frombuffer(self.classes, dtype=np.int16),
+            'confidence': np.frombuffer(self.confidences, dtype=np.float32),
+            'bbox': np.frombuffer(self.boxes, dtype=np.float32).reshape(-1, 4),
+        }
+        for name, values in columns.items():
+            np.save(os.path.join(partial, f"{name}.npy"), values)
+        with open(os.path.join(partial, 'meta.json'), 'w') as f:
+            json.dump({
+                **meta,
+                'video': video_path,
+                'frames': len(self.frame_ids),
+                'detections': len(self.classes),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }, f, indent=2, default=str)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(partial, path)
+        logger.debug("💾 Stored %d detections over %d frames in %s", len(self.classes), len(self.frame_ids), path)
+        return path
+
+
+class DetectionStore:
+    """The stored detections of one analysis, memory-mapped column by column"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.columns = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in FRAME_COLUMNS + DETECTION_COLUMNS
+        }
+
+    def __len__(self) -> int:
+        return len(self.columns['frame_id'])
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Time of each stored frame in seconds"""
+        return self.columns['frame_id'] / self.meta['fps']
+
+    def frame_analyses(self, min_confidence: Optional[float] = None) -> List[Dict]:
+        """
+        Rebuild the analyzer's per-frame analyses.
+
+        Args:
+            min_confidence: Drop detections below this confidence. Values
+                below the confidence the analysis ran with have no effect,
+                as weaker detections were never stored.
+
+        Returns:
+            List of frame analyses in the form _consolidate_results reads
+        """
+        classes = self.columns['class'].tolist()
+        confidences = self.columns['confidence'].tolist()
+        boxes = self.columns['bbox'].tolist()
+        offsets = self.columns['frame_offset'].tolist()
+        test_mode = self.meta.get('test_mode', False)
+
+        analyses = []
+        for i, frame_id in enumerate(self.columns['frame_id'].tolist()):
+            vehicles = []
+            for j in range(offsets[i], offsets[i + 1]):
+                if min_confidence is not None and confidences[j] < min_confidence:
+                    continue
+                x1, y1, x2, y2 = boxes[j]
+                vehicles.append({
+                    'class': classes[j],
+                    'confidence': confidences[j],
+                    'bbox': boxes[j],
+                    'center': [(x1 + x2) / 2, (y1 + y2) / 2],
+                })
+            analysis = {'frame_id': frame_id, 'vehicle_count': len(vehicles), 'vehicles': vehicles}
+            if test_mode:
+                analysis['test_mode'] = True
+            analyses.append(analysis)
+        return analyses
+
+
+def find_stores(paths: List[str]) -> Iterator[str]:
+    """Store directories given directly or found under the given directories"""
+    for path in paths:
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.endswith('.part'))
+            if 'meta.json' in files:
+                dirs[:] = []
+                yield root
+
+
+def load_consolidator(name: str):
+    """An analyzer of the given class name, without a model, for consolidation only"""
+    if name == 'EnhancedTrafficAnalyzer':
+        from enhanced_traffic_analyzer import EnhancedTrafficAnalyzer
+        return EnhancedTrafficAnalyzer(load_model=False)
+    if name == 'TrafficAnalyzer':
+        from traffic_analyzer import TrafficAnalyzer
+        return TrafficAnalyzer(load_model=False)
+    raise ValueError(f"Unknown analyzer: {name}")
+
+
+def reconsolidate(path: str, thresholds: Optional[Dict] = None, analyzer=None) -> Dict:
+    """
+    Recompute an analysis result from stored detections with new thresholds.
+
+    Args:
+        path: Store directory
+        thresholds: Analyzer settings to use instead of the stored ones
+            (any of THRESHOLDS); omitted settings keep the stored values
+        analyzer: Analyzer to consolidate with (one without a model is
+            created from the stored analyzer name otherwise); its settings
+            are overwritten
+
+    Returns:
+        dict with the consolidated result, as analyze_video returns it
+    """
+    thresholds = {name: value for name, value in (thresholds or {}).items() if value is not None}
+    unknown = set(thresholds) - set(THRESHOLDS)
+    if unknown:
+        raise ValueError(f"Unknown thresholds: {', '.join(sorted(unknown))}")
+
+    store = DetectionStore(path)
+    meta = store.meta
+    analyzer = analyzer or load_consolidator(meta['analyzer'])
+    # The stored FRAME_SKIP normalizes movement between the stored frames
+    analyzer.frame_skip = meta['frame_skip']
+    settings = {name: meta[name] for name in THRESHOLDS}
+    settings.update(thresholds)
+    for name, value in settings.items():
+        setattr(analyzer, name, value)
+
+    min_confidence = settings.get('min_confidence')
+    analyses = store.frame_analyses(min_confidence)
+    if meta.get('nominal_gap'):
+        result = analyzer._consolidate_results(analyses, meta['fps'], meta['total_frames'], meta['nominal_gap'])
+    else:
+        result = analyzer._consolidate_results(analyses, meta['fps'], meta['total_frames'])
+    result['thresholds'] = settings
+    return result
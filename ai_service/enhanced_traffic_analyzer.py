@@ -1,13 +1,25 @@
 import cv2
 import numpy as np
 from ultralytics import YOLO
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from screen_preprocessing import preprocess_screen_capture
+from progressive_results import ProvisionalEmitter
+from analysis_region import RegionOfInterest, frame_window, seek
+from adaptive_sampling import AdaptiveSampler, ADAPTIVE_SAMPLING
+from stage_timing import StageTimer, NULL_TIMER
+from memory_budget import FrameLog
+from detection_store import DetectionRecorder, DETECTION_STORE
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class TemporalAnalyzer:
     """
@@ -135,13 +147,13 @@ class ScreenVideoPreprocessor:
         margin_h, margin_w = int(h * 0.1), int(w * 0.1)
         return frame[margin_h:h-margin_h, margin_w:w-margin_w]
     
-    def enhance_low_resolution(self, frame: np.ndarray) -> np.ndarray:
+    def enhance_low_resolution(self, frame: np.ndarray, tier: str = 'full') -> np.ndarray:
         """
         Enhanced preprocessing for screen-captured frames
         Uses the new preprocess_screen_capture module for better results
         """
         # Use the enhanced preprocessing from screen_preprocessing module
-        return preprocess_screen_capture(frame)
+        return preprocess_screen_capture(frame, tier)
 
 
 class EnhancedTrafficAnalyzer:
@@ -151,14 +163,23 @@ class EnhancedTrafficAnalyzer:
     2. Screen-recorded videos (YouTube, etc.)
     """
     
-    def __init__(self):
-        model_path = os.getenv('MODEL_PATH', './models/yolov8n.pt')
-        self.model = YOLO(model_path)
+    def __init__(self, load_model: bool = True):
+        """
+        Args:
+            load_model: Set False for consolidation-only use (e.g. re-scoring
+                stored detections) to skip loading YOLO
+        """
+        self.model_path = os.getenv('MODEL_PATH', './models/yolov8n.pt')
+        self.model = YOLO(self.model_path) if load_model else None
+        # YOLO predictors are not thread-safe; serialize calls across inference workers
+        self._model_lock = threading.Lock()
         
         # Detection parameters
         self.frame_skip = int(os.getenv('FRAME_SKIP', 5))
         self.input_size = int(os.getenv('INPUT_RESOLUTION', 640))
         self.min_confidence = float(os.getenv('MIN_CONFIDENCE', 0.5))
+        self.adaptive_sampling = ADAPTIVE_SAMPLING  # vary the frame skip with scene activity
+        self.store_detections = DETECTION_STORE  # keep per-frame detections for re-consolidation
         
         # Screen video detection (lower confidence for screen recordings)
         self.screen_min_confidence = 0.25  # Lower threshold for screen videos
@@ -174,9 +195,6 @@ class EnhancedTrafficAnalyzer:
         
         # Preprocessor for screen videos
         self.preprocessor = ScreenVideoPreprocessor()
-        
-        # Temporal analyzer for multi-frame confirmation
-        self.temporal_analyzer = TemporalAnalyzer(max_history=30)
     
     def is_screen_recording(self, frame: np.ndarray) -> bool:
         """
@@ -203,18 +221,38 @@ class EnhancedTrafficAnalyzer:
         
         return dark_borders >= 2
     
-    def analyze_video(self, video_path: str, test_mode: bool = False) -> Dict:
+    def analyze_video(self, video_path: str, test_mode: bool = False, scheduler_job=None,
+                      quality: Optional[Dict] = None, deadline: Optional[float] = None,
+                      on_provisional: Optional[Callable[[Dict], None]] = None,
+                      start_time: Optional[float] = None, end_time: Optional[float] = None,
+                      roi: Optional[List[List[float]]] = None,
+                      timer: Optional[StageTimer] = None) -> Dict:
         """
         Analyze traffic video for incidents
         
         Args:
             video_path: Path to video file
             test_mode: Enable screen video detection optimizations
+            scheduler_job: Optional ScheduledStream that runs frame inference
+                on the shared workers and may widen the sampling stride
+            quality: Optional QualityController settings snapshot
+            deadline: Optional time.monotonic() value; analysis stops there
+                and returns the partial result
+            on_provisional: Optional callback receiving a provisional result
+                as soon as an incident is strongly confirmed
+            start_time: Optional window start in seconds (seeked to)
+            end_time: Optional window end in seconds
+            roi: Optional polygon [[x, y], ...] in pixels or frame fractions;
+                inference runs on its crop only
+            timer: Optional StageTimer collecting per-stage timings
+                (a fresh one is used otherwise)
             
         Returns:
-            dict with analysis results
+            dict with analysis results, including the per-stage breakdown
         """
-        cap = cv2.VideoCapture(video_path)
+        timer = timer or StageTimer()
+        with timer.stage('open'):
+            cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Could not open video file: {video_path}")
@@ -227,24 +265,48 @@ class EnhancedTrafficAnalyzer:
             cap.release()
             raise ValueError(f"Invalid video file: {video_path} (frames={total_frames}, fps={fps})")
         
-        print(f"🎥 Video info: {total_frames} frames @ {fps} FPS")
+        logger.info("🎥 Video info: %d frames @ %s FPS", total_frames, fps)
+        
+        try:
+            start_frame, end_frame = frame_window(total_frames, fps, start_time, end_time)
+            region = RegionOfInterest(
+                roi, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            ) if roi else None
+        except ValueError:
+            cap.release()
+            raise
+        window_frames = end_frame - start_frame
+        
+        # Frames before the window are never returned by the decoder
+        with timer.stage('open'):
+            seek(cap, start_frame)
         
         # Auto-detect screen recording from first frame
-        ret, first_frame = cap.read()
-        if ret and first_frame is not None:
-            is_screen = self.is_screen_recording(first_frame)
-            if is_screen:
-                print("📱 Detected screen recording - applying enhanced detection")
-                test_mode = True
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset to start
-        
-        frame_count = 0
-        vehicle_detections = []
-        frame_analyses = []
+        with timer.stage('probe'):
+            ret, first_frame = cap.read()
+            if ret and first_frame is not None:
+                is_screen = self.is_screen_recording(first_frame)
+                if is_screen:
+                    logger.info("📱 Detected screen recording - applying enhanced detection")
+                    test_mode = True
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)  # Reset to start
+        
+        settings = self._quality_settings(quality)
+        emitter = ProvisionalEmitter(
+            self._consolidate_results, on_provisional, fps, window_frames
+        ) if on_provisional else None
+        sampler = AdaptiveSampler(settings['frame_skip'], fps, start_frame) if self.adaptive_sampling else None
+        frame_count = start_frame
+        next_sample = start_frame
+        # Per-frame analyses stay within MEMORY_BUDGET_MB however long the video
+        frame_analyses = FrameLog()
+        recorder = DetectionRecorder() if self.store_detections else None
+        partial = False
         
         try:
-            while cap.isOpened():
-                ret, frame = cap.read()
+            while cap.isOpened() and frame_count < end_frame:
+                with timer.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
                     break
                 
@@ -252,53 +314,150 @@ class EnhancedTrafficAnalyzer:
                 if frame is None or frame.size == 0:
                     continue
                 
-                # Process every nth frame for efficiency
-                if frame_count % self.frame_skip == 0:
-                    analysis = self._analyze_frame(frame, frame_count, test_mode=test_mode)
+                # Process every nth frame for efficiency (or as scene activity requires)
+                if sampler:
+                    with timer.stage('sampling'):
+                        due = sampler.due(frame, frame_count)
+                else:
+                    due = frame_count >= next_sample
+                if due:
+                    # Stop at the deadline, keeping at least one analyzed frame
+                    if deadline is not None and frame_analyses and time.monotonic() >= deadline:
+                        partial = True
+                        break
+                    frame_args = (frame, frame_count, test_mode, settings['imgsz'],
+                                  settings['screen_preprocessing'], region, timer)
+                    if scheduler_job is None:
+                        analysis = self._analyze_frame(*frame_args)
+                    else:
+                        analysis = scheduler_job.run(self._analyze_frame, *frame_args)
                     if analysis:
                         frame_analyses.append(analysis)
-                        vehicle_detections.append(analysis['vehicle_count'])
+                        if recorder:
+                            recorder.add(analysis)
+                        if emitter:
+                            with timer.stage('consolidation'):
+                                emitter.update(analysis, frame_count + 1 - start_frame)
+                    stride = scheduler_job.stride if scheduler_job else 1
+                    if sampler:
+                        sampler.advance(frame_count, analysis['vehicle_count'] if analysis else None, stride)
+                    else:
+                        next_sample = frame_count + settings['frame_skip'] * stride
                 
                 frame_count += 1
         finally:
             cap.release()
         
-        if frame_count == 0:
+        if frame_count == start_frame:
             raise ValueError(f"No frames could be read from video: {video_path}")
         
         # Consolidate results
-        result = self._consolidate_results(frame_analyses, fps, total_frames)
-        result['frames_processed'] = frame_count
+        with timer.stage('consolidation'):
+            result = self._consolidate_results(frame_analyses, fps, window_frames)
+        result['memory'] = frame_analyses.report()
+        frame_analyses.close()
+        if recorder:
+            result['detection_store'] = self._save_detections(
+                recorder, video_path, fps, start_frame, window_frames, test_mode, settings, region
+            )
+        result['frames_processed'] = frame_count - start_frame
         result['test_mode'] = test_mode
         result['detection_method'] = 'screen_enhanced' if test_mode else 'standard'
+        result['quality'] = settings
+        if start_time is not None or end_time is not None:
+            result['time_range'] = {'start': start_frame / fps, 'end': end_frame / fps}
+        if region:
+            result['roi'] = region.describe()
+        if sampler:
+            result['sampling'] = sampler.report()
+        if deadline is not None:
+            result['partial'] = partial
+            result['coverage'] = round(min(1.0, (frame_count - start_frame) / window_frames), 3) if window_frames > 0 else 1.0
+        if emitter:
+            result['provisional_emitted'] = emitter.emitted
+        result['timings'] = timer.breakdown()
         return result
     
-    def _analyze_frame(self, frame: np.ndarray, frame_id: int, test_mode: bool = False) -> Dict:
+    def _quality_settings(self, quality: Optional[Dict] = None) -> Dict:
+        """Resolve a quality snapshot into the settings this analysis uses"""
+        quality = quality or {}
+        return {
+            'level': quality.get('level', 0),
+            'reason': quality.get('reason'),
+            'frame_skip': self.frame_skip * quality.get('frame_skip_factor', 1),
+            'imgsz': min(self.input_size, quality.get('imgsz', self.input_size)),
+            'screen_preprocessing': quality.get('screen_preprocessing', 'full'),
+        }
+    
+    def _save_detections(self, recorder: DetectionRecorder, video_path: str, fps: float, start_frame: int,
+                         window_frames: int, test_mode: bool, settings: Dict,
+                         region: Optional[RegionOfInterest]) -> Optional[str]:
+        """Store the recorded detections with what re-consolidation needs (None if writing fails)"""
+        meta = {
+            'analyzer': type(self).__name__,
+            'model': self.model_path,
+            'fps': fps,
+            'start_frame': start_frame,
+            'total_frames': window_frames,
+            'frame_skip': self.frame_skip,
+            'imgsz': settings['imgsz'],
+            'screen_preprocessing': settings['screen_preprocessing'],
+            'roi': region.describe() if region else None,
+            'test_mode': test_mode,
+            'min_confidence': self.screen_min_confidence if test_mode else self.min_confidence,
+            'congestion_vehicle_threshold': self.congestion_vehicle_threshold,
+            'congestion_speed_threshold': self.congestion_speed_threshold,
+            'accident_stationary_threshold': self.accident_stationary_threshold,
+        }
+        try:
+            return recorder.save(video_path, meta)
+        except OSError as e:
+            logger.warning("⚠️ Detections not stored: %s", e)
+            return None
+    
+    def _analyze_frame(self, frame: np.ndarray, frame_id: int, test_mode: bool = False,
+                       imgsz: Optional[int] = None, preprocessing: str = 'full',
+                       region: Optional[RegionOfInterest] = None,
+                       timer: Optional[StageTimer] = None) -> Dict:
         """
         Analyze a single frame with optional screen video preprocessing
+        
+        imgsz overrides INPUT_RESOLUTION and preprocessing selects the
+        screen preprocessing tier ('full', 'fast', 'none'). With a region,
+        only its crop is analyzed (it replaces screen content extraction)
+        and boxes are returned in full-frame coordinates.
         """
+        timer = timer or NULL_TIMER
+        imgsz = imgsz or self.input_size
         processed_frame = frame
         preprocessing_applied = []
         
-        if test_mode:
-            # Extract content region (remove borders/UI)
-            processed_frame = self.preprocessor.extract_content_region(frame)
-            preprocessing_applied.append('content_extraction')
+        with timer.stage('preprocess'):
+            if region is not None:
+                processed_frame = region.crop(frame)
+                preprocessing_applied.append('roi_crop')
             
-            # Enhance if low resolution
-            if processed_frame.shape[0] < 480 or processed_frame.shape[1] < 640:
-                processed_frame = self.preprocessor.enhance_low_resolution(processed_frame)
-                preprocessing_applied.append('enhancement')
+            if test_mode:
+                # Extract content region (remove borders/UI)
+                if region is None:
+                    processed_frame = self.preprocessor.extract_content_region(frame)
+                    preprocessing_applied.append('content_extraction')
+                
+                # Enhance if low resolution
+                if preprocessing != 'none' and (processed_frame.shape[0] < 480 or processed_frame.shape[1] < 640):
+                    processed_frame = self.preprocessor.enhance_low_resolution(processed_frame, preprocessing)
+                    preprocessing_applied.append('enhancement' if preprocessing == 'full' else f'enhancement_{preprocessing}')
         
         # Use lower confidence threshold for screen videos
         confidence_threshold = self.screen_min_confidence if test_mode else self.min_confidence
         
         # Run YOLOv8 detection with multiple scales for screen videos
-        if test_mode:
-            # Multi-scale detection for better screen video results
-            results = self.model(processed_frame, imgsz=self.input_size, verbose=False, conf=confidence_threshold)
-        else:
-            results = self.model(processed_frame, imgsz=self.input_size, verbose=False, conf=confidence_threshold)
+        with self._locked_model(timer), timer.stage('inference'):
+            if test_mode:
+                # Multi-scale detection for better screen video results
+                results = self.model(processed_frame, imgsz=imgsz, verbose=False, conf=confidence_threshold)
+            else:
+                results = self.model(processed_frame, imgsz=imgsz, verbose=False, conf=confidence_threshold)
         
         if not results or len(results) == 0:
             return None
@@ -308,18 +467,23 @@ class EnhancedTrafficAnalyzer:
         
         # Filter for vehicles only
         vehicles = []
-        for i, box in enumerate(detections):
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            
-            if cls in self.vehicle_classes and conf >= confidence_threshold:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                vehicles.append({
-                    'class': cls,
-                    'confidence': conf,
-                    'bbox': [float(x1), float(y1), float(x2), float(y2)],
-                    'center': [(x1 + x2) / 2, (y1 + y2) / 2],
-                })
+        with timer.stage('postprocess'):
+            for i, box in enumerate(detections):
+                cls = int(box.cls[0])
+                conf = float(box.conf[0])
+                
+                if cls in self.vehicle_classes and conf >= confidence_threshold:
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                    if region is not None:
+                        x1, y1, x2, y2 = region.to_frame([x1, y1, x2, y2])
+                        if not region.contains((x1 + x2) / 2, (y1 + y2) / 2):
+                            continue
+                    vehicles.append({
+                        'class': cls,
+                        'confidence': conf,
+                        'bbox': [float(x1), float(y1), float(x2), float(y2)],
+                        'center': [(x1 + x2) / 2, (y1 + y2) / 2],
+                    })
         
         return {
             'frame_id': frame_id,
@@ -329,6 +493,16 @@ class EnhancedTrafficAnalyzer:
             'test_mode': test_mode
         }
     
+    @contextmanager
+    def _locked_model(self, timer: StageTimer):
+        """Hold the model lock, timing the wait for it as the model_wait stage"""
+        with timer.stage('model_wait'):
+            self._model_lock.acquire()
+        try:
+            yield
+        finally:
+            self._model_lock.release()
+    
     def _has_relevant_traffic_data(self, frame_analyses: List[Dict]) -> bool:
         """
         Check if video contains relevant traffic data worth storing
@@ -405,31 +579,32 @@ class EnhancedTrafficAnalyzer:
         # Add temporal confirmation (reduces false positives)
         temporal_confirmed = False
         confidence_boost = 0.0
+        # Per call: concurrent analyses and provisional checks consolidate at the same time
+        temporal_analyzer = TemporalAnalyzer(max_history=30)
         
         if incident_type != 'none' and len(frame_analyses) >= 10:
             # Add frame analyses to temporal analyzer
-            self.temporal_analyzer.clear_history()  # Reset for this video
             for frame_data in frame_analyses:
-                self.temporal_analyzer.add_frame_analysis({
+                temporal_analyzer.add_frame_analysis({
                     'confidence': confidence,
                     'has_incident': incident_type != 'none',
                     'vehicle_count': frame_data['vehicle_count']
                 })
             
             # Check if incident confirmed across frames
-            temporal_confirmed = self.temporal_analyzer.confirm_incident()
+            temporal_confirmed = temporal_analyzer.confirm_incident()
             
             if temporal_confirmed:
                 # Boost confidence for temporally confirmed incidents
-                confidence_trend = self.temporal_analyzer.get_confidence_trend()
+                confidence_trend = temporal_analyzer.get_confidence_trend()
                 if confidence_trend and confidence_trend['sustained']:
                     confidence_boost = 0.1  # +10% confidence boost
                     confidence = min(0.99, confidence + confidence_boost)
-                    print(f"✅ Temporal confirmation: Incident sustained across {len(frame_analyses)} frames")
+                    logger.debug("✅ Temporal confirmation: Incident sustained across %d frames", len(frame_analyses))
             else:
                 # Reduce confidence for non-confirmed detections
                 confidence = max(0.1, confidence * 0.7)  # -30% confidence
-                print(f"⚠️  Temporal check: Incident not consistent across frames, confidence reduced")
+                logger.debug("⚠️  Temporal check: Incident not consistent across frames, confidence reduced")
         
         # Determine severity (with temporal boost)
         severity = 'low'
@@ -441,7 +616,7 @@ class EnhancedTrafficAnalyzer:
             severity = 'medium'
         
         # Get vehicle trend analysis
-        vehicle_trend = self.temporal_analyzer.get_vehicle_count_trend()
+        vehicle_trend = temporal_analyzer.get_vehicle_count_trend()
         
         return {
             'incident_detected': incident_type != 'none',
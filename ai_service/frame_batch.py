@@ -0,0 +1,93 @@
+"""
+Frame Batch - Splitting and decoding many images from one request
+Supports multipart uploads and concatenated JPEG bodies (edge devices
+sending a burst of snapshots in a single POST)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+# Configuration
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', 64))
+BATCH_MAX_BYTES = int(float(os.getenv('BATCH_MAX_MB', 16)) * 1024 * 1024)
+BATCH_DECODE_WORKERS = int(os.getenv('BATCH_DECODE_WORKERS', 4))
+BATCH_INFERENCE_SIZE = int(os.getenv('BATCH_INFERENCE_SIZE', 16))  # images per model call
+
+# cv2.imdecode releases the GIL, so threads decode in parallel
+decode_pool = ThreadPoolExecutor(max_workers=BATCH_DECODE_WORKERS, thread_name_prefix='frame-decode')
+
+
+def split_jpeg_stream(data: bytes) -> List[bytes]:
+    """
+    Split concatenated JPEG files into individual images.
+
+    Walks the marker segments of each image instead of searching for the
+    end-of-image marker, so EXIF thumbnails (which carry their own
+    SOI/EOI) do not cut an image short.
+
+    Raises:
+        ValueError: If the data is not a sequence of complete JPEGs
+    """
+    images = []
+    pos = 0
+    size = len(data)
+
+    while True:
+        start = data.find(b'\xff\xd8', pos)
+        if start < 0:
+            break
+        if data[pos:start].strip(b'\x00\r\n'):
+            raise ValueError(f"Unexpected data before image {len(images)}")
+
+        i = start + 2
+        end = None
+        while i + 1 < size:
+            if data[i] != 0xFF:
+                raise ValueError(f"Corrupt JPEG marker in image {len(images)}")
+            marker = data[i + 1]
+            if marker == 0xFF:  # fill byte
+                i += 1
+                continue
+            if marker == 0xD9:  # end of image
+                end = i + 2
+                break
+            if 0xD0 <= marker <= 0xD7 or marker == 0x01:  # markers without a length
+                i += 2
+                continue
+
+            i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+            if marker == 0xDA:
+                # Start of scan: skip entropy-coded data up to the next real marker
+                while True:
+                    i = data.find(b'\xff', i)
+                    if i < 0 or i + 1 >= size:
+                        i = size
+                        break
+                    following = data[i + 1]
+                    if following == 0x00 or 0xD0 <= following <= 0xD7:
+                        i += 2
+                        continue
+                    break
+
+        if end is None:
+            raise ValueError(f"Truncated JPEG at image {len(images)}")
+        images.append(data[start:end])
+        pos = end
+
+    if data[pos:].strip(b'\x00\r\n'):
+        raise ValueError("Trailing data after last image")
+    return images
+
+
+def decode_image(blob: bytes) -> Optional[np.ndarray]:
+    """Decode one encoded image, None if it is not a valid image"""
+    return cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_COLOR)
+
+
+def decode_images(blobs: List[bytes]) -> List[Optional[np.ndarray]]:
+    """Decode images in parallel, keeping request order"""
+    return list(decode_pool.map(decode_image, blobs))
@@ -9,7 +9,13 @@ import cv2
 import numpy as np
 from datetime import datetime
 import json
+import logging
 import os
+import threading
+
+from annotation_writer import AnnotatedVideoWriter, boxes_from_results
+
+logger = logging.getLogger(__name__)
 
 class IncidentDetector:
     """AI-powered incident detection using YOLOv8"""
@@ -21,15 +27,18 @@ class IncidentDetector:
         Args:
             model_path: Path to trained YOLOv8 model
         """
-        print("🤖 Loading AI model...")
+        logger.info("🤖 Loading AI model...")
         
         if not os.path.exists(model_path):
-            print(f"⚠️  Model not found at {model_path}")
-            print("   Using default YOLOv8 model (vehicle detection only)")
-            print("   Train custom model using Colab notebook for incident detection!")
+            logger.warning(
+                "⚠️  Model not found at %s, using default YOLOv8 model (vehicle detection only). "
+                "Train custom model using Colab notebook for incident detection!", model_path
+            )
             model_path = 'yolov8n.pt'
         
         self.model = YOLO(model_path)
+        # YOLO predictors are not thread-safe; serialize calls from concurrent requests
+        self._model_lock = threading.Lock()
         
         # Incident types (update these based on your trained model)
         self.incident_types = {
@@ -47,7 +56,7 @@ class IncidentDetector:
             7: 'truck'
         }
         
-        print("✅ Model loaded successfully!")
+        logger.info("✅ Model loaded successfully!")
     
     def analyze_video(self, video_path, confidence_threshold=0.6, save_annotated=False):
         """
@@ -64,7 +73,7 @@ class IncidentDetector:
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
-            print(f"❌ Error: Cannot open video {video_path}")
+            logger.error("❌ Error: Cannot open video %s", video_path)
             return []
         
         fps = cap.get(cv2.CAP_PROP_FPS) or 30
@@ -72,67 +81,78 @@ class IncidentDetector:
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        print(f"\n📹 Analyzing video: {video_path}")
-        print(f"   Frames: {total_frames}, FPS: {fps:.1f}")
+        logger.info("📹 Analyzing video: %s (%d frames, %.1f FPS)", video_path, total_frames, fps)
         
         incidents = []
         frame_count = 0
+        # Per-detection and progress records only when debugging
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        # Setup annotated video writer if requested
+        # Setup annotated video writer if requested (encodes on its own thread)
         out = None
         if save_annotated:
-            output_path = video_path.replace('.mp4', '_annotated.mp4')
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
+            output_path = os.path.splitext(video_path)[0] + '_annotated.mp4'
+            out = AnnotatedVideoWriter(output_path, fps, (width, height))
+        
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
             
-            # Analyze every 30 frames (~1 per second)
-            if frame_count % 30 == 0:
-                results = self.model(frame, verbose=False)[0]
+                # Analyze every 30 frames (~1 per second)
+                boxes = None
+                if frame_count % 30 == 0:
+                    with self._model_lock:
+                        results = self.model(frame, verbose=False)[0]
                 
-                # Process detections
-                for box in results.boxes:
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
+                    # Process detections
+                    for box in results.boxes:
+                        cls = int(box.cls[0])
+                        conf = float(box.conf[0])
                     
-                    if conf >= confidence_threshold:
-                        x1, y1, x2, y2 = box.xyxy[0].tolist()
+                        if conf >= confidence_threshold:
+                            x1, y1, x2, y2 = box.xyxy[0].tolist()
                         
-                        incident = {
-                            'type': self.incident_types.get(cls, 'vehicle'),
-                            'confidence': round(conf, 3),
-                            'timestamp': round(frame_count / fps, 2),
-                            'frame': frame_count,
-                            'bbox': {
-                                'x1': int(x1), 'y1': int(y1),
-                                'x2': int(x2), 'y2': int(y2)
+                            incident = {
+                                'type': self.incident_types.get(cls, 'vehicle'),
+                                'confidence': round(conf, 3),
+                                'timestamp': round(frame_count / fps, 2),
+                                'frame': frame_count,
+                                'bbox': {
+                                    'x1': int(x1), 'y1': int(y1),
+                                    'x2': int(x2), 'y2': int(y2)
+                                }
                             }
-                        }
-                        incidents.append(incident)
-                        print(f"  🚨 {incident['type'].upper()} detected at {incident['timestamp']}s (conf: {conf:.2f})")
+                            incidents.append(incident)
+                            if debug:
+                                logger.debug("🚨 %s detected at %ss (conf: %.2f)",
+                                             incident['type'].upper(), incident['timestamp'], conf)
                 
-                # Draw boxes on frame
-                if save_annotated and out:
-                    annotated = results.plot()
-                    out.write(annotated)
+                    if out:
+                        boxes = boxes_from_results(results)
+            
+                # Every frame is written; unanalyzed ones keep the last boxes
+                if out:
+                    out.write(frame, boxes)
             
-            frame_count += 1
+                frame_count += 1
             
-            # Progress bar
-            if frame_count % 100 == 0:
-                progress = (frame_count / total_frames) * 100
-                print(f"   Progress: {progress:.1f}%", end='\r')
+                # Progress
+                if debug and frame_count % 100 == 0 and total_frames:
+                    logger.debug("Progress: %.1f%%", frame_count / total_frames * 100)
         
-        cap.release()
-        if out:
-            out.release()
-            print(f"\n💾 Annotated video saved: {output_path}")
+        finally:
+            cap.release()
+            if out:
+                report = out.close()
+                if 'error' in report:
+                    logger.error("❌ Annotated video not saved: %s", report['error'])
+                else:
+                    logger.info("💾 Annotated video saved: %s (%d frames at %dx%d, inference waited %.0fms on the encoder)",
+                                output_path, report['frames'], *report['size'], report['blocked_ms'])
         
-        print(f"\n✅ Analysis complete: {len(incidents)} detection(s) found")
+        logger.info("✅ Analysis complete: %d detection(s) found", len(incidents))
         return incidents
     
     def analyze_frame(self, frame, confidence_threshold=0.5):
@@ -146,7 +166,31 @@ class IncidentDetector:
         Returns:
             List of detections in this frame
         """
-        results = self.model(frame, verbose=False)[0]
+        with self._model_lock:
+            results = self.model(frame, verbose=False)[0]
+        return self._frame_detections(results, confidence_threshold)
+    
+    def analyze_frames(self, frames, confidence_threshold=0.5, batch_size=16):
+        """
+        Analyze many frames with batched inference
+        
+        Args:
+            frames: List of OpenCV frames (numpy arrays)
+            confidence_threshold: Minimum confidence
+            batch_size: Frames per model call
+            
+        Returns:
+            List of detection lists, one per frame, in input order
+        """
+        detections = []
+        for start in range(0, len(frames), batch_size):
+            with self._model_lock:
+                results = self.model(frames[start:start + batch_size], verbose=False)
+            detections.extend(self._frame_detections(r, confidence_threshold) for r in results)
+        return detections
+    
+    def _frame_detections(self, results, confidence_threshold):
+        """Convert one frame's YOLO results into detection dicts"""
         detections = []
         
         for box in results.boxes:
@@ -177,7 +221,8 @@ class IncidentDetector:
         Returns:
             Annotated frame
         """
-        results = self.model(frame, verbose=False)[0]
+        with self._model_lock:
+            results = self.model(frame, verbose=False)[0]
         return results.plot()
     
     def save_report(self, incidents, output_path='incident_report.json'):
@@ -191,11 +236,14 @@ class IncidentDetector:
         with open(output_path, 'w') as f:
             json.dump(report, f, indent=2)
         
-        print(f"📄 Report saved to {output_path}")
+        logger.info("📄 Report saved to %s", output_path)
 
 # Test the detector
 if __name__ == "__main__":
     import sys
+    from service_logging import configure_logging
+    
+    configure_logging()
     
     if len(sys.argv) < 2:
         print("Usage: python incident_detector.py <video_path>")
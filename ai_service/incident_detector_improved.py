@@ -4,6 +4,7 @@
 This version has realistic thresholds based on actual video analysis
 """
 
+import logging
 import os
 import sys
 import cv2
@@ -12,11 +13,15 @@ from ultralytics import YOLO
 import torch
 import numpy as np
 
+from annotation_writer import AnnotatedVideoWriter, boxes_from_results
+
+logger = logging.getLogger(__name__)
+
 class ImprovedIncidentDetector:
     """FIXED detector with realistic thresholds for your videos"""
     
     def __init__(self, model_path='yolov8n.pt'):
-        print("📦 Loading YOLOv8 model...")
+        logger.info("📦 Loading YOLOv8 model...")
         self.model = YOLO(model_path)
         
         # REALISTIC thresholds based on actual video analysis
@@ -27,10 +32,11 @@ class ImprovedIncidentDetector:
         self.accident_proximity = 100   # Was 50, now 100 pixels
         self.confidence_min = 0.3       # Lower confidence to catch more
         
-        print("✅ Model loaded with FIXED thresholds!")
-        print(f"  - Traffic jam: {self.traffic_jam_threshold}+ vehicles (was 5+)")
-        print(f"  - Accident proximity: {self.accident_proximity}px (was 50px)")
-        print(f"  - Min confidence: {self.confidence_min} (was 0.5)")
+        logger.info(
+            "✅ Model loaded with FIXED thresholds! Traffic jam: %d+ vehicles (was 5+), "
+            "accident proximity: %dpx (was 50px), min confidence: %s (was 0.5)",
+            self.traffic_jam_threshold, self.accident_proximity, self.confidence_min
+        )
     
     def detect_vehicles(self, results):
         """Extract vehicle detections"""
@@ -140,11 +146,9 @@ class ImprovedIncidentDetector:
     
     def analyze_video(self, video_path, output_path=None, sample_rate=30):
         """Analyze video with detailed stats"""
-        print(f"\n📹 Analyzing: {video_path}")
-        
         cap = cv2.VideoCapture(video_path)
         if not cap.isOpened():
-            print(f"❌ Cannot open video")
+            logger.error("❌ Cannot open video %s", video_path)
             return None
         
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
@@ -152,14 +156,14 @@ class ImprovedIncidentDetector:
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        print(f"📊 {total_frames} frames, {fps} FPS, {width}x{height}")
-        print(f"⚙️  Sampling every {sample_rate} frames...")
+        logger.info("📹 Analyzing %s: %d frames, %d FPS, %dx%d, sampling every %d frames",
+                    video_path, total_frames, fps, width, height, sample_rate)
+        debug = logger.isEnabledFor(logging.DEBUG)
         
-        # Setup video writer
+        # Setup video writer (draws and encodes on its own thread)
         writer = None
         if output_path:
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            writer = AnnotatedVideoWriter(output_path, fps, (width, height))
         
         # Tracking
         incident_counts = {
@@ -180,7 +184,7 @@ class ImprovedIncidentDetector:
                 
                 frame_idx += 1
                 
-                # Sample frames
+                # Sample frames; skipped frames keep the last annotations
                 if frame_idx % sample_rate != 0:
                     if writer:
                         writer.write(frame)
@@ -198,56 +202,38 @@ class ImprovedIncidentDetector:
                     if incident_type in incident_counts:
                         incident_counts[incident_type] += 1
                 
-                # Annotate frame
-                if results and len(results) > 0:
-                    annotated = results[0].plot()
-                    
-                    # Add incident labels
-                    y_offset = 30
-                    for incident in incidents:
-                        label = f"{incident['type'].upper()}: {incident['confidence']:.0%}"
-                        cv2.putText(annotated, label, (10, y_offset), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                        y_offset += 35
-                    
-                    # Add vehicle count
-                    count_label = f"Vehicles: {len(vehicles)}"
-                    cv2.putText(annotated, count_label, (10, y_offset), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    
-                    if writer:
-                        writer.write(annotated)
-                else:
-                    if writer:
-                        writer.write(frame)
+                # Annotate frame: incident labels, then the vehicle count
+                if writer:
+                    boxes = boxes_from_results(results[0]) if results and len(results) > 0 else []
+                    labels = [(f"{incident['type'].upper()}: {incident['confidence']:.0%}", (0, 0, 255))
+                              for incident in incidents]
+                    labels.append((f"Vehicles: {len(vehicles)}", (0, 255, 0)))
+                    writer.write(frame, boxes, labels)
                 
                 # Progress
-                if processed % 10 == 0:
-                    progress = (frame_idx / total_frames) * 100
-                    print(f"  {progress:.1f}% ({frame_idx}/{total_frames})", end='\r')
+                if debug and processed % 10 == 0:
+                    logger.debug("%.1f%% (%d/%d)", frame_idx / max(1, total_frames) * 100, frame_idx, total_frames)
         
         finally:
             cap.release()
             if writer:
-                writer.release()
+                report = writer.close()
+                if 'error' in report:
+                    logger.error("❌ Annotated video not saved: %s", report['error'])
         
         # Statistics
         avg_vehicles = np.mean(frame_vehicle_counts) if frame_vehicle_counts else 0
         max_vehicles = max(frame_vehicle_counts) if frame_vehicle_counts else 0
         
-        print(f"\n✅ Processed {processed} frames")
-        print(f"\n📊 VEHICLE STATISTICS:")
-        print(f"  Average vehicles/frame: {avg_vehicles:.2f}")
-        print(f"  Max vehicles in frame: {max_vehicles}")
-        print(f"  Frames with vehicles: {sum(1 for c in frame_vehicle_counts if c > 0)}/{processed}")
-        
-        print(f"\n📊 INCIDENT DETECTION:")
-        print(f"  🚗 Traffic Jams: {incident_counts['traffic_jam']} frames")
-        print(f"  💥 Potential Accidents: {incident_counts['potential_accident']} frames")
-        print(f"  🔥 Fire Indicators: {incident_counts['fire_indicator']} frames")
+        logger.info(
+            "✅ Processed %d frames: %.2f vehicles/frame (max %d, %d frames with vehicles); "
+            "%d traffic jam, %d potential accident, %d fire indicator frames",
+            processed, avg_vehicles, max_vehicles, sum(1 for c in frame_vehicle_counts if c > 0),
+            incident_counts['traffic_jam'], incident_counts['potential_accident'], incident_counts['fire_indicator']
+        )
         
         if output_path:
-            print(f"\n💾 Saved: {output_path}")
+            logger.info("💾 Saved: %s", output_path)
         
         return {
             'incidents': incident_counts,
@@ -316,6 +302,9 @@ def test_improved_detector():
 
 
 if __name__ == '__main__':
+    from service_logging import configure_logging
+    configure_logging()
+    
     if len(sys.argv) > 1:
         # Test specific video
         detector = ImprovedIncidentDetector()
@@ -0,0 +1,434 @@
+"""
+Inference Scheduler - Fair sharing of a fixed inference budget
+Live cameras and uploads submit frames; a fixed pool of workers serves
+them in weighted fair order so a busy upload cannot starve a camera.
+Quick analyses (mobile auto-capture) run in a separate priority lane.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Any, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 1))
+SCHEDULER_MAX_PENDING = int(os.getenv('SCHEDULER_MAX_PENDING', 2))  # queued frames per stream
+SCHEDULER_MAX_STRIDE = int(os.getenv('SCHEDULER_MAX_STRIDE', 8))
+STREAM_PRIORITY = int(os.getenv('STREAM_PRIORITY', 4))
+UPLOAD_PRIORITY = int(os.getenv('UPLOAD_PRIORITY', 1))
+QUICK_RESERVED_WORKERS = int(os.getenv('QUICK_RESERVED_WORKERS', 1))
+QUICK_LANE_MAX_ACTIVE = int(os.getenv('QUICK_LANE_MAX_ACTIVE', 4))
+FULL_LANE_MAX_ACTIVE = int(os.getenv('FULL_LANE_MAX_ACTIVE', 2))
+RATE_WINDOW = 10.0  # seconds used for achieved-rate measurement
+
+# Priority classes. Quick-lane frames are always served before standard
+# ones and also have QUICK_RESERVED_WORKERS workers of their own.
+QUICK_LANE = 'quick'
+STANDARD_LANE = 'standard'
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'future', 'submitted_at', 'start_tag')
+
+    def __init__(self, fn: Callable, args: tuple, start_tag: float):
+        self.fn = fn
+        self.args = args
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+        self.start_tag = start_tag
+
+
+class ScheduledStream:
+    """
+    A stream or job registered with the scheduler.
+
+    priority is the fair-queueing weight: a stream with priority 4 gets
+    four times the inference share of a priority-1 stream when both are
+    backlogged. target_fps is the analysis rate the stream asks for;
+    when the stream cannot be served at that rate, its sampling stride
+    grows (analyze every 2nd, 3rd... candidate frame) instead of its queue.
+    """
+
+    def __init__(self, scheduler: 'InferenceScheduler', stream_id: str, priority: int,
+                 target_fps: Optional[float], max_pending: int, drop_stale: bool,
+                 lane: str = STANDARD_LANE):
+        self.scheduler = scheduler
+        self.stream_id = stream_id
+        self.lane = lane
+        self.priority = max(1, priority)
+        self.target_fps = target_fps
+        self.max_pending = max(1, max_pending)
+        self.drop_stale = drop_stale
+
+        self.pending: deque = deque()
+        self.last_finish_tag = 0.0
+        self.stride = 1
+        self.queue_wait = 0.0  # EWMA seconds
+        self.total_queue_wait = 0.0
+        self.admission_wait = 0.0  # seconds spent waiting for a lane slot
+        self.admitted = False  # holds a lane slot (jobs, not cameras)
+        self.completions: deque = deque()
+        self.registered_at = time.time()
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'dropped': 0,
+        }
+
+    @property
+    def effective_fps(self) -> Optional[float]:
+        """Target rate after sampling degradation"""
+        if not self.target_fps:
+            return None
+        return self.target_fps / self.stride
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Queue fn(*args) for a worker and return its future"""
+        return self.scheduler._submit(self, fn, args)
+
+    def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) on an inference worker and wait for the result.
+
+        Returns None if the frame was dropped as stale.
+        """
+        return self.collect(self.submit(fn, *args))
+
+    @staticmethod
+    def collect(future: Future):
+        """
+        Wait for a submitted frame's result.
+
+        Returns None if the frame was dropped as stale; re-raises errors of fn.
+        """
+        try:
+            return future.result()
+        except _Dropped:
+            return None
+
+    def status(self) -> Dict[str, Any]:
+        """Achieved rate and lag for monitoring"""
+        now = time.monotonic()
+        with self.scheduler._lock:
+            while self.completions and now - self.completions[0] > RATE_WINDOW:
+                self.completions.popleft()
+            window = min(RATE_WINDOW, now - self.scheduler._started_at) or 1.0
+            oldest = self.pending[0].submitted_at if self.pending else None
+            completed = self.stats['completed']
+            return {
+                'stream_id': self.stream_id,
+                'lane': self.lane,
+                'priority': self.priority,
+                'target_fps': self.target_fps,
+                'effective_fps': self.effective_fps,
+                'achieved_fps': round(len(self.completions) / window, 2),
+                'sampling_stride': self.stride,
+                'pending': len(self.pending),
+                'lag_ms': round((now - oldest) * 1000, 1) if oldest else 0.0,
+                'queue_wait_ms': round(self.queue_wait * 1000, 1),
+                'avg_frame_wait_ms': round(self.total_queue_wait / completed * 1000, 1) if completed else 0.0,
+                'admission_wait_ms': round(self.admission_wait * 1000, 1),
+                **self.stats,
+            }
+
+
+class _Dropped(Exception):
+    """Raised on the future of a frame replaced by a newer one"""
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class InferenceScheduler:
+    """
+    Start-time fair queueing of frames onto a fixed worker pool.
+
+    Each submitted frame gets a virtual start tag
+    max(virtual_time, stream's previous finish tag); workers always take
+    the queued frame with the smallest tag. Per-stream queues are bounded
+    (SCHEDULER_MAX_PENDING): live streams drop their oldest frame, uploads
+    block, and both raise their sampling stride when they fall behind.
+
+    Jobs are admitted per lane (QUICK_LANE_MAX_ACTIVE / FULL_LANE_MAX_ACTIVE
+    concurrent jobs), from a thread with admit() or from the event loop
+    with admit_async(). Quick-lane frames take strict precedence on shared
+    workers, and reserved workers only serve the quick lane. Since long
+    jobs submit one frame at a time, they yield to quick work between frames.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, max_stride: int = SCHEDULER_MAX_STRIDE,
+                 reserved_quick_workers: int = QUICK_RESERVED_WORKERS,
+                 lane_limits: Optional[Dict[str, int]] = None):
+        self.max_stride = max_stride
+        self.lane_limits = lane_limits or {
+            QUICK_LANE: QUICK_LANE_MAX_ACTIVE,
+            STANDARD_LANE: FULL_LANE_MAX_ACTIVE,
+        }
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._space_available = threading.Condition(self._lock)
+        self._lane_available = threading.Condition(self._lock)
+        self._streams: Dict[str, ScheduledStream] = {}
+        self._virtual_time = 0.0
+        self._started_at = time.monotonic()
+        self._shutdown = False
+
+        self._active_jobs = {lane: 0 for lane in self.lane_limits}
+        self._waiting_jobs = {lane: 0 for lane in self.lane_limits}
+        self._lane_wait = {lane: 0.0 for lane in self.lane_limits}  # EWMA admission wait
+        # Futures of admit_async() callers waiting for a lane slot, with their loops
+        self._lane_waiters: Dict[str, List[tuple]] = {lane: [] for lane in self.lane_limits}
+
+        self._workers: List[threading.Thread] = [
+            threading.Thread(target=self._worker, args=(False,), name=f'inference-worker-{i}', daemon=True)
+            for i in range(max(1, workers))
+        ] + [
+            threading.Thread(target=self._worker, args=(True,), name=f'inference-quick-{i}', daemon=True)
+            for i in range(max(0, reserved_quick_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def register(self, stream_id: str, priority: int = STREAM_PRIORITY,
+                 target_fps: Optional[float] = None, max_pending: int = SCHEDULER_MAX_PENDING,
+                 drop_stale: bool = True, lane: str = STANDARD_LANE) -> ScheduledStream:
+        """
+        Register a stream or job without admission control (live cameras).
+
+        Args:
+            stream_id: Unique name (camera ID, upload ID)
+            priority: Fair-share weight (higher gets more inference time)
+            target_fps: Desired analysis rate, None for as fast as possible
+            max_pending: Frames that may wait in the queue
+            drop_stale: Replace the oldest queued frame when full (live streams)
+                        instead of blocking the submitter (uploads)
+            lane: QUICK_LANE or STANDARD_LANE
+        """
+        with self._lock:
+            return self._register_locked(stream_id, priority, target_fps, max_pending, drop_stale, lane)
+
+    def admit(self, stream_id: str, lane: str = STANDARD_LANE, **kwargs) -> ScheduledStream:
+        """
+        Wait for a free slot in the lane, then register the job.
+
+        The time spent waiting is recorded as the job's admission_wait.
+        """
+        if lane not in self.lane_limits:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        started = time.monotonic()
+        with self._lock:
+            self._waiting_jobs[lane] += 1
+            try:
+                while self._active_jobs[lane] >= self.lane_limits[lane]:
+                    if self._shutdown:
+                        raise RuntimeError("Scheduler is shutting down")
+                    self._lane_available.wait()
+            finally:
+                self._waiting_jobs[lane] -= 1
+
+            return self._admit_locked(stream_id, lane, started, kwargs)
+
+    async def admit_async(self, stream_id: str, lane: str = STANDARD_LANE, **kwargs) -> ScheduledStream:
+        """
+        admit() for the event loop: waits for a lane slot without holding a thread.
+
+        The job must be unregistered when it finishes, like with admit().
+        """
+        if lane not in self.lane_limits:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                if self._shutdown:
+                    raise RuntimeError("Scheduler is shutting down")
+                if self._active_jobs[lane] < self.lane_limits[lane]:
+                    return self._admit_locked(stream_id, lane, started, kwargs)
+                waiter = (loop, loop.create_future())
+                self._lane_waiters[lane].append(waiter)
+                self._waiting_jobs[lane] += 1
+            try:
+                await waiter[1]
+            finally:
+                with self._lock:
+                    self._waiting_jobs[lane] -= 1
+                    if waiter in self._lane_waiters[lane]:
+                        self._lane_waiters[lane].remove(waiter)
+
+    def _admit_locked(self, stream_id: str, lane: str, started: float, kwargs: Dict) -> ScheduledStream:
+        stream = self._register_locked(stream_id, lane=lane, **kwargs)
+        self._active_jobs[lane] += 1
+        stream.admitted = True
+        stream.admission_wait = time.monotonic() - started
+        self._lane_wait[lane] = 0.8 * self._lane_wait[lane] + 0.2 * stream.admission_wait
+        return stream
+
+    def _notify_lane_locked(self, lane: str):
+        """Wake threads and coroutines waiting for a slot in the lane"""
+        self._lane_available.notify_all()
+        waiters, self._lane_waiters[lane] = self._lane_waiters[lane], []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _register_locked(self, stream_id: str, priority: int = STREAM_PRIORITY,
+                         target_fps: Optional[float] = None, max_pending: int = SCHEDULER_MAX_PENDING,
+                         drop_stale: bool = True, lane: str = STANDARD_LANE) -> ScheduledStream:
+        if stream_id in self._streams:
+            raise ValueError(f"Stream already scheduled: {stream_id}")
+        stream = ScheduledStream(self, stream_id, priority, target_fps, max_pending, drop_stale, lane)
+        stream.last_finish_tag = self._virtual_time
+        self._streams[stream_id] = stream
+        return stream
+
+    def unregister(self, stream_id: str):
+        """Remove a stream, dropping anything it still has queued"""
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+            if stream is None:
+                return
+            while stream.pending:
+                stream.pending.popleft().future.set_exception(_Dropped())
+            if stream.admitted:
+                self._active_jobs[stream.lane] -= 1
+                self._notify_lane_locked(stream.lane)
+            self._space_available.notify_all()
+
+    @contextmanager
+    def job(self, stream_id: str, lane: str = STANDARD_LANE, **kwargs):
+        """
+        Admit a job for the duration of a with-block.
+
+        Blocks while the lane is full, so call it from a worker thread.
+        """
+        stream = self.admit(stream_id, lane=lane, **kwargs)
+        try:
+            yield stream
+        finally:
+            self.unregister(stream_id)
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            streams = list(self._streams.values())
+        return [s.status() for s in streams]
+
+    def lane_status(self) -> Dict[str, Dict[str, Any]]:
+        """Active and waiting jobs plus recent admission wait per lane"""
+        with self._lock:
+            return {
+                lane: {
+                    'active': self._active_jobs[lane],
+                    'waiting': self._waiting_jobs[lane],
+                    'max_active': limit,
+                    'admission_wait_ms': round(self._lane_wait[lane] * 1000, 1),
+                    'queued_frames': sum(
+                        len(s.pending) for s in self._streams.values() if s.lane == lane
+                    ),
+                }
+                for lane, limit in self.lane_limits.items()
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown = True
+            self._work_available.notify_all()
+            self._space_available.notify_all()
+            for lane in self.lane_limits:
+                self._notify_lane_locked(lane)
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+    def _submit(self, stream: ScheduledStream, fn: Callable, args: tuple) -> Future:
+        with self._lock:
+            while len(stream.pending) >= stream.max_pending:
+                if stream.drop_stale:
+                    stale = stream.pending.popleft()
+                    stale.future.set_exception(_Dropped())
+                    stream.stats['dropped'] += 1
+                    self._degrade(stream)
+                else:
+                    self._space_available.wait()
+                    if self._shutdown or stream.stream_id not in self._streams:
+                        raise RuntimeError(f"Stream no longer scheduled: {stream.stream_id}")
+
+            start_tag = max(self._virtual_time, stream.last_finish_tag)
+            stream.last_finish_tag = start_tag + 1.0 / stream.priority
+            job = _Job(fn, args, start_tag)
+            stream.pending.append(job)
+            stream.stats['submitted'] += 1
+            self._work_available.notify()
+            return job.future
+
+    def _next_job(self, quick_only: bool = False) -> Optional[tuple]:
+        """
+        Pop the next frame to run (lock held): the quick lane first,
+        then the smallest start tag among standard streams.
+        """
+        best = None
+        for lane in (QUICK_LANE, STANDARD_LANE):
+            for stream in self._streams.values():
+                if stream.lane != lane or not stream.pending:
+                    continue
+                if best is None or stream.pending[0].start_tag < best.pending[0].start_tag:
+                    best = stream
+            if best is not None or quick_only:
+                break
+        if best is None:
+            return None
+        job = best.pending.popleft()
+        self._virtual_time = max(self._virtual_time, job.start_tag)
+        self._space_available.notify_all()
+        return best, job
+
+    def _worker(self, quick_only: bool):
+        while True:
+            with self._lock:
+                picked = self._next_job(quick_only)
+                while picked is None:
+                    if self._shutdown:
+                        return
+                    self._work_available.wait()
+                    picked = self._next_job(quick_only)
+            stream, job = picked
+
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            waited = time.monotonic() - job.submitted_at
+            try:
+                job.future.set_result(job.fn(*job.args))
+            except BaseException as e:
+                job.future.set_exception(e)
+
+            with self._lock:
+                stream.stats['completed'] += 1
+                stream.completions.append(time.monotonic())
+                stream.queue_wait = 0.8 * stream.queue_wait + 0.2 * waited
+                stream.total_queue_wait += waited
+                self._adjust_stride(stream)
+
+    def _degrade(self, stream: ScheduledStream):
+        stream.stride = min(self.max_stride, stream.stride + 1)
+
+    def _adjust_stride(self, stream: ScheduledStream):
+        """Widen sampling when frames wait longer than the stream's frame interval"""
+        if not stream.target_fps:
+            # Unpaced jobs (uploads) compare against one frame of service time
+            interval = 0.5
+        else:
+            interval = stream.stride / stream.target_fps
+        if stream.queue_wait > interval:
+            self._degrade(stream)
+        elif stream.queue_wait < interval / 4 and stream.stride > 1 and not stream.pending:
+            stream.stride -= 1
@@ -1,18 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel
 import os
+import json
+import logging
 import time
 import shutil
+import uuid
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # Import local modules
 from traffic_analyzer import TrafficAnalyzer
 from enhanced_traffic_analyzer import EnhancedTrafficAnalyzer
-from backend_notifier import notify_backend
+from backend_notifier import NotificationDispatcher, NOTIFY_OUTBOX_ENABLED
+from notification_outbox import NotificationOutbox
+from stream_analyzer import StreamAnalyzer, validate_stream_url
+from inference_scheduler import (
+    InferenceScheduler, INFERENCE_WORKERS, STREAM_PRIORITY, UPLOAD_PRIORITY,
+    QUICK_LANE, STANDARD_LANE, QUICK_RESERVED_WORKERS
+)
+from admission_control import AdmissionController, AdmissionRejected, probe_video, FRAME_COST_STAGES
+from quality_controller import QualityController, plan_time_budget
+from analysis_region import clip_probe, parse_polygon
+from stage_timing import StageTimer, metrics
+from request_profiler import ProfileStore, ProfilingTimer
+from service_logging import configure_logging, tag_request, get_stats as logging_stats
 
 load_dotenv()
 
+# Queue-backed structured logging for the service and every analyzer
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Initialize FastAPI app
 from contextlib import asynccontextmanager
 
@@ -37,19 +60,29 @@ async def lifespan(app: FastAPI):
     
     model_path = models_dir / "yolov8n.pt"
     if not model_path.exists():
-        print("📥 Downloading YOLOv8n model... (this may take a moment)")
+        logger.info("📥 Downloading YOLOv8n model... (this may take a moment)")
         # Model will auto-download on first use by Ultralytics
         from ultralytics import YOLO
         YOLO('yolov8n.pt')  # Auto-downloads
-        print("✅ Model downloaded successfully")
+        logger.info("✅ Model downloaded successfully")
+    
+    # Start background webhook delivery
+    await dispatcher.start()
+    quality_controller.start()
         
     yield
     
     # Shutdown
+    # Stop camera readers, then deliver pending notifications
+    stream_analyzer.stop_all()
+    quality_controller.stop()
+    scheduler.shutdown()
+    await dispatcher.stop()
+    
     # Clean up temp directory
     if TEMP_DIR.exists():
         shutil.rmtree(TEMP_DIR)
-    print("👋 AI Service shutting down...")
+    logger.info("👋 AI Service shutting down...")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -68,10 +101,190 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tag log records with the request's X-Request-ID
+app.middleware("http")(tag_request)
+
 # Initialize traffic analyzers
 analyzer = TrafficAnalyzer()
 enhanced_analyzer = EnhancedTrafficAnalyzer()  # For screen video detection
 
+# Background webhook delivery (keeps backend latency off the request path)
+# With the outbox enabled, pending results survive backend and AI service restarts
+dispatcher = NotificationDispatcher(
+    outbox=NotificationOutbox() if NOTIFY_OUTBOX_ENABLED else None
+)
+
+def notify_stream_state_change(camera_id: str, result: dict):
+    """Push a camera's incident state change to the backend (called from stream threads)"""
+    dispatcher.enqueue_threadsafe(
+        incident_id=int(time.time() * 1000),  # numeric like upload IDs; the camera is in result['camera_id']
+        result=result,
+        confidence=result.get('confidence', 0),
+        vehicle_count=result.get('vehicle_count', 0),
+        incident_detected=result.get('incident_detected', False),
+        detected_type=result.get('incident_type', None)
+    )
+
+def provisional_notifier(incident_id):
+    """Callback that pushes an analysis's provisional results to the backend (worker thread)"""
+    def notify(result: dict):
+        logger.info("⚡ Provisional %s for incident %s", result['incident_type'], incident_id)
+        dispatcher.enqueue_threadsafe(
+            incident_id=incident_id,
+            result=result,
+            confidence=result.get('confidence', 0),
+            vehicle_count=result.get('vehicle_count', 0),
+            incident_detected=result.get('incident_detected', False),
+            detected_type=result.get('incident_type', None)
+        )
+    return notify
+
+# Fixed pool of inference workers shared fairly by cameras and uploads
+scheduler = InferenceScheduler()
+
+# The quick lane gets its own model instance while it has reserved workers,
+# so quick clips do not queue behind the standard lane's model lock
+quick_analyzer = TrafficAnalyzer() if QUICK_RESERVED_WORKERS > 0 else analyzer
+
+# Live camera streams get their own model instance. With the default single
+# INFERENCE_WORKERS they share that worker with uploads in fair order; with
+# more workers their frames can run alongside upload frames instead of
+# waiting for the upload analyzer's model lock
+stream_analyzer = StreamAnalyzer(
+    TrafficAnalyzer(), scheduler, on_state_change=notify_stream_state_change
+)
+
+# Sheds uploads with 429 + Retry-After instead of letting every analysis slow down
+admission = AdmissionController(scheduler, INFERENCE_WORKERS)
+
+# Lowers frame sampling, input resolution and screen preprocessing under load
+quality_controller = QualityController(scheduler)
+
+# Opt-in stack sampling of single analyses (X-Profile header or /admin/profile)
+profile_store = ProfileStore()
+
+def shed(error: AdmissionRejected) -> HTTPException:
+    """HTTP error for a rejected upload (413 oversized, 429 busy with Retry-After)"""
+    return HTTPException(status_code=error.status_code, detail=error.detail, headers=error.headers())
+
+def admit_upload(lane: str, video_path: str, frame_skip: int, quality: dict,
+                 deadline: Optional[float] = None, start_time: Optional[float] = None,
+                 end_time: Optional[float] = None, timer: Optional[StageTimer] = None):
+    """
+    Probe a saved upload, plan it against its deadline and admit it into the lane.
+    
+    With a deadline, frame skip and imgsz are chosen from the video length
+    and the measured per-frame cost so the analysis fits the time left.
+    Only the requested time window counts towards duration and work.
+    
+    Returns:
+        (admission ticket, quality settings to analyze with)
+    
+    Raises:
+        HTTPException: 400 if unreadable, 413 if too long, 429 if over capacity
+    """
+    try:
+        with (timer or StageTimer()).stage('probe'):
+            video = clip_probe(probe_video(video_path), start_time, end_time)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if deadline is not None:
+        quality = plan_time_budget(
+            quality, video, frame_skip, max(0.0, deadline - time.monotonic()),
+            frame_cost=admission.frame_cost,
+            overhead=admission.estimate_seconds(video, 0),
+            ladder=quality_controller.ladder
+        )
+    
+    try:
+        ticket = admission.admit(lane, video, frame_skip * quality['frame_skip_factor'])
+    except AdmissionRejected as e:
+        raise shed(e)
+    return ticket, quality
+
+def parse_time_budget(time_budget: Optional[float]) -> Optional[float]:
+    """Absolute time.monotonic() deadline for a request's time budget (seconds)"""
+    if time_budget is None:
+        return None
+    if time_budget <= 0:
+        raise HTTPException(status_code=400, detail="time_budget must be a positive number of seconds")
+    return time.monotonic() + time_budget
+
+def parse_roi(roi: Optional[str]) -> Optional[list]:
+    """Polygon from a JSON form field such as [[0.1, 0.5], [0.9, 0.5], [0.9, 1], [0.1, 1]]"""
+    if not roi:
+        return None
+    try:
+        return parse_polygon(json.loads(roi))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid roi: {str(e)}")
+
+def budget_report(time_budget: float, quality: dict, result: dict) -> dict:
+    """How a deadline-bounded analysis went"""
+    return {
+        'budget': time_budget,
+        'planned_frames': quality.get('planned_frames'),
+        'partial': result.get('partial', False),
+        'coverage': result.get('coverage', 1.0),
+        'met': result['analysis_time'] <= time_budget,
+    }
+
+def record_timings(endpoint: str, timer: StageTimer, result: dict):
+    """Put the request's stage breakdown in the result, feed the /metrics histograms and log it"""
+    result['timings'] = timer.breakdown()
+    metrics.record(endpoint, timer, result['analysis_time'])
+    logger.info(
+        "✅ %s analysis done in %.2fs: %s", endpoint, result['analysis_time'], result.get('incident_type'),
+        extra={
+            'event': 'analysis_complete',
+            'endpoint': endpoint,
+            'analysis_time': result['analysis_time'],
+            'frames_analyzed': result.get('frames_analyzed'),
+            'stage_ms': {name: stage['ms'] for name, stage in result['timings']['stages'].items()},
+        }
+    )
+
+def start_timer(x_profile: Optional[str]) -> StageTimer:
+    """Stage timer for a request; it also samples stacks if the request is profiled"""
+    return profile_store.start(x_profile) or StageTimer()
+
+def require_profiling_access(x_profile: Optional[str]):
+    """404 while profiling is disabled, 403 without the configured token"""
+    if not profile_store.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if profile_store.token and x_profile != profile_store.token:
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+def release_upload(ticket, result: dict, timer: StageTimer):
+    """Release an admission ticket, feeding the measured per-frame inference cost back"""
+    admission.release(ticket, timer.total(*FRAME_COST_STAGES), result.get('frames_analyzed'))
+
+async def run_scheduled(lane: str, job_id: str, analyze, *args, timer: StageTimer, **kwargs) -> dict:
+    """
+    Admit an analysis job into its priority lane and run it off the event loop.
+    
+    Waits for a free lane slot on the event loop, so queued jobs hold no
+    threadpool thread, then runs analyze(*args, scheduler_job=job, timer=timer,
+    **kwargs) in the threadpool (sampled for the whole analysis when profiled)
+    and records how long the job queued in its lane.
+    """
+    job = await scheduler.admit_async(job_id, lane=lane, priority=UPLOAD_PRIORITY, drop_stale=False)
+    try:
+        run = timer.profiled(analyze) if isinstance(timer, ProfilingTimer) else analyze
+        result = await run_in_threadpool(run, *args, scheduler_job=job, timer=timer, **kwargs)
+        status = job.status()
+    finally:
+        scheduler.unregister(job_id)
+    
+    result['scheduling'] = status
+    result['queue_wait'] = {
+        'lane': lane,
+        'admission_wait_ms': status['admission_wait_ms'],
+        'avg_frame_wait_ms': status['avg_frame_wait_ms'],
+    }
+    return result
+
 # Create temp directory for uploads
 TEMP_DIR = Path("./temp_videos")
 TEMP_DIR.mkdir(exist_ok=True)
@@ -85,7 +298,10 @@ async def root():
         "status": "running",
         "endpoints": {
             "analyze": "/ai/analyze-traffic",
-            "health": "/health"
+            "quick_analyze": "/ai/quick-analyze",
+            "streams": "/ai/streams",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -95,13 +311,28 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "model_loaded": analyzer.model is not None
+        "model_loaded": analyzer.model is not None,
+        "notifications": dispatcher.get_stats(),
+        "admission": admission.get_stats(),
+        "quality": quality_controller.get_stats(),
+        "profiling": profile_store.get_stats(),
+        "logging": logging_stats()
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage timing histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/ai/analyze-traffic")
 async def analyze_traffic(
     video: UploadFile = File(...),
-    test_mode: bool = Form(False)
+    test_mode: bool = Form(False),
+    time_budget: Optional[float] = Form(None),
+    start_time: Optional[float] = Form(None),
+    end_time: Optional[float] = Form(None),
+    roi: Optional[str] = Form(None),
+    x_profile: Optional[str] = Header(None)
 ):
     """
     Analyze traffic video for incident detection
@@ -109,10 +340,19 @@ async def analyze_traffic(
     Args:
         video: Video file (mp4, mov, avi, mkv, webm)
         test_mode: Enable screen video detection (for YouTube recordings)
+        time_budget: Optional seconds to answer within; sampling is planned
+            to fit and a partial result is returned if time runs out
+        start_time: Optional start of the window to analyze (seconds)
+        end_time: Optional end of the window to analyze (seconds)
+        roi: Optional JSON polygon [[x, y], ...] in pixels or frame fractions
+        x_profile: X-Profile header; with profiling enabled, stores a
+            stack-sampling profile of this analysis
         
     Returns:
         dict with analysis results
     """
+    deadline = parse_time_budget(time_budget)
+    polygon = parse_roi(roi)
     
     # Validate file type
     allowed_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
@@ -124,69 +364,125 @@ async def analyze_traffic(
             detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
         )
     
-    # Save uploaded file temporarily
-    temp_path = TEMP_DIR / f"temp_{int(time.time())}_{video.filename}"
+    # Shed load before spending disk and decode time on the upload
+    try:
+        admission.check_capacity()
+    except AdmissionRejected as e:
+        raise shed(e)
+    
+    # Save uploaded file temporarily; a random name keeps concurrent uploads
+    # (and their scheduler jobs) apart, and keeps the client's filename out of the path
+    upload_id = uuid.uuid4().hex
+    temp_path = TEMP_DIR / f"temp_{upload_id}{Path(video.filename or '').suffix}"
+    ticket = None
+    timer = start_timer(x_profile)
     
     try:
         # Save file
-        with temp_path.open("wb") as buffer:
+        with timer.stage('upload_write'), temp_path.open("wb") as buffer:
             shutil.copyfileobj(video.file, buffer)
         
+        # Fidelity is fixed for the whole analysis when it is admitted
+        quality = quality_controller.settings()
+        
+        # Reject oversized videos and estimate the work before queueing
+        frame_skip = enhanced_analyzer.frame_skip if test_mode else analyzer.frame_skip
+        ticket, quality = admit_upload(
+            STANDARD_LANE, str(temp_path), frame_skip, quality, deadline, start_time, end_time, timer
+        )
+        window = {'start_time': start_time, 'end_time': end_time, 'roi': polygon}
+        
+        # Full analyses run in the standard lane, off the event loop
+        job_id = f"upload-{upload_id}"
+        
+        # Strongly confirmed incidents reach the dashboard before analysis ends
+        incident_id = getattr(video, 'incident_id', None) or int(time.time())  # Use timestamp as fallback ID
+        on_provisional = provisional_notifier(incident_id)
+        
         # Choose analyzer based on test_mode
         if test_mode:
-            print(f"🧪 Test mode: Using enhanced analyzer for screen video")
-            start_time = time.time()
-            result = enhanced_analyzer.analyze_video(str(temp_path), test_mode=True)
-            analysis_time = time.time() - start_time
+            logger.info("🧪 Test mode: Using enhanced analyzer for screen video")
+            analysis_started = time.time()
+            result = await run_scheduled(
+                STANDARD_LANE, job_id, enhanced_analyzer.analyze_video, str(temp_path), test_mode=True,
+                quality=quality, deadline=deadline, on_provisional=on_provisional, timer=timer, **window
+            )
+            analysis_time = time.time() - analysis_started
         else:
-            start_time = time.time()
-            result = analyzer.analyze_video(str(temp_path))
-            analysis_time = time.time() - start_time
+            analysis_started = time.time()
+            result = await run_scheduled(
+                STANDARD_LANE, job_id, analyzer.analyze_video, str(temp_path),
+                quality=quality, deadline=deadline, on_provisional=on_provisional, timer=timer, **window
+            )
+            analysis_time = time.time() - analysis_started
         
         # Add analysis metadata
         result['analysis_time'] = round(analysis_time, 2)
         result['video_filename'] = video.filename
         result['video_size_mb'] = round(temp_path.stat().st_size / (1024 * 1024), 2)
+        if time_budget:
+            result['time_budget'] = budget_report(time_budget, quality, result)
+        release_upload(ticket, result, timer)
         
-        # Notify backend for real-time dashboard updates
-        incident_id = getattr(video, 'incident_id', None) or int(time.time())  # Use timestamp as fallback ID
-        await notify_backend(
-            incident_id=incident_id,
-            result=result,
-            confidence=result.get('confidence', 0),
-            vehicle_count=result.get('vehicle_count', 0),
-            incident_detected=result.get('incident_detected', False),
-            detected_type=result.get('incident_type', None)
-        )
+        # Queue backend notification for real-time dashboard updates
+        with timer.stage('notify'):
+            dispatcher.enqueue(
+                incident_id=incident_id,
+                result=result,
+                confidence=result.get('confidence', 0),
+                vehicle_count=result.get('vehicle_count', 0),
+                incident_detected=result.get('incident_detected', False),
+                detected_type=result.get('incident_type', None)
+            )
+        record_timings('analyze', timer, result)
+        if isinstance(timer, ProfilingTimer):
+            result['profile'] = profile_store.save(temp_path.name, timer)
         
         return {
             "success": True,
             "data": result
         }
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
+        logger.exception("❌ Analysis failed: %s", e, extra={'event': 'analysis_failed'})
         raise HTTPException(
             status_code=500,
             detail=f"Analysis failed: {str(e)}"
         )
     
     finally:
+        if ticket is not None:
+            admission.release(ticket)
+        # Keep the profile of failed analyses too
+        if isinstance(timer, ProfilingTimer):
+            profile_store.save(temp_path.name, timer)
         # Clean up temp file
         if temp_path.exists():
             temp_path.unlink()
 
 @app.post("/ai/quick-analyze")
-async def quick_analyze(video: UploadFile = File(...)):
+async def quick_analyze(
+    video: UploadFile = File(...),
+    time_budget: Optional[float] = Form(None),
+    x_profile: Optional[str] = Header(None)
+):
     """
     Quick analysis for auto-captured short clips (5-second videos)
     Optimized for faster processing and relevance detection
     
     Args:
         video: Short video file (mp4, mov, avi, mkv, webm)
+        time_budget: Optional seconds to answer within (e.g. 3 for the mobile app)
+        x_profile: X-Profile header; with profiling enabled, stores a
+            stack-sampling profile of this analysis
         
     Returns:
         dict with quick analysis results including has_relevant_data flag
     """
+    deadline = parse_time_budget(time_budget)
     
     # Validate file type
     allowed_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
@@ -198,39 +494,170 @@ async def quick_analyze(video: UploadFile = File(...)):
             detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
         )
     
+    try:
+        admission.check_capacity()
+    except AdmissionRejected as e:
+        raise shed(e)
+    
     # Save uploaded file temporarily
-    temp_path = TEMP_DIR / f"quick_{int(time.time())}_{video.filename}"
+    upload_id = uuid.uuid4().hex
+    temp_path = TEMP_DIR / f"quick_{upload_id}{Path(video.filename or '').suffix}"
+    ticket = None
+    timer = start_timer(x_profile)
     
     try:
         # Save file
-        with temp_path.open("wb") as buffer:
+        with timer.stage('upload_write'), temp_path.open("wb") as buffer:
             shutil.copyfileobj(video.file, buffer)
         
-        # Quick analysis optimized for short clips
+        # Short clips sample every 2nd frame
+        quality = quality_controller.settings()
+        ticket, quality = admit_upload(QUICK_LANE, str(temp_path), 2, quality, deadline, timer=timer)
+        
+        # Quick analysis optimized for short clips; the quick lane never
+        # waits behind full analyses, and has reserved inference workers and
+        # its own model so it never waits for the standard lane's model lock
         start_time = time.time()
-        result = analyzer.analyze_short_clip(str(temp_path))
+        result = await run_scheduled(
+            QUICK_LANE, f"quick-{upload_id}", quick_analyzer.analyze_short_clip, str(temp_path), quality=quality, deadline=deadline, timer=timer
+        )
         analysis_time = time.time() - start_time
         
         # Add analysis metadata
         result['analysis_time'] = round(analysis_time, 2)
         result['video_size_mb'] = round(temp_path.stat().st_size / (1024 * 1024), 2)
+        if time_budget:
+            result['time_budget'] = budget_report(time_budget, quality, result)
+        record_timings('quick', timer, result)
+        release_upload(ticket, result, timer)
+        if isinstance(timer, ProfilingTimer):
+            result['profile'] = profile_store.save(temp_path.name, timer)
         
         return {
             "success": True,
             "data": result
         }
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
+        logger.exception("❌ Quick analysis failed: %s", e, extra={'event': 'analysis_failed'})
         raise HTTPException(
             status_code=500,
             detail=f"Quick analysis failed: {str(e)}"
         )
     
     finally:
+        if ticket is not None:
+            admission.release(ticket)
+        # Keep the profile of failed analyses too
+        if isinstance(timer, ProfilingTimer):
+            profile_store.save(temp_path.name, timer)
         # Clean up temp file
         if temp_path.exists():
             temp_path.unlink()
 
+@app.post("/admin/profile")
+async def arm_profiling(count: int = Form(1), x_profile: Optional[str] = Header(None)):
+    """Profile the next `count` analyses, whoever sends them (0 disarms)"""
+    require_profiling_access(x_profile)
+    return {
+        "success": True,
+        "data": {"armed": profile_store.arm(count)}
+    }
+
+@app.get("/admin/profiles")
+async def list_profiles(x_profile: Optional[str] = Header(None)):
+    """Stored profiles, newest first"""
+    require_profiling_access(x_profile)
+    return {
+        "success": True,
+        "data": profile_store.list()
+    }
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, x_profile: Optional[str] = Header(None)):
+    """Folded stacks of a profile, ready for flamegraph.pl or speedscope"""
+    require_profiling_access(x_profile)
+    folded = profile_store.read(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    return PlainTextResponse(folded)
+
+class StreamRegistration(BaseModel):
+    """Camera stream to analyze continuously"""
+    camera_id: str
+    url: str  # rtsp://..., http://<ip>/video, or a local file path with STREAM_ALLOW_LOCAL_FILES
+    analysis_fps: Optional[float] = None
+    priority: int = STREAM_PRIORITY
+
+
+@app.post("/ai/streams")
+async def register_stream(stream: StreamRegistration):
+    """
+    Start continuous incident detection on a live camera stream
+    
+    Incident state changes are pushed to the backend webhook.
+    """
+    try:
+        validate_stream_url(stream.url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        status = stream_analyzer.register(
+            stream.camera_id, stream.url, stream.analysis_fps, stream.priority
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {
+        "success": True,
+        "data": status
+    }
+
+@app.get("/ai/streams")
+async def list_streams():
+    """List registered camera streams with reader health and incident state"""
+    return {
+        "success": True,
+        "data": stream_analyzer.list()
+    }
+
+@app.get("/ai/streams/{camera_id}")
+async def get_stream(camera_id: str):
+    """Status of a single camera stream"""
+    status = stream_analyzer.get(camera_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Camera not registered: {camera_id}")
+    
+    return {
+        "success": True,
+        "data": status
+    }
+
+@app.get("/ai/scheduler")
+async def scheduler_status():
+    """Per-stream target/achieved analysis rate, sampling stride and lag"""
+    return {
+        "success": True,
+        "data": {
+            "lanes": scheduler.lane_status(),
+            "streams": scheduler.status()
+        }
+    }
+
+@app.delete("/ai/streams/{camera_id}")
+async def unregister_stream(camera_id: str):
+    """Stop analyzing a camera stream"""
+    if not stream_analyzer.unregister(camera_id):
+        raise HTTPException(status_code=404, detail=f"Camera not registered: {camera_id}")
+    
+    return {
+        "success": True
+    }
+
 if __name__ == "__main__":
     import uvicorn
     
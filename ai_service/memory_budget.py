@@ -0,0 +1,251 @@
+"""
+Memory Budget - Bounded per-analysis memory for long videos
+Keeps the per-frame analyses of one video within a memory budget by
+compacting them in memory, then spilling them to disk, and reports the
+analysis's RSS and (optionally) tracemalloc figures
+"""
+
+import logging
+import os
+import resource
+import struct
+import sys
+import tempfile
+import tracemalloc
+from collections.abc import Sequence
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', 256))  # per analysis
+MEMORY_RSS_CHECK_EVERY = int(os.getenv('MEMORY_RSS_CHECK_EVERY', 50))  # analyzed frames
+MEMORY_TRACEMALLOC = os.getenv('MEMORY_TRACEMALLOC', 'false').lower() == 'true'
+MEMORY_TRACEMALLOC_TOP = int(os.getenv('MEMORY_TRACEMALLOC_TOP', 5))
+MEMORY_SPILL_DIR = os.getenv('MEMORY_SPILL_DIR') or tempfile.gettempdir()
+
+# Share of the budget full frame analyses may use before they are compacted
+STREAMING_FRACTION = 0.5
+
+# Approximate CPython sizes of a frame analysis: the frame dict, and per
+# vehicle its dict, bbox and center lists and floats
+FRAME_BYTES = 480
+VEHICLE_BYTES = 720
+COMPACT_BYTES = 560
+
+# Spilled frame: frame_id, vehicle_count, has centroid, centroid x/y, test_mode
+SPILL_RECORD = struct.Struct('<qiBddB')
+SPILL_READ_RECORDS = 4096
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process now (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def compact_analysis(analysis: Dict) -> Dict:
+    """
+    Reduce a frame analysis to what consolidation reads.
+
+    The vehicle count is kept and the vehicle list is replaced by a single
+    entry at the centroid of the vehicle centers, which gives the same
+    frame-to-frame movement as the full list.
+    """
+    vehicles = analysis.get('vehicles') or []
+    compact = {
+        'frame_id': analysis['frame_id'],
+        'vehicle_count': analysis['vehicle_count'],
+        'vehicles': [{'center': np.mean([v['center'] for v in vehicles], axis=0).tolist()}] if vehicles else [],
+    }
+    if 'test_mode' in analysis:
+        compact['test_mode'] = analysis['test_mode']
+    return compact
+
+
+class FrameLog(Sequence):
+    """
+    The per-frame analyses of one video, within a memory budget.
+
+    Behaves like the list the analyzers used to build. It moves through
+    three modes as the video gets longer:
+
+    - full: every analysis is kept as returned
+    - streaming: older analyses are compacted (compact_analysis), only the
+      newest is kept in full
+    - spill: compacted analyses are written to a temporary file and read
+      back when the analyses are consolidated
+
+    A mode is entered when the retained analyses exceed their share of
+    the budget, or when the process RSS has grown by more than the budget
+    since the analysis started.
+    """
+
+    def __init__(self, budget_mb: float = MEMORY_BUDGET_MB, spill_dir: str = MEMORY_SPILL_DIR,
+                 rss_check_every: int = MEMORY_RSS_CHECK_EVERY, trace: bool = MEMORY_TRACEMALLOC):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+        self.rss_check_every = max(1, rss_check_every)
+        self.mode = 'full'
+        self.mode_changes: List[Dict] = []
+
+        self._records: List[Dict] = []  # full or compacted analyses kept in memory
+        self._retained = 0  # estimated bytes of self._records
+        self._spill = None
+        self._spilled = 0
+
+        self.rss_start = current_rss_mb()
+        self.rss_peak = self.rss_start
+
+        self._snapshot = None
+        if trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def append(self, analysis: Dict):
+        if self.mode == 'full':
+            self._records.append(analysis)
+            self._retained += FRAME_BYTES + VEHICLE_BYTES * len(analysis.get('vehicles') or ())
+        else:
+            # The newest analysis stays in full for the next movement estimate
+            if self._records:
+                self._records[-1] = compact_analysis(self._records[-1])
+            self._records.append(analysis)
+            self._retained = COMPACT_BYTES * len(self._records)
+            if self.mode == 'spill':
+                self._spill_records(keep_last=True)
+
+        if len(self) % self.rss_check_every == 0:
+            rss = current_rss_mb()
+            self.rss_peak = max(self.rss_peak, rss)
+            if (rss - self.rss_start) * 1024 * 1024 > self.budget_bytes and self.mode != 'spill':
+                self._escalate(analysis['frame_id'], 'rss')
+                return
+
+        if self.mode == 'full' and self._retained > self.budget_bytes * STREAMING_FRACTION:
+            self._escalate(analysis['frame_id'], 'frames')
+        elif self.mode == 'streaming' and self._retained > self.budget_bytes:
+            self._escalate(analysis['frame_id'], 'frames')
+
+    def _escalate(self, frame_id: int, reason: str):
+        if self.mode == 'full':
+            self.mode = 'streaming'
+            self._records = [compact_analysis(r) for r in self._records[:-1]] + self._records[-1:]
+            self._retained = COMPACT_BYTES * len(self._records)
+        else:
+            self.mode = 'spill'
+            self._spill = tempfile.TemporaryFile(prefix='frame_log_', dir=self.spill_dir)
+            self._spill_records(keep_last=True)
+        self.mode_changes.append({'frame_id': frame_id, 'mode': self.mode, 'reason': reason})
+        logger.info("🧠 Frame analyses switched to %s mode at frame %d (%s over budget)", self.mode, frame_id, reason,
+                    extra={'event': 'memory_mode_change'})
+
+    def _spill_records(self, keep_last: bool):
+        """Write the compacted in-memory records to the spill file"""
+        keep = self._records[-1:] if keep_last else []
+        spill = self._records[:-1] if keep_last else self._records
+        if spill:
+            self._spill.seek(0, os.SEEK_END)
+            self._spill.write(b''.join(self._pack(r) for r in spill))
+            self._spilled += len(spill)
+        self._records = keep
+        self._retained = COMPACT_BYTES * len(keep)
+
+    @staticmethod
+    def _pack(record: Dict) -> bytes:
+        vehicles = record['vehicles']
+        x, y = vehicles[0]['center'] if vehicles else (0.0, 0.0)
+        return SPILL_RECORD.pack(
+            record['frame_id'], record['vehicle_count'], bool(vehicles), x, y, record.get('test_mode', False)
+        )
+
+    @staticmethod
+    def _unpack(data: bytes, offset: int = 0) -> Dict:
+        frame_id, count, has_centroid, x, y, test_mode = SPILL_RECORD.unpack_from(data, offset)
+        record = {
+            'frame_id': frame_id,
+            'vehicle_count': count,
+            'vehicles': [{'center': [x, y]}] if has_centroid else [],
+        }
+        if test_mode:
+            record['test_mode'] = True
+        return record
+
+    def __len__(self) -> int:
+        return self._spilled + len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame log index out of range')
+        if index >= self._spilled:
+            return self._records[index - self._spilled]
+        self._spill.seek(index * SPILL_RECORD.size)
+        return self._unpack(self._spill.read(SPILL_RECORD.size))
+
+    def __iter__(self):
+        if self._spilled:
+            for start in range(0, self._spilled, SPILL_READ_RECORDS):
+                self._spill.seek(start * SPILL_RECORD.size)
+                count = min(SPILL_READ_RECORDS, self._spilled - start)
+                data = self._spill.read(count * SPILL_RECORD.size)
+                for i in range(count):
+                    yield self._unpack(data, i * SPILL_RECORD.size)
+        yield from list(self._records)
+
+    def close(self):
+        """Remove the spill file"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            self._spilled = 0
+
+    def report(self) -> Dict:
+        """Memory figures of the analysis so far"""
+        rss = current_rss_mb()
+        self.rss_peak = max(self.rss_peak, rss)
+        report = {
+            'mode': self.mode,
+            'budget_mb': round(self.budget_bytes / (1024 * 1024), 1),
+            'retained_mb': round(self._retained / (1024 * 1024), 2),
+            'spilled_frames': self._spilled,
+            'spilled_mb': round(self._spilled * SPILL_RECORD.size / (1024 * 1024), 2),
+            'rss_start_mb': round(self.rss_start, 1),
+            'rss_peak_mb': round(self.rss_peak, 1),
+            'rss_growth_mb': round(self.rss_peak - self.rss_start, 1),
+            'process_peak_rss_mb': round(peak_rss_mb(), 1),
+        }
+        if self.mode_changes:
+            report['mode_changes'] = self.mode_changes
+        if self._snapshot is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().compare_to(self._snapshot, 'lineno')[:MEMORY_TRACEMALLOC_TOP]
+            report['tracemalloc'] = {
+                'current_mb': round(current / (1024 * 1024), 2),
+                'peak_mb': round(peak / (1024 * 1024), 2),
+                'top_growth': [
+                    {'where': str(stat.traceback[0]), 'size_kb': round(stat.size_diff / 1024, 1), 'count': stat.count_diff}
+                    for stat in top
+                ],
+            }
+        return report
@@ -0,0 +1,244 @@
+"""
+Notification Outbox - Durable on-disk queue for backend webhook deliveries
+Pending notifications survive backend outages and AI service restarts
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+OUTBOX_PATH = os.getenv('NOTIFY_OUTBOX_PATH', './data/notification_outbox.db')
+OUTBOX_COMMIT_INTERVAL = float(os.getenv('NOTIFY_OUTBOX_COMMIT_INTERVAL', 0.05))  # seconds
+OUTBOX_COMPACT_INTERVAL = float(os.getenv('NOTIFY_OUTBOX_COMPACT_INTERVAL', 60))  # seconds
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('NOTIFY_OUTBOX_MAX_ATTEMPTS', 20))  # backend errors before dead-lettering
+OUTBOX_FAILED_RETENTION = float(os.getenv('NOTIFY_OUTBOX_FAILED_RETENTION', 7 * 24 * 3600))  # seconds
+
+# Entry states
+PENDING = 0
+DELIVERED = 1
+REJECTED = 2  # the backend refused it (4xx)
+DEAD = 3  # the backend errored (5xx) on it OUTBOX_MAX_ATTEMPTS times
+
+
+def idempotency_key(incident_id: Any, payload: Dict[str, Any]) -> str:
+    """
+    Stable key for a notification: incident ID plus a hash of its content.
+    The backend uses it to ignore replays of already-delivered results.
+    """
+    body = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return f"{incident_id}:{hashlib.sha256(body).hexdigest()[:16]}"
+
+
+class NotificationOutbox:
+    """
+    SQLite outbox in WAL mode with group commit.
+
+    append() only buffers in memory; a flusher thread writes everything
+    buffered in one transaction every OUTBOX_COMMIT_INTERVAL seconds.
+    With synchronous=NORMAL, WAL commits are not fsynced individually,
+    so hundreds of appends per second cost a handful of transactions.
+    A crash can lose at most the last commit interval of appends.
+    
+    Entries the backend keeps failing on are dead-lettered after
+    max_attempts errors so they cannot block the entries behind them.
+    Rejected and dead entries are kept for inspection for
+    failed_retention seconds.
+    """
+
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        commit_interval: float = OUTBOX_COMMIT_INTERVAL,
+        compact_interval: float = OUTBOX_COMPACT_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        failed_retention: float = OUTBOX_FAILED_RETENTION
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.commit_interval = commit_interval
+        self.compact_interval = compact_interval
+        self.max_attempts = max(1, max_attempts)
+        self.failed_retention = failed_retention
+
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple[str, str, float]] = []
+        self._closed = threading.Event()
+        self._last_compact = time.monotonic()
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                state INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (state, seq)')
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='outbox-flusher', daemon=True)
+        self._flusher.start()
+
+    def append(self, payload: Dict[str, Any]) -> str:
+        """
+        Buffer a notification for durable delivery.
+
+        Adds an 'idempotency_key' field to the payload if it has none.
+
+        Returns:
+            The idempotency key of the entry
+        """
+        key = payload.get('idempotency_key') or idempotency_key(payload.get('incident_id'), payload)
+        payload['idempotency_key'] = key
+        body = json.dumps(payload, default=str)
+
+        with self._lock:
+            self._buffer.append((key, body, time.time()))
+        return key
+
+    def flush(self):
+        """Write all buffered appends in a single transaction"""
+        with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            try:
+                self._conn.execute('BEGIN')
+                # Duplicate keys are replays of the same content - keep the first
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO outbox (idempotency_key, payload, created_at) VALUES (?, ?, ?)',
+                    rows
+                )
+                self._conn.execute('COMMIT')
+            except sqlite3.Error:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                # Keep the rows buffered so the next flush retries them
+                self._buffer = rows + self._buffer
+                raise
+
+    def fetch_pending(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Oldest undelivered entries, in append order.
+
+        Returns:
+            List of (seq, payload) tuples
+        """
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT seq, payload FROM outbox WHERE state = ? ORDER BY seq LIMIT ?',
+                (PENDING, limit)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def mark(self, delivered: List[int], rejected: List[int] = (), failed: List[int] = ()) -> List[int]:
+        """
+        Record delivery outcomes for a batch of entries.
+        
+        Entries that were not attempted or found the backend unreachable
+        are left as they are.
+        
+        Args:
+            delivered: Entries the backend accepted
+            rejected: Entries the backend refused (4xx)
+            failed: Entries the backend errored on (5xx)
+        
+        Returns:
+            The failed entries that reached max_attempts and were dead-lettered
+        """
+        with self._lock:
+            self._conn.execute('BEGIN')
+            if delivered:
+                self._conn.executemany(
+                    'UPDATE outbox SET state = ?, attempts = attempts + 1 WHERE seq = ?',
+                    [(DELIVERED, seq) for seq in delivered]
+                )
+            if rejected:
+                self._conn.executemany(
+                    'UPDATE outbox SET state = ?, attempts = attempts + 1 WHERE seq = ?',
+                    [(REJECTED, seq) for seq in rejected]
+                )
+            dead = []
+            if failed:
+                self._conn.executemany(
+                    'UPDATE outbox SET attempts = attempts + 1 WHERE seq = ?',
+                    [(seq,) for seq in failed]
+                )
+                placeholders = ','.join('?' * len(failed))
+                dead = [seq for (seq,) in self._conn.execute(
+                    f'SELECT seq FROM outbox WHERE seq IN ({placeholders}) AND attempts >= ?',
+                    (*failed, self.max_attempts)
+                ).fetchall()]
+                self._conn.executemany(
+                    'UPDATE outbox SET state = ? WHERE seq = ?', [(DEAD, seq) for seq in dead]
+                )
+            self._conn.execute('COMMIT')
+        return dead
+
+    def compact(self):
+        """Delete delivered entries and expired rejected/dead ones, and truncate the WAL"""
+        with self._lock:
+            self._conn.execute('DELETE FROM outbox WHERE state = ?', (DELIVERED,))
+            self._conn.execute(
+                'DELETE FROM outbox WHERE state IN (?, ?) AND created_at < ?',
+                (REJECTED, DEAD, time.time() - self.failed_retention)
+            )
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._last_compact = time.monotonic()
+
+    def pending_count(self) -> int:
+        """Number of entries still awaiting delivery (including unflushed appends)"""
+        with self._lock:
+            (count,) = self._conn.execute(
+                'SELECT COUNT(*) FROM outbox WHERE state = ?', (PENDING,)
+            ).fetchone()
+            return count + len(self._buffer)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Entry counts by state"""
+        with self._lock:
+            rows = dict(self._conn.execute(
+                'SELECT state, COUNT(*) FROM outbox GROUP BY state'
+            ).fetchall())
+            buffered = len(self._buffer)
+        return {
+            'pending': rows.get(PENDING, 0) + buffered,
+            'delivered_uncompacted': rows.get(DELIVERED, 0),
+            'rejected': rows.get(REJECTED, 0),
+            'dead': rows.get(DEAD, 0),
+        }
+
+    def close(self):
+        """Flush buffered appends and close the database"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+        self.compact()
+        with self._lock:
+            self._conn.close()
+
+    def _flush_loop(self):
+        """Group-commit buffered appends and periodically compact"""
+        while not self._closed.wait(self.commit_interval):
+            try:
+                self.flush()
+                if time.monotonic() - self._last_compact >= self.compact_interval:
+                    self.compact()
+            except sqlite3.Error as e:
+                logger.error("❌ Outbox write failed: %s", e, extra={'event': 'outbox_write_failed'})
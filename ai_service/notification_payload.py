@@ -0,0 +1,159 @@
+"""
+Notification Payload Encoder - Compact wire format for backend webhooks
+Slim summary schema, optional gzip/zstd compression and MessagePack bodies
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, Any, Tuple, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency
+    msgpack = None
+
+# Configuration
+PAYLOAD_SCHEMA = os.getenv('NOTIFY_PAYLOAD_SCHEMA', 'full')  # full | slim
+PAYLOAD_COMPRESSION = os.getenv('NOTIFY_COMPRESSION', 'none')  # none | gzip | zstd
+PAYLOAD_CONTENT_TYPE = os.getenv('NOTIFY_CONTENT_TYPE', 'json')  # json | msgpack
+COMPRESSION_MIN_BYTES = int(os.getenv('NOTIFY_COMPRESSION_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Top-level webhook fields read by the backend
+ENVELOPE_FIELDS = (
+    'incident_id', 'confidence', 'vehicle_count', 'incident_detected',
+    'detected_type', 'idempotency_key',
+)
+
+# Result fields kept by the slim schema (scalars the dashboard displays)
+SUMMARY_FIELDS = (
+    'incident_type', 'severity', 'max_vehicle_count', 'avg_speed',
+    'stationary_count', 'frames_analyzed', 'total_frames', 'analysis_time',
+    'video_filename', 'video_size_mb', 'temporal_confirmed', 'detection_method',
+    'provisional', 'partial', 'coverage',
+)
+
+
+def slim_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a webhook payload to the slim summary schema.
+
+    Fields already present at the top level (confidence, vehicle_count,
+    incident_detected) are not repeated inside 'result', and lists or
+    nested objects such as per-frame data are dropped.
+    """
+    if payload.get('schema') == 'slim':
+        return payload
+
+    result = payload.get('result') or {}
+    summary = {
+        key: result[key] for key in SUMMARY_FIELDS
+        if key in result and not isinstance(result[key], (list, dict))
+    }
+
+    slim = {key: payload[key] for key in ENVELOPE_FIELDS if key in payload}
+    slim['result'] = summary
+    slim['schema'] = 'slim'
+    return slim
+
+
+def serialize(payload: Any, content_type: str = PAYLOAD_CONTENT_TYPE) -> Tuple[bytes, str]:
+    """
+    Serialize a payload body.
+
+    Returns:
+        (body, Content-Type header value)
+    """
+    if content_type == 'msgpack':
+        if msgpack is None:
+            raise RuntimeError("NOTIFY_CONTENT_TYPE=msgpack requires the 'msgpack' package")
+        return msgpack.packb(payload, default=str), 'application/msgpack'
+
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    return body, 'application/json'
+
+
+def compress(body: bytes, method: str = PAYLOAD_COMPRESSION,
+             min_bytes: int = COMPRESSION_MIN_BYTES) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a serialized body.
+
+    Bodies smaller than min_bytes are sent as-is, where compression
+    overhead outweighs the savings.
+
+    Returns:
+        (body, Content-Encoding header value or None)
+    """
+    if method == 'none' or len(body) < min_bytes:
+        return body, None
+
+    if method == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("NOTIFY_COMPRESSION=zstd requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), 'zstd'
+
+    if method == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+
+    raise ValueError(f"Unknown compression method: {method}")
+
+
+class PayloadEncoder:
+    """
+    Encodes webhook payloads according to the configured schema,
+    content type and compression.
+    """
+
+    def __init__(
+        self,
+        schema: str = PAYLOAD_SCHEMA,
+        compression: str = PAYLOAD_COMPRESSION,
+        content_type: str = PAYLOAD_CONTENT_TYPE,
+        min_bytes: int = COMPRESSION_MIN_BYTES
+    ):
+        # Checked here, at startup, rather than on every send: a body that
+        # can never be encoded would otherwise be retried forever
+        if schema not in ('full', 'slim'):
+            raise ValueError(f"Unknown payload schema: {schema}")
+        if compression not in ('none', 'gzip', 'zstd'):
+            raise ValueError(f"Unknown compression method: {compression}")
+        if content_type not in ('json', 'msgpack'):
+            raise ValueError(f"Unknown content type: {content_type}")
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("NOTIFY_COMPRESSION=zstd requires the 'zstandard' package")
+        if content_type == 'msgpack' and msgpack is None:
+            raise RuntimeError("NOTIFY_CONTENT_TYPE=msgpack requires the 'msgpack' package")
+
+        self.schema = schema
+        self.compression = compression
+        self.content_type = content_type
+        self.min_bytes = min_bytes
+
+    def shape(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply the configured schema to a single payload"""
+        return slim_payload(payload) if self.schema == 'slim' else payload
+
+    def encode(self, body: Any) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Serialize and compress a request body.
+
+        Args:
+            body: A payload (already shaped) or a batch envelope
+
+        Returns:
+            (encoded bytes, HTTP headers)
+        """
+        data, content_type = serialize(body, self.content_type)
+        data, encoding = compress(data, self.compression, self.min_bytes)
+
+        headers = {'Content-Type': content_type}
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return data, headers
@@ -0,0 +1,106 @@
+"""
+Progressive Results - Early exit and provisional results for analyses
+Lets analyzers stop irrelevant clips early and report strongly confirmed
+incidents before the whole video has been analyzed
+"""
+
+import logging
+import os
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+QUICK_EARLY_EXIT_FRAMES = int(os.getenv('QUICK_EARLY_EXIT_FRAMES', 5))
+QUICK_EARLY_EXIT_MAX_VEHICLES = int(os.getenv('QUICK_EARLY_EXIT_MAX_VEHICLES', 1))
+PROGRESS_INTERVAL_FRAMES = int(os.getenv('PROGRESS_INTERVAL_FRAMES', 10))  # analyzed frames between checks
+PROVISIONAL_MIN_CONFIDENCE = float(os.getenv('PROVISIONAL_MIN_CONFIDENCE', 0.8))
+PROVISIONAL_CONFIRM_CHECKS = int(os.getenv('PROVISIONAL_CONFIRM_CHECKS', 2))
+PROVISIONAL_WINDOW_FRAMES = int(os.getenv('PROVISIONAL_WINDOW_FRAMES', 60))  # newest analyzed frames consolidated per check
+
+
+def clearly_irrelevant(frame_analyses: List[Dict],
+                       min_frames: int = QUICK_EARLY_EXIT_FRAMES,
+                       max_vehicles: int = QUICK_EARLY_EXIT_MAX_VEHICLES) -> bool:
+    """
+    True when enough sampled frames show (almost) empty road.
+
+    The relevance rule needs 3+ vehicles on average or a 5-vehicle peak,
+    so a clip whose first frames never exceed max_vehicles is not worth
+    finishing.
+    """
+    if len(frame_analyses) < min_frames:
+        return False
+    return max(f['vehicle_count'] for f in frame_analyses) <= max_vehicles
+
+
+class ProvisionalEmitter:
+    """
+    Emits a provisional result while a full analysis is still running.
+
+    Every PROGRESS_INTERVAL_FRAMES analyzed frames the newest
+    PROVISIONAL_WINDOW_FRAMES analyzed frames are consolidated, so each
+    check costs the same however long the video is. The emitter keeps its
+    own copy of that window and never reads back the analyzer's frame log
+    (which may be spilled to disk). When the same incident type reaches
+    PROVISIONAL_MIN_CONFIDENCE on PROVISIONAL_CONFIRM_CHECKS consecutive
+    checks, the callback receives the result marked provisional. Each
+    incident type is emitted at most once per analysis.
+    """
+
+    def __init__(
+        self,
+        consolidate: Callable[[List[Dict], float, int], Dict],
+        callback: Callable[[Dict], None],
+        fps: float,
+        total_frames: int,
+        interval: int = PROGRESS_INTERVAL_FRAMES,
+        min_confidence: float = PROVISIONAL_MIN_CONFIDENCE,
+        confirm_checks: int = PROVISIONAL_CONFIRM_CHECKS,
+        window: int = PROVISIONAL_WINDOW_FRAMES
+    ):
+        self.consolidate = consolidate
+        self.callback = callback
+        self.fps = fps
+        self.total_frames = total_frames
+        self.interval = max(1, interval)
+        self.min_confidence = min_confidence
+        self.confirm_checks = max(1, confirm_checks)
+
+        self._window: deque = deque(maxlen=max(1, window))
+        self._since_check = 0
+        self._candidate: Optional[str] = None
+        self._streak = 0
+        self.emitted: List[str] = []
+
+    def update(self, analysis: Dict, frames_read: int):
+        """Call with each new frame analysis"""
+        self._window.append(analysis)
+        self._since_check += 1
+        if self._since_check < self.interval:
+            return
+        self._since_check = 0
+
+        result = self.consolidate(list(self._window), self.fps, self.total_frames)
+        if not result['incident_detected'] or result['confidence'] < self.min_confidence:
+            self._candidate, self._streak = None, 0
+            return
+
+        if result['incident_type'] == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate, self._streak = result['incident_type'], 1
+
+        if self._streak >= self.confirm_checks and self._candidate not in self.emitted:
+            self.emitted.append(self._candidate)
+            result['provisional'] = True
+            result['coverage'] = round(min(1.0, frames_read / self.total_frames), 3) if self.total_frames > 0 else 1.0
+            try:
+                self.callback(result)
+            except Exception as e:
+                logger.warning("⚠️ Provisional result callback failed: %s", e, extra={'event': 'provisional_callback_failed'})
@@ -0,0 +1,228 @@
+"""
+Quality Controller - Trades analysis fidelity for throughput under load
+Watches inference queue latency and CPU usage and steps through a ladder
+of cheaper analysis settings, restoring full quality when load drops
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional, Any, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+QUALITY_CONTROL_ENABLED = os.getenv('QUALITY_CONTROL_ENABLED', 'true').lower() == 'true'
+QUALITY_INTERVAL = float(os.getenv('QUALITY_INTERVAL', 2))  # seconds between samples
+QUALITY_LATENCY_HIGH_MS = float(os.getenv('QUALITY_LATENCY_HIGH_MS', 500))
+QUALITY_LATENCY_LOW_MS = float(os.getenv('QUALITY_LATENCY_LOW_MS', 100))
+QUALITY_CPU_HIGH = float(os.getenv('QUALITY_CPU_HIGH', 0.9))  # fraction of all cores
+QUALITY_CPU_LOW = float(os.getenv('QUALITY_CPU_LOW', 0.6))
+QUALITY_RECOVER_SAMPLES = int(os.getenv('QUALITY_RECOVER_SAMPLES', 3))
+QUALITY_MIN_IMGSZ = int(os.getenv('QUALITY_MIN_IMGSZ', 320))
+INPUT_RESOLUTION = int(os.getenv('INPUT_RESOLUTION', 640))
+TIME_BUDGET_MIN_FRAMES = int(os.getenv('TIME_BUDGET_MIN_FRAMES', 8))  # before lowering imgsz
+TIME_BUDGET_SAFETY = 0.8  # plan to use this share of the budget
+
+
+def build_ladder(input_size: int = INPUT_RESOLUTION, min_imgsz: int = QUALITY_MIN_IMGSZ) -> List[Dict[str, Any]]:
+    """
+    Quality levels from full fidelity (0) to cheapest.
+
+    Each step gives up one thing: first the expensive screen denoising,
+    then half the sampled frames, then input resolution.
+    """
+    # YOLO input sizes must be multiples of the 32 px stride
+    mid_imgsz = max(min_imgsz, (input_size * 3 // 4) // 32 * 32)
+    low_imgsz = max(32, min(min_imgsz, input_size) // 32 * 32)
+    return [
+        {'frame_skip_factor': 1, 'imgsz': input_size, 'screen_preprocessing': 'full'},
+        {'frame_skip_factor': 1, 'imgsz': input_size, 'screen_preprocessing': 'fast'},
+        {'frame_skip_factor': 2, 'imgsz': input_size, 'screen_preprocessing': 'fast'},
+        {'frame_skip_factor': 2, 'imgsz': mid_imgsz, 'screen_preprocessing': 'fast'},
+        {'frame_skip_factor': 4, 'imgsz': low_imgsz, 'screen_preprocessing': 'none'},
+    ]
+
+
+def plan_time_budget(
+    quality: Dict[str, Any],
+    video: Dict[str, Any],
+    frame_skip: int,
+    budget: float,
+    frame_cost: float,
+    overhead: float = 0.0,
+    ladder: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Choose frame skip and imgsz so an analysis fits a time budget.
+
+    Keeps the highest imgsz at which at least TIME_BUDGET_MIN_FRAMES frames
+    can be analyzed, widening the frame skip as far as needed. Never plans
+    above the quality the controller currently allows.
+
+    Args:
+        quality: QualityController settings snapshot
+        video: probe_video() output (frames, width, height...)
+        frame_skip: Analyzer's base frame skip
+        budget: Seconds the client is willing to wait
+        frame_cost: Measured seconds per analyzed frame at full imgsz
+        overhead: Seconds spent regardless of sampling (decoding)
+        ladder: Quality ladder providing the candidate imgsz values
+
+    Returns:
+        quality snapshot with frame_skip_factor and imgsz adjusted
+    """
+    ladder = ladder or build_ladder()
+    full_imgsz = ladder[0]['imgsz']
+    candidates = sorted({step['imgsz'] for step in ladder if step['imgsz'] <= quality['imgsz']}, reverse=True)
+    usable = max(0.0, budget * TIME_BUDGET_SAFETY - overhead)
+    frames = max(1, video['frames'])
+
+    for imgsz in candidates:
+        # Inference cost grows with the input area
+        per_frame = frame_cost * (imgsz / full_imgsz) ** 2
+        affordable = max(1, int(usable / per_frame)) if per_frame > 0 else frames
+        factor = max(quality['frame_skip_factor'], math.ceil(frames / affordable / frame_skip))
+        planned_frames = math.ceil(frames / (frame_skip * factor))
+        if planned_frames >= TIME_BUDGET_MIN_FRAMES or imgsz == candidates[-1]:
+            break
+
+    return {
+        **quality,
+        'frame_skip_factor': factor,
+        'imgsz': imgsz,
+        'time_budget': budget,
+        'planned_frames': planned_frames,
+    }
+
+
+class ProcessCPU:
+    """Process CPU utilisation as a fraction of all cores between samples"""
+
+    def __init__(self):
+        self.cores = os.cpu_count() or 1
+        self._last = self._sample()
+
+    def _sample(self):
+        times = os.times()
+        return time.monotonic(), times.user + times.system
+
+    def utilisation(self) -> float:
+        now, cpu = self._sample()
+        wall = now - self._last[0]
+        used = cpu - self._last[1]
+        self._last = (now, cpu)
+        if wall <= 0:
+            return 0.0
+        return used / wall / self.cores
+
+
+class QualityController:
+    """
+    Feedback controller over the quality ladder.
+
+    Degrades one level per sample while frame queue latency or CPU is
+    above its high mark, and recovers one level after
+    QUALITY_RECOVER_SAMPLES consecutive samples below both low marks.
+    Analyses take a snapshot of settings() when they start, so a single
+    result is never analyzed at mixed fidelity.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        ladder: Optional[List[Dict[str, Any]]] = None,
+        interval: float = QUALITY_INTERVAL,
+        enabled: bool = QUALITY_CONTROL_ENABLED
+    ):
+        self.scheduler = scheduler
+        self.ladder = ladder or build_ladder()
+        self.interval = interval
+        self.enabled = enabled
+
+        self.level = 0
+        self.queue_latency_ms = 0.0
+        self.cpu = 0.0
+        self.reason = None
+        self._calm_samples = 0
+        self._cpu = ProcessCPU()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            'degrades': 0,
+            'recoveries': 0,
+        }
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='quality-controller', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def settings(self) -> Dict[str, Any]:
+        """Current quality level and its analysis settings"""
+        with self._lock:
+            return {'level': self.level, 'reason': self.reason, **self.ladder[self.level]}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                'enabled': self.enabled,
+                'level': self.level,
+                'max_level': len(self.ladder) - 1,
+                'queue_latency_ms': round(self.queue_latency_ms, 1),
+                'cpu': round(self.cpu, 3),
+                'settings': dict(self.ladder[self.level]),
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update(self._queue_latency_ms(), self._cpu.utilisation())
+            except Exception as e:
+                logger.warning("⚠️ Quality controller error: %s", e, extra={'event': 'quality_controller_error'})
+
+    def update(self, queue_latency_ms: float, cpu: float):
+        """Feed one sample of load signals and move along the ladder"""
+        with self._lock:
+            self.queue_latency_ms = queue_latency_ms
+            self.cpu = cpu
+
+            if queue_latency_ms > QUALITY_LATENCY_HIGH_MS or cpu > QUALITY_CPU_HIGH:
+                self._calm_samples = 0
+                if self.level < len(self.ladder) - 1:
+                    self.level += 1
+                    self.reason = 'queue_latency' if queue_latency_ms > QUALITY_LATENCY_HIGH_MS else 'cpu'
+                    self.stats['degrades'] += 1
+                    logger.info("📉 Quality level %d (%s: %.0f ms queued, CPU %.0f%%)",
+                                self.level, self.reason, queue_latency_ms, cpu * 100)
+                return
+
+            if queue_latency_ms < QUALITY_LATENCY_LOW_MS and cpu < QUALITY_CPU_LOW:
+                self._calm_samples += 1
+                if self.level > 0 and self._calm_samples >= QUALITY_RECOVER_SAMPLES:
+                    self.level -= 1
+                    self._calm_samples = 0
+                    self.reason = None if self.level == 0 else self.reason
+                    self.stats['recoveries'] += 1
+                    logger.info("📈 Quality level %d", self.level)
+            else:
+                self._calm_samples = 0
+
+    def _queue_latency_ms(self) -> float:
+        """Worst recent per-frame queue wait across scheduled streams and jobs"""
+        return max((s['queue_wait_ms'] for s in self.scheduler.status()), default=0.0)
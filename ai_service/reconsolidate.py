@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Re-consolidate Stored Detections
+================================
+Recomputes incident results from detections stored with DETECTION_STORE=true,
+using new thresholds, without running YOLO again. Each video is scored with
+the thresholds it was analyzed with and with the new ones, and every changed
+result is listed.
+
+Usage:
+    python reconsolidate.py ./detections --congestion-vehicle-threshold 10
+    python reconsolidate.py ./detections --accident-stationary-threshold 3 \\
+        --min-confidence 0.6 --output rescored.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from detection_store import DETECTION_STORE_DIR, find_stores, load_consolidator, reconsolidate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored detections with new incident thresholds")
+    parser.add_argument('stores', nargs='*', default=[DETECTION_STORE_DIR],
+                        help='Store directories, or directories containing them')
+    parser.add_argument('--congestion-vehicle-threshold', type=int)
+    parser.add_argument('--congestion-speed-threshold', type=float)
+    parser.add_argument('--accident-stationary-threshold', type=int)
+    parser.add_argument('--min-confidence', type=float,
+                        help='Drop stored detections below this (cannot go below the analyzed confidence)')
+    parser.add_argument('--output', help='Write every result to this JSON file')
+    args = parser.parse_args()
+
+    thresholds = {
+        'congestion_vehicle_threshold': args.congestion_vehicle_threshold,
+        'congestion_speed_threshold': args.congestion_speed_threshold,
+        'accident_stationary_threshold': args.accident_stationary_threshold,
+        'min_confidence': args.min_confidence,
+    }
+    paths = list(find_stores(args.stores))
+    if not paths:
+        print("❌ No stored detections found")
+        sys.exit(1)
+
+    print(f"📁 {len(paths)} stored analyses")
+    print(f"⚙️  New thresholds: {', '.join(f'{k}={v}' for k, v in thresholds.items() if v is not None) or 'none'}\n")
+
+    analyzers = {}
+    results = []
+    started = time.perf_counter()
+    for path in paths:
+        with open(os.path.join(path, 'meta.json')) as f:
+            name = json.load(f)['analyzer']
+        if name not in analyzers:
+            analyzers[name] = load_consolidator(name)
+        before = reconsolidate(path, analyzer=analyzers[name])
+        after = reconsolidate(path, thresholds, analyzer=analyzers[name])
+        results.append({'store': path, 'before': before, 'after': after})
+    elapsed = time.perf_counter() - started
+
+    changed = [r for r in results if r['before']['incident_type'] != r['after']['incident_type']]
+    for r in changed:
+        print(f"🔄 {os.path.basename(r['store'])}: {r['before']['incident_type']} → {r['after']['incident_type']} "
+              f"(confidence {r['after']['confidence']:.2f})")
+
+    counts = Counter(r['after']['incident_type'] for r in results)
+    print(f"\n{'='*60}")
+    print(f"✅ Re-scored {len(results)} analyses in {elapsed:.2f}s "
+          f"({elapsed / len(results) * 1000:.1f}ms each), {len(changed)} changed")
+    print("📊 " + ', '.join(f"{kind}: {count}" for kind, count in counts.most_common()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'thresholds': thresholds, 'results': results}, f, indent=2, default=float)
+        print(f"💾 Results: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Request Profiler - Opt-in sampling profiles of single analyses
+Samples the Python stacks of the threads working on one request and
+stores them in the folded format read by flamegraph.pl, speedscope and
+inferno
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from stage_timing import StageTimer
+
+load_dotenv()
+
+# Configuration
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')  # required in X-Profile when set
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 300))  # sampling stops after this
+PROFILE_DIR = os.getenv('PROFILE_DIR', './profiles')
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', 20))  # newest profiles kept on disk
+MAX_STACK_DEPTH = 64
+
+
+class StackSampler:
+    """
+    Samples the stacks of registered threads at a fixed interval.
+
+    Threads are registered with a label while they work for the profiled
+    request (the analysis thread for its whole run, inference workers only
+    inside a stage), so work for other requests on shared workers is not
+    sampled. Labels become the root frames of every sampled stack.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = max(0.001, interval_ms / 1000)
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.started: Optional[float] = None
+        self.duration = 0.0
+
+        self._threads: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.monotonic() - self.started if self.started else 0.0
+
+    def enter(self, label: str):
+        """Sample the calling thread under label until the matching exit()"""
+        thread_id = threading.get_ident()
+        with self._lock:
+            labels = self._threads.setdefault(thread_id, [])
+            if not labels and label != 'analysis':
+                # Shared worker threads are told apart by name
+                labels.append(threading.current_thread().name)
+            labels.append(label)
+
+    def exit(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            labels = self._threads.get(thread_id)
+            if labels:
+                labels.pop()
+                if len(labels) <= 1 and labels and labels[0] != 'analysis':
+                    labels.clear()
+                if not labels:
+                    del self._threads[thread_id]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if time.monotonic() - self.started > self.max_seconds:
+                break
+            with self._lock:
+                threads = {tid: list(labels) for tid, labels in self._threads.items()}
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread_id, labels in threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(labels + stack[::-1])] += 1
+                self.sample_count += 1
+
+    def folded(self) -> str:
+        """One 'frame;frame;frame count' line per distinct stack"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class _ProfiledStage:
+    """A StageTimer stage that also registers the thread with the sampler"""
+
+    __slots__ = ('stage', 'sampler', 'name')
+
+    def __init__(self, stage, sampler: StackSampler, name: str):
+        self.stage = stage
+        self.sampler = sampler
+        self.name = name
+
+    def __enter__(self):
+        self.sampler.enter(self.name)
+        self.stage.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stage.__exit__(exc_type, exc, tb)
+        self.sampler.exit()
+        return False
+
+
+class ProfilingTimer(StageTimer):
+    """
+    StageTimer of a profiled request.
+
+    The timer already travels with the request onto the inference workers,
+    so its stages decide which threads are sampled and label the samples.
+    """
+
+    def __init__(self, sampler: StackSampler):
+        super().__init__()
+        self.sampler = sampler
+        self.profile: Optional[Dict] = None  # summary once saved
+
+    def stage(self, name: str) -> _ProfiledStage:
+        return _ProfiledStage(super().stage(name), self.sampler, name)
+
+    def profiled(self, fn):
+        """Wrap fn so the thread running it is sampled for its whole call"""
+        def run(*args, **kwargs):
+            self.sampler.enter('analysis')
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.sampler.exit()
+        return run
+
+
+class ProfileStore:
+    """
+    Decides which requests are profiled and keeps their profiles on disk.
+
+    A request is profiled when it carries a valid X-Profile header, or when
+    an admin has armed profiling for the next analyses.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, enabled: bool = PROFILING_ENABLED,
+                 token: str = PROFILING_TOKEN, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.enabled = enabled
+        self.token = token
+        self.keep = max(1, keep)
+        self._armed = 0
+        self._lock = threading.Lock()
+
+    def authorized(self, header: Optional[str]) -> bool:
+        """True if profiling is enabled and the header carries the token (any value without one)"""
+        if not self.enabled or not header:
+            return False
+        return not self.token or header == self.token
+
+    def arm(self, count: int) -> int:
+        """Profile the next count analyses; returns how many are armed"""
+        with self._lock:
+            self._armed = max(0, count)
+            return self._armed
+
+    def start(self, header: Optional[str] = None) -> Optional[ProfilingTimer]:
+        """ProfilingTimer with a running sampler if this request is profiled, else None"""
+        if not self.enabled:
+            return None
+        if not self.authorized(header):
+            with self._lock:
+                if self._armed <= 0:
+                    return None
+                self._armed -= 1
+        sampler = StackSampler()
+        sampler.start()
+        return ProfilingTimer(sampler)
+
+    def save(self, name: str, timer: ProfilingTimer) -> Dict:
+        """Stop sampling and write the folded profile once; returns its summary"""
+        if timer.profile is not None:
+            return timer.profile
+        sampler = timer.sampler
+        sampler.stop()
+        os.makedirs(self.directory, exist_ok=True)
+
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^A-Za-z0-9_.-]', '_', name)[:60]}"
+        with open(os.path.join(self.directory, f"{profile_id}.folded"), 'w') as f:
+            f.write(sampler.folded())
+        self._prune()
+
+        timer.profile = {
+            'id': profile_id,
+            'samples': sampler.sample_count,
+            'interval_ms': round(sampler.interval * 1000, 1),
+            'duration': round(sampler.duration, 2),
+        }
+        return timer.profile
+
+    def list(self) -> List[Dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for filename in sorted(os.listdir(self.directory), reverse=True):
+            if filename.endswith('.folded'):
+                path = os.path.join(self.directory, filename)
+                profiles.append({'id': filename[:-len('.folded')], 'bytes': os.path.getsize(path)})
+        return profiles
+
+    def read(self, profile_id: str) -> Optional[str]:
+        """Folded stacks of a stored profile, None if unknown"""
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+', profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return f.read()
+
+    def get_stats(self) -> Dict:
+        return {'enabled': self.enabled, 'armed': self._armed, 'stored': len(self.list())}
+
+    def _prune(self):
+        for stale in self.list()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, f"{stale['id']}.folded"))
+            except OSError:
+                pass
@@ -9,17 +9,26 @@ from PIL import Image, ImageEnhance
 import random
 
 
-def preprocess_screen_capture(frame):
+# Preprocessing tiers, most to least expensive. 'fast' skips the
+# non-local-means denoising, which dominates the cost of 'full'.
+PREPROCESSING_TIERS = ('full', 'fast', 'none')
+
+
+def preprocess_screen_capture(frame, tier='full'):
     """
     Preprocess screen-captured frames before YOLO detection.
     Enhances image quality by removing screen artifacts and improving contrast.
     
     Args:
         frame: OpenCV image (numpy array)
+        tier: 'full', 'fast' (no denoising) or 'none' (unchanged frame)
         
     Returns:
         Preprocessed OpenCV image
     """
+    if tier == 'none':
+        return frame
+    
     # 1. Enhance contrast using CLAHE (Contrast Limited Adaptive Histogram Equalization)
     lab = cv2.cvtColor(frame, cv2.COLOR_BGR2LAB)
     l, a, b = cv2.split(lab)
@@ -29,7 +38,10 @@ def preprocess_screen_capture(frame):
     enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
     
     # 2. Reduce noise (from screen and camera sensor)
-    denoised = cv2.fastNlMeansDenoisingColored(enhanced, None, 10, 10, 7, 21)
+    if tier == 'full':
+        denoised = cv2.fastNlMeansDenoisingColored(enhanced, None, 10, 10, 7, 21)
+    else:
+        denoised = enhanced
     
     # 3. Sharpen image to compensate for screen blur
     kernel = np.array([[-1, -1, -1],
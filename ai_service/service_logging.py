@@ -0,0 +1,233 @@
+"""
+Service Logging - Structured, sampled, non-blocking logging
+Request, frame-loop and notification threads only put records on a queue;
+a listener thread formats them (text or JSON) and writes them to stdout
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text | json
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))  # records beyond this are dropped
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 10))  # records per event and window
+LOG_SAMPLE_WINDOW = float(os.getenv('LOG_SAMPLE_WINDOW', 10))  # seconds
+
+# Events logged once per request, which must never be suppressed
+UNSAMPLED_EVENTS = ('analysis_complete',)
+
+# Request and camera of the code currently running (copied into threadpool calls)
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+camera_id_var: ContextVar[Optional[str]] = ContextVar('camera_id', default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+@contextmanager
+def log_context(request_id: Optional[str] = None, camera_id: Optional[str] = None):
+    """Tag every record logged inside the block with the request and/or camera"""
+    tokens = []
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    if camera_id is not None:
+        tokens.append((camera_id_var, camera_id_var.set(camera_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+async def tag_request(request, call_next):
+    """
+    HTTP middleware: run the request under its X-Request-ID (generated if
+    absent) and echo the id in the response.
+
+    Register with app.middleware("http")(tag_request).
+    """
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex[:12]
+    with log_context(request_id=request_id):
+        response = await call_next(request)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    """Context and extra= fields of a record"""
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RECORD_ATTRS and not key.startswith('_') and value is not None
+    }
+
+
+class ContextFilter(logging.Filter):
+    """Copies the request and camera ids onto records in the logging thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.camera_id = camera_id_var.get()
+        return True
+
+
+class EventSampler(logging.Filter):
+    """
+    Rate-limits records logged with extra={'event': ...}.
+
+    Each event name (per camera, for stream threads) passes `burst` records
+    per `window` seconds. The next record that passes carries how many were
+    suppressed in between, so a camera failing on every frame logs a few
+    lines, not one per frame. Records without an event, or with one of
+    UNSAMPLED_EVENTS, are never sampled.
+    """
+
+    def __init__(self, burst: int = LOG_SAMPLE_BURST, window: float = LOG_SAMPLE_WINDOW):
+        super().__init__()
+        self.burst = max(1, burst)
+        self.window = window
+        self.suppressed_total = 0
+        self._events: Dict[tuple, list] = {}  # (event, camera) -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'event', None)
+        if event is None or event in UNSAMPLED_EVENTS:
+            return True
+        key = (event, getattr(record, 'camera_id', None))
+        now = time.monotonic()
+        with self._lock:
+            state = self._events.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                state = self._events[key] = [now, 0, suppressed]
+            if state[1] >= self.burst:
+                state[2] += 1
+                self.suppressed_total += 1
+                return False
+            state[1] += 1
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here (args may not be thread-safe),
+        # but leave formatting to the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with context and extra fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += ' ' + ' '.join(
+                f"{key}={json.dumps(value, default=str) if isinstance(value, (dict, list)) else value}"
+                for key, value in fields.items()
+            )
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_sampler: Optional[EventSampler] = None
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> logging.Logger:
+    """
+    Route the root logger through the queue (idempotent).
+
+    Args:
+        level: Root log level (DEBUG enables the analyzers' per-frame records)
+        fmt: 'text' or 'json'
+
+    Returns:
+        The root logger
+    """
+    global _handler, _sampler, _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return root
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    _sampler = EventSampler()
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(ContextFilter())
+    _handler.addFilter(_sampler)
+    root.addHandler(_handler)
+
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return root
+
+
+def get_stats() -> Dict:
+    """Queue depth and records dropped or sampled away since startup"""
+    if _handler is None:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'queued': _handler.queue.qsize(),
+        'dropped': _handler.dropped,
+        'suppressed': _sampler.suppressed_total,
+    }
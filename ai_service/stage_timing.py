@@ -0,0 +1,159 @@
+"""
+Stage Timing - Per-stage timings of the analysis pipeline
+Breaks an analysis down into upload, probe, decode, preprocessing,
+inference, post-processing, consolidation and notification time, and
+aggregates them into histograms for the /metrics endpoint
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# Pipeline stages, in pipeline order
+STAGES = (
+    'upload_write', 'probe', 'open', 'decode', 'sampling', 'preprocess',
+    'model_wait', 'inference', 'postprocess', 'consolidation', 'notify',
+)
+
+# Histogram buckets in seconds (per-stage totals of a request, or one frame for streams)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRICS_PREFIX = 'trafficguard'
+
+
+class _Stage:
+    """Context manager adding the elapsed time of a block to a StageTimer"""
+
+    __slots__ = ('timer', 'name', 'started')
+
+    def __init__(self, timer: 'StageTimer', name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class StageTimer:
+    """
+    Accumulates wall time per pipeline stage for one analysis.
+
+    Stages are timed with time.perf_counter() and summed over the frames of
+    the analysis. The timer is handed from the request thread to the
+    inference worker and back, but is never written by two threads at once,
+    so it takes no lock.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def stage(self, name: str) -> _Stage:
+        """Time a block: with timer.stage('decode'): ..."""
+        return _Stage(self, name)
+
+    def add(self, name: str, seconds: float):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def total(self, *names: str) -> float:
+        """Summed seconds of the given stages"""
+        return sum(self.totals.get(name, 0.0) for name in names)
+
+    def breakdown(self) -> Dict:
+        """Per-stage milliseconds and call counts, in pipeline order"""
+        order = [s for s in STAGES if s in self.totals] + [s for s in self.totals if s not in STAGES]
+        return {
+            'measured_ms': round(sum(self.totals.values()) * 1000, 1),  # excludes queue waits
+            'stages': {
+                name: {'ms': round(self.totals[name] * 1000, 1), 'count': self.counts[name]}
+                for name in order
+            },
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class NullTimer(StageTimer):
+    """Timer that records nothing, for callers that do not collect timings"""
+
+    _stage = _NullStage()
+
+    def stage(self, name: str) -> _NullStage:
+        return self._stage
+
+    def add(self, name: str, seconds: float):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageMetrics:
+    """
+    Process-wide histograms of stage timings in the Prometheus text format.
+
+    Series are labelled by endpoint (analyze, quick, stream, webhook) and
+    stage. Rendering needs no client library.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # (endpoint, stage) -> [bucket counts..., sum, count]
+        self._histograms: Dict[Tuple[str, str], list] = {}
+
+    def observe(self, endpoint: str, stage: str, seconds: float):
+        """Add one observation to the (endpoint, stage) histogram"""
+        with self._lock:
+            histogram = self._histograms.get((endpoint, stage))
+            if histogram is None:
+                histogram = self._histograms[(endpoint, stage)] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def record(self, endpoint: str, timer: StageTimer, total: Optional[float] = None):
+        """Observe every stage of a finished analysis, plus its end-to-end time"""
+        for stage, seconds in list(timer.totals.items()):
+            self.observe(endpoint, stage, seconds)
+        if total is not None:
+            self.observe(endpoint, 'total', total)
+
+    def render(self) -> str:
+        """Histograms in the Prometheus text exposition format (version 0.0.4)"""
+        name = f'{METRICS_PREFIX}_stage_seconds'
+        lines = [
+            f'# HELP {name} Time spent per pipeline stage of an analysis',
+            f'# TYPE {name} histogram',
+        ]
+        with self._lock:
+            snapshot = {key: list(values) for key, values in self._histograms.items()}
+
+        for (endpoint, stage), histogram in sorted(snapshot.items()):
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            for bound, count in zip(self.buckets, histogram):
+                lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram[-2]:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the API, the analyzers' callers and the notification dispatcher
+metrics = StageMetrics()
@@ -0,0 +1,394 @@
+"""
+Stream Analyzer - Continuous incident detection on live camera streams
+Reads RTSP/HTTP camera URLs (e.g. IP Webcam http://<ip>/video) and pushes
+incident state changes to the backend webhook
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait
+from functools import partial
+from typing import Callable, Dict, Optional, Any
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from inference_scheduler import InferenceScheduler, ScheduledStream, STREAM_PRIORITY
+from stage_timing import StageTimer, metrics
+from service_logging import log_context
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+STREAM_ANALYSIS_FPS = float(os.getenv('STREAM_ANALYSIS_FPS', 2))
+STREAM_WINDOW_SECONDS = float(os.getenv('STREAM_WINDOW_SECONDS', 15))
+STREAM_CONFIRM_FRAMES = int(os.getenv('STREAM_CONFIRM_FRAMES', 3))
+STREAM_RECONNECT_MAX_DELAY = float(os.getenv('STREAM_RECONNECT_MAX_DELAY', 30))  # seconds
+MAX_STREAMS = int(os.getenv('MAX_STREAMS', 8))
+STREAM_ALLOW_LOCAL_FILES = os.getenv('STREAM_ALLOW_LOCAL_FILES', 'false').lower() == 'true'  # file replay, for testing
+
+# URL schemes accepted for camera streams; anything else (file:, concat:,
+# data:, ...) would let a caller make FFmpeg read arbitrary local sources
+STREAM_URL_SCHEMES = ('rtsp', 'rtsps', 'http', 'https')
+
+
+def validate_stream_url(url: str, allow_local_files: bool = STREAM_ALLOW_LOCAL_FILES) -> bool:
+    """
+    Check that a stream URL is a network camera URL.
+
+    Args:
+        url: URL given at registration
+        allow_local_files: Also accept paths of existing local files
+
+    Returns:
+        bool: True if the URL is a local file path (only when allowed)
+
+    Raises:
+        ValueError: If the URL is not an rtsp/http(s) URL with a host
+    """
+    parts = urlsplit(url)
+    if parts.scheme.lower() in STREAM_URL_SCHEMES:
+        if not parts.hostname:
+            raise ValueError(f"Stream URL has no host: {url}")
+        return False
+    if allow_local_files and not parts.scheme and os.path.isfile(url):
+        return True
+    raise ValueError(f"Stream URL must use one of: {', '.join(STREAM_URL_SCHEMES)}")
+
+
+class StreamReader:
+    """
+    Reconnecting frame reader with latest-frame-only semantics.
+
+    A dedicated thread reads the stream as fast as it delivers frames and
+    keeps only the newest one; frames the analyzer has not picked up before
+    the next arrives are dropped, so analysis never falls behind real time.
+    Local video files (with STREAM_ALLOW_LOCAL_FILES) are paced at their
+    native FPS and looped, which lets a file (or an ffmpeg-served copy of it)
+    stand in for a camera.
+    """
+
+    def __init__(self, url: str, reconnect_max_delay: float = STREAM_RECONNECT_MAX_DELAY):
+        self.url = url
+        self.reconnect_max_delay = reconnect_max_delay
+        self.is_file = validate_stream_url(url)
+
+        self._lock = threading.Lock()
+        self._frame: Optional[np.ndarray] = None
+        self._frame_seq = 0
+        self._consumed_seq = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stream-reader', daemon=True)
+
+        self.connected = False
+        self.source_fps = 0.0
+        self.stats = {
+            'frames_read': 0,
+            'frames_dropped': 0,
+            'reconnects': 0,
+            'last_frame_at': None,
+            'last_error': None,
+        }
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def latest(self) -> Optional[tuple]:
+        """
+        Take the newest frame if it has not been returned before.
+
+        Returns:
+            (sequence number, frame) or None if no new frame arrived
+        """
+        with self._lock:
+            if self._frame is None or self._frame_seq == self._consumed_seq:
+                return None
+            self._consumed_seq = self._frame_seq
+            return self._frame_seq, self._frame
+
+    def _run(self):
+        delay = 1.0
+        while not self._stop.is_set():
+            cap = cv2.VideoCapture(self.url)
+            if not cap.isOpened():
+                self.connected = False
+                self.stats['last_error'] = 'could not open stream'
+                self.stats['reconnects'] += 1
+                # Exponential backoff between reconnect attempts
+                self._stop.wait(delay)
+                delay = min(self.reconnect_max_delay, delay * 2)
+                continue
+
+            self.connected = True
+            self.stats['last_error'] = None
+            delay = 1.0
+            self.source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            frame_interval = 1.0 / self.source_fps if self.is_file and self.source_fps > 0 else 0.0
+
+            try:
+                while not self._stop.is_set():
+                    started = time.monotonic()
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        break
+
+                    with self._lock:
+                        if self._frame_seq != self._consumed_seq:
+                            self.stats['frames_dropped'] += 1
+                        self._frame = frame
+                        self._frame_seq += 1
+                    self.stats['frames_read'] += 1
+                    self.stats['last_frame_at'] = time.time()
+
+                    if frame_interval:
+                        # Simulate a live source when replaying a file
+                        self._stop.wait(max(0.0, frame_interval - (time.monotonic() - started)))
+            finally:
+                cap.release()
+
+            self.connected = False
+            if not self._stop.is_set():
+                if not self.is_file:
+                    self.stats['last_error'] = 'stream ended'
+                self.stats['reconnects'] += 1
+
+
+class CameraStream:
+    """
+    One registered camera: a reader plus an analysis thread.
+
+    Frames are submitted to the scheduler at the analysis rate without
+    waiting for earlier ones, so when inference falls behind the scheduler
+    replaces the oldest queued frame (and raises the sampling stride)
+    instead of the camera lagging. Results are taken in submission order.
+
+    Each analyzed frame is added to a sliding window that is consolidated
+    with the analyzer's video-level rules. The incident state is reported
+    only after it holds for STREAM_CONFIRM_FRAMES consecutive analyses.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        url: str,
+        analyzer,
+        scheduled: ScheduledStream,
+        on_state_change: Callable[[str, Dict[str, Any]], None],
+        analysis_fps: float = STREAM_ANALYSIS_FPS,
+        window_seconds: float = STREAM_WINDOW_SECONDS,
+        confirm_frames: int = STREAM_CONFIRM_FRAMES
+    ):
+        self.camera_id = camera_id
+        self.url = url
+        self.analyzer = analyzer
+        self.scheduled = scheduled
+        self.on_state_change = on_state_change
+        self.analysis_fps = analysis_fps
+        self.confirm_frames = max(1, confirm_frames)
+
+        self.reader = StreamReader(url)
+        self.window = deque(maxlen=max(3, int(window_seconds * analysis_fps)))
+
+        self.state = {'incident_detected': False, 'incident_type': 'none'}
+        self.latest_result: Optional[Dict[str, Any]] = None
+        self._candidate = None
+        self._candidate_count = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'stream-{camera_id}', daemon=True)
+        self.started_at = None
+        self.frames_analyzed = 0
+        # (frame sequence, future, timer) of submitted frames, oldest first
+        self._in_flight: deque = deque()
+
+    def start(self):
+        self.started_at = time.time()
+        self.reader.start()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.reader.stop()
+
+    def status(self) -> Dict[str, Any]:
+        """Reader health plus the current incident state"""
+        return {
+            'camera_id': self.camera_id,
+            'url': self.url,
+            'connected': self.reader.connected,
+            'analysis_fps': self.analysis_fps,
+            'frames_analyzed': self.frames_analyzed,
+            'reader': dict(self.reader.stats),
+            'scheduling': self.scheduled.status(),
+            'state': dict(self.state),
+            'latest_result': self.latest_result,
+            'started_at': self.started_at,
+        }
+
+    def _run(self):
+        with log_context(camera_id=self.camera_id):
+            self._loop()
+
+    def _loop(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_tick:
+                # The scheduler lowers the effective rate when inference is saturated
+                effective_fps = self.scheduled.effective_fps or self.analysis_fps
+                interval = 1.0 / effective_fps if effective_fps > 0 else 0.0
+                next_tick = now + max(0.01, interval)
+                latest = self.reader.latest()
+                if latest is not None:
+                    self._submit(*latest)
+
+            self._collect()
+            # Wake for the next frame, the oldest result or a stop, whichever comes first
+            timeout = min(0.5, max(0.0, next_tick - time.monotonic()))
+            if self._in_flight:
+                wait([self._in_flight[0][1]], timeout=timeout)
+            else:
+                self._stop.wait(timeout)
+
+    def _submit(self, frame_seq: int, frame: np.ndarray):
+        # Stream stage histograms are per analyzed frame
+        timer = StageTimer()
+        try:
+            future = self.scheduled.submit(partial(self.analyzer._analyze_frame, timer=timer), frame, frame_seq)
+        except RuntimeError:
+            return  # unregistered while stopping
+        self._in_flight.append((frame_seq, future, timer))
+
+    def _collect(self):
+        """Handle finished frames in submission order"""
+        while self._in_flight and self._in_flight[0][1].done():
+            frame_seq, future, timer = self._in_flight.popleft()
+            try:
+                self._analyze(frame_seq, self.scheduled.collect(future), timer)
+            except Exception as e:
+                logger.warning("❌ Stream %s analysis error: %s", self.camera_id, e,
+                               extra={'event': 'stream_analysis_error'})
+
+    def _analyze(self, frame_seq: int, analysis: Optional[Dict], timer: StageTimer):
+        """Add one frame's analysis (None if dropped or empty) to the window"""
+        if not analysis:
+            metrics.record('stream', timer)
+            return
+
+        self.window.append(analysis)
+        self.frames_analyzed += 1
+
+        with timer.stage('consolidation'):
+            result = self.analyzer._consolidate_results(
+                list(self.window), self.analysis_fps, len(self.window)
+            )
+        metrics.record('stream', timer)
+        result['camera_id'] = self.camera_id
+        result['window_frames'] = len(self.window)
+        self.latest_result = result
+
+        candidate = (result['incident_detected'], result['incident_type'])
+        if candidate == self._candidate:
+            self._candidate_count += 1
+        else:
+            self._candidate = candidate
+            self._candidate_count = 1
+
+        current = (self.state['incident_detected'], self.state['incident_type'])
+        if candidate != current and self._candidate_count >= self.confirm_frames:
+            previous = dict(self.state)
+            self.state = {'incident_detected': candidate[0], 'incident_type': candidate[1]}
+            result['state_change'] = {'from': previous, 'to': dict(self.state)}
+            logger.info("📡 Camera %s: %s → %s", self.camera_id, previous['incident_type'], candidate[1],
+                        extra={'event': 'stream_state_change'})
+            self.on_state_change(self.camera_id, result)
+
+
+class StreamAnalyzer:
+    """Registry of live camera streams sharing one analyzer"""
+
+    def __init__(self, analyzer, scheduler: InferenceScheduler,
+                 on_state_change: Callable[[str, Dict[str, Any]], None],
+                 max_streams: int = MAX_STREAMS):
+        self.analyzer = analyzer
+        self.scheduler = scheduler
+        self.on_state_change = on_state_change
+        self.max_streams = max_streams
+        self._streams: Dict[str, CameraStream] = {}
+        self._lock = threading.Lock()
+
+    def register(self, camera_id: str, url: str, analysis_fps: Optional[float] = None,
+                 priority: int = STREAM_PRIORITY) -> Dict[str, Any]:
+        """
+        Start analyzing a camera stream.
+
+        Args:
+            camera_id: Unique camera name
+            url: RTSP/HTTP stream URL, or a local file path with STREAM_ALLOW_LOCAL_FILES
+            analysis_fps: Target analysis rate (default STREAM_ANALYSIS_FPS)
+            priority: Fair-share weight on the inference workers
+
+        Raises:
+            ValueError: If the URL is not accepted, the camera is already
+                registered or the limit is reached
+        """
+        validate_stream_url(url)
+        with self._lock:
+            if camera_id in self._streams:
+                raise ValueError(f"Camera already registered: {camera_id}")
+            if len(self._streams) >= self.max_streams:
+                raise ValueError(f"Stream limit reached ({self.max_streams})")
+
+            analysis_fps = analysis_fps or STREAM_ANALYSIS_FPS
+            scheduled = self.scheduler.register(
+                f"camera-{camera_id}", priority=priority, target_fps=analysis_fps
+            )
+            stream = CameraStream(
+                camera_id, url, self.analyzer, scheduled, self.on_state_change,
+                analysis_fps=analysis_fps
+            )
+            self._streams[camera_id] = stream
+
+        stream.start()
+        logger.info("📡 Registered camera %s: %s", camera_id, url)
+        return stream.status()
+
+    def unregister(self, camera_id: str) -> bool:
+        """Stop and remove a camera stream"""
+        with self._lock:
+            stream = self._streams.pop(camera_id, None)
+        if stream is None:
+            return False
+        self.scheduler.unregister(stream.scheduled.stream_id)
+        stream.stop()
+        logger.info("📡 Unregistered camera %s", camera_id)
+        return True
+
+    def get(self, camera_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            stream = self._streams.get(camera_id)
+        return stream.status() if stream else None
+
+    def list(self) -> list:
+        with self._lock:
+            streams = list(self._streams.values())
+        return [s.status() for s in streams]
+
+    def stop_all(self):
+        """Stop every stream (used on shutdown)"""
+        with self._lock:
+            camera_ids = list(self._streams)
+        for camera_id in camera_ids:
+            self.unregister(camera_id)
@@ -0,0 +1,193 @@
+"""
+Tiled Inference - Detection on high-resolution frames without downscaling
+Splits a frame into overlapping tiles at the model's native input size,
+runs them as one batch and merges the detections across tiles
+"""
+
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+TILED_INFERENCE = os.getenv('TILED_INFERENCE', 'false').lower() == 'true'
+TILE_SIZE = int(os.getenv('TILE_SIZE', 640))
+TILE_OVERLAP = float(os.getenv('TILE_OVERLAP', 0.2))  # fraction of the tile size
+TILE_MIN_FRAME = int(os.getenv('TILE_MIN_FRAME', 1280))  # only tile frames at least this large
+TILE_NMS_IOU = float(os.getenv('TILE_NMS_IOU', 0.5))
+TILE_MERGE_IOS = 0.7  # intersection over the smaller box, for vehicles cut by a tile edge
+TILE_MOTION_SKIP = os.getenv('TILE_MOTION_SKIP', 'true').lower() == 'true'
+TILE_MOTION_REFRESH = int(os.getenv('TILE_MOTION_REFRESH', 5))  # frames between full passes
+TILE_MOTION_THRESHOLD = 25  # grey-level change counted as motion
+TILE_MIN_MOTION = 0.002  # fraction of a tile's pixels that must change
+MOTION_SCALE = 8  # motion is computed on a 1/8 scale grey frame
+
+# (class id, confidence, [x1, y1, x2, y2])
+Detection = Tuple[int, float, List[float]]
+
+
+def tile_grid(width: int, height: int, tile_size: int = TILE_SIZE,
+              overlap: float = TILE_OVERLAP) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping tiles covering the frame, as (x1, y1, x2, y2).
+
+    The last row and column are shifted back to end on the frame edge, so
+    every tile has full size when the frame is at least one tile large.
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(width, x + tile_size), min(height, y + tile_size))
+        for y in starts(height) for x in starts(width)
+    ]
+
+
+def merge_detections(detections: List[Detection], iou: float = TILE_NMS_IOU,
+                     ios: float = TILE_MERGE_IOS) -> List[Detection]:
+    """
+    Class-agnostic NMS across tiles.
+
+    Besides the usual IoU test, a box mostly contained in a higher-scoring
+    one is suppressed: a vehicle cut by a tile edge leaves a partial box
+    whose IoU with the full box is low.
+    """
+    if not detections:
+        return []
+
+    boxes = np.array([d[2] for d in detections], dtype=np.float32)
+    scores = np.array([d[1] for d in detections], dtype=np.float32)
+    areas = (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        x1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        y1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        x2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        y2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+        union = areas[best] + areas[rest] - inter
+        smaller = np.minimum(areas[best], areas[rest])
+        overlap_iou = inter / np.maximum(union, 1e-6)
+        overlap_ios = inter / np.maximum(smaller, 1e-6)
+        order = rest[(overlap_iou <= iou) & (overlap_ios <= ios)]
+
+    return [detections[i] for i in keep]
+
+
+class TiledDetector:
+    """
+    Per-video tiled detection state.
+
+    Tiles with no road (no pixel of the ROI mask) are dropped up front.
+    With motion skipping, a tile is only re-run when its content changed
+    since the previous frame; otherwise its last detections are reused.
+    Every TILE_MOTION_REFRESH frames all tiles run, so vehicles that have
+    stopped (the accident signal) are still re-detected.
+
+    With classes or min_confidence, other detections are dropped before
+    the cross-tile merge, so a stronger box of an unwanted class (a person,
+    a sign) cannot suppress an overlapping wanted one.
+    """
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        tile_size: int = TILE_SIZE,
+        overlap: float = TILE_OVERLAP,
+        mask: Optional[np.ndarray] = None,
+        motion_skip: bool = TILE_MOTION_SKIP,
+        refresh_every: int = TILE_MOTION_REFRESH,
+        classes: Optional[Sequence[int]] = None,
+        min_confidence: float = 0.0
+    ):
+        self.tile_size = tile_size
+        self.classes = set(classes) if classes is not None else None
+        self.min_confidence = min_confidence
+        tiles = tile_grid(width, height, tile_size, overlap)
+        if mask is not None:
+            tiles_with_road = [t for t in tiles if mask[t[1]:t[3], t[0]:t[2]].any()]
+        else:
+            tiles_with_road = tiles
+        self.tiles = tiles_with_road
+        self.motion_skip = motion_skip
+        self.refresh_every = max(1, refresh_every)
+
+        self._cache: Dict[int, List[Detection]] = {}
+        self._previous: Optional[np.ndarray] = None
+        self._frames = 0
+        self.stats = {
+            'tiles': len(self.tiles),
+            'tiles_without_road': len(tiles) - len(self.tiles),
+            'tiles_run': 0,
+            'tiles_skipped_no_motion': 0,
+        }
+
+    def detect(self, frame: np.ndarray, predict: Callable[[List[np.ndarray]], list]) -> List[Detection]:
+        """
+        Detect on all tiles of a frame.
+
+        Args:
+            frame: Full frame (or ROI crop) the grid was built for
+            predict: Runs the model on a list of tile images, returning one
+                ultralytics Results per tile
+
+        Returns:
+            merged detections in frame coordinates
+        """
+        active = self._active_tiles(frame)
+        self.stats['tiles_run'] += len(active)
+        self.stats['tiles_skipped_no_motion'] += len(self.tiles) - len(active)
+
+        if active:
+            results = predict([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in (self.tiles[i] for i in active)])
+            for i, result in zip(active, results):
+                ox, oy = self.tiles[i][:2]
+                detections = []
+                for box in result.boxes:
+                    cls, conf = int(box.cls[0]), float(box.conf[0])
+                    if conf < self.min_confidence or (self.classes is not None and cls not in self.classes):
+                        continue
+                    x1, y1, x2, y2 = box.xyxy[0].tolist()
+                    detections.append((cls, conf, [x1 + ox, y1 + oy, x2 + ox, y2 + oy]))
+                self._cache[i] = detections
+
+        return merge_detections([d for i in range(len(self.tiles)) for d in self._cache.get(i, [])])
+
+    def _active_tiles(self, frame: np.ndarray) -> List[int]:
+        self._frames += 1
+        everything = list(range(len(self.tiles)))
+        if not self.motion_skip:
+            return everything
+
+        grey = cv2.cvtColor(
+            cv2.resize(frame, None, fx=1 / MOTION_SCALE, fy=1 / MOTION_SCALE, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        previous, self._previous = self._previous, grey
+        if previous is None or previous.shape != grey.shape or self._frames % self.refresh_every == 0:
+            return everything
+
+        moving = cv2.absdiff(grey, previous) > TILE_MOTION_THRESHOLD
+        active = []
+        for i, (x1, y1, x2, y2) in enumerate(self.tiles):
+            cell = moving[y1 // MOTION_SCALE:max(y1 // MOTION_SCALE + 1, y2 // MOTION_SCALE),
+                          x1 // MOTION_SCALE:max(x1 // MOTION_SCALE + 1, x2 // MOTION_SCALE)]
+            if i not in self._cache or cell.mean() >= TILE_MIN_MOTION:
+                active.append(i)
+        return active
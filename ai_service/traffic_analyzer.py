@@ -1,23 +1,48 @@
 import cv2
+import functools
 import numpy as np
 from ultralytics import YOLO
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Tuple, Optional
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from progressive_results import ProvisionalEmitter, clearly_irrelevant
+from analysis_region import RegionOfInterest, frame_window, seek
+from tiled_inference import TiledDetector, TILED_INFERENCE, TILE_MIN_FRAME
+from adaptive_sampling import AdaptiveSampler, ADAPTIVE_SAMPLING
+from stage_timing import StageTimer, NULL_TIMER
+from memory_budget import FrameLog
+from detection_store import DetectionRecorder, DETECTION_STORE
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class TrafficAnalyzer:
     """Traffic analysis using YOLOv8 for incident detection"""
     
-    def __init__(self):
-        model_path = os.getenv('MODEL_PATH', './models/yolov8n.pt')
-        self.model = YOLO(model_path)
+    def __init__(self, load_model: bool = True):
+        """
+        Args:
+            load_model: Set False for consolidation-only use (e.g. re-scoring
+                cached detections) to skip loading YOLO
+        """
+        self.model_path = os.getenv('MODEL_PATH', './models/yolov8n.pt')
+        self.model = YOLO(self.model_path) if load_model else None
+        # YOLO predictors are not thread-safe; serialize calls across inference workers
+        self._model_lock = threading.Lock()
         
         # Detection parameters
         self.frame_skip = int(os.getenv('FRAME_SKIP', 5))
         self.input_size = int(os.getenv('INPUT_RESOLUTION', 640))
         self.min_confidence = float(os.getenv('MIN_CONFIDENCE', 0.5))
+        self.tiled_inference = TILED_INFERENCE  # tile large frames instead of downscaling
+        self.adaptive_sampling = ADAPTIVE_SAMPLING  # vary the frame skip with scene activity
+        self.store_detections = DETECTION_STORE  # keep per-frame detections for re-consolidation
         
         # Incident thresholds
         self.congestion_vehicle_threshold = int(os.getenv('CONGESTION_VEHICLE_THRESHOLD', 12))
@@ -27,17 +52,37 @@ class TrafficAnalyzer:
         # Vehicle classes in COCO dataset
         self.vehicle_classes = [2, 3, 5, 7]  # car, motorcycle, bus, truck
     
-    def analyze_video(self, video_path: str) -> Dict:
+    def analyze_video(self, video_path: str, scheduler_job=None, quality: Optional[Dict] = None,
+                      deadline: Optional[float] = None,
+                      on_provisional: Optional[Callable[[Dict], None]] = None,
+                      start_time: Optional[float] = None, end_time: Optional[float] = None,
+                      roi: Optional[List[List[float]]] = None,
+                      timer: Optional[StageTimer] = None) -> Dict:
         """
         Analyze traffic video for incidents
         
         Args:
             video_path: Path to video file
+            scheduler_job: Optional ScheduledStream that runs frame inference
+                on the shared workers and may widen the sampling stride
+            quality: Optional QualityController settings snapshot
+            deadline: Optional time.monotonic() value; analysis stops there
+                and returns the partial result
+            on_provisional: Optional callback receiving a provisional result
+                as soon as an incident is strongly confirmed
+            start_time: Optional window start in seconds (seeked to)
+            end_time: Optional window end in seconds
+            roi: Optional polygon [[x, y], ...] in pixels or frame fractions;
+                inference runs on its crop only
+            timer: Optional StageTimer collecting per-stage timings
+                (a fresh one is used otherwise)
             
         Returns:
-            dict with analysis results
+            dict with analysis results, including the per-stage breakdown
         """
-        cap = cv2.VideoCapture(video_path)
+        timer = timer or StageTimer()
+        with timer.stage('open'):
+            cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Could not open video file: {video_path}")
@@ -50,15 +95,41 @@ class TrafficAnalyzer:
             cap.release()
             raise ValueError(f"Invalid video file: {video_path} (frames={total_frames}, fps={fps})")
         
-        print(f"🎥 Video info: {total_frames} frames @ {fps} FPS")
+        logger.info("🎥 Video info: %d frames @ %s FPS", total_frames, fps)
         
-        frame_count = 0
-        vehicle_detections = []
-        frame_analyses = []
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        try:
+            start_frame, end_frame = frame_window(total_frames, fps, start_time, end_time)
+            region = RegionOfInterest(roi, width, height) if roi else None
+        except ValueError:
+            cap.release()
+            raise
+        window_frames = end_frame - start_frame
+        tiler = self._make_tiler(width, height, region)
+        
+        # Frames before the window are never returned by the decoder
+        with timer.stage('open'):
+            seek(cap, start_frame)
+        
+        settings = self._quality_settings(self.frame_skip, quality)
+        sampler = AdaptiveSampler(settings['frame_skip'], fps, start_frame) if self.adaptive_sampling else None
+        # Adaptive gaps vary between samples; movement is scaled back to the base stride
+        nominal_gap = settings['frame_skip'] if sampler else None
+        emitter = ProvisionalEmitter(
+            functools.partial(self._consolidate_results, nominal_gap=nominal_gap), on_provisional, fps, window_frames
+        ) if on_provisional else None
+        frame_count = start_frame
+        next_sample = start_frame
+        # Per-frame analyses stay within MEMORY_BUDGET_MB however long the video
+        frame_analyses = FrameLog()
+        recorder = DetectionRecorder() if self.store_detections else None
+        partial = False
         
         try:
-            while cap.isOpened():
-                ret, frame = cap.read()
+            while cap.isOpened() and frame_count < end_frame:
+                with timer.stage('decode'):
+                    ret, frame = cap.read()
                 if not ret:
                     break
                 
@@ -66,36 +137,83 @@ class TrafficAnalyzer:
                 if frame is None or frame.size == 0:
                     continue
                 
-                # Process every nth frame for efficiency
-                if frame_count % self.frame_skip == 0:
-                    analysis = self._analyze_frame(frame, frame_count)
+                # Process every nth frame for efficiency (or as scene activity requires)
+                if sampler:
+                    with timer.stage('sampling'):
+                        due = sampler.due(frame, frame_count)
+                else:
+                    due = frame_count >= next_sample
+                if due:
+                    if self._past_deadline(deadline, frame_analyses):
+                        partial = True
+                        break
+                    analysis = self._run_frame(
+                        scheduler_job, frame, frame_count, settings['imgsz'], region, tiler, timer
+                    )
                     if analysis:
                         frame_analyses.append(analysis)
-                        vehicle_detections.append(analysis['vehicle_count'])
+                        if recorder:
+                            recorder.add(analysis)
+                        if emitter:
+                            with timer.stage('consolidation'):
+                                emitter.update(analysis, frame_count + 1 - start_frame)
+                    if sampler:
+                        sampler.advance(frame_count, analysis['vehicle_count'] if analysis else None,
+                                        scheduler_job.stride if scheduler_job else 1)
+                    else:
+                        next_sample = frame_count + self._sample_stride(settings['frame_skip'], scheduler_job)
                 
                 frame_count += 1
         finally:
             cap.release()
         
-        if frame_count == 0:
+        if frame_count == start_frame:
             raise ValueError(f"No frames could be read from video: {video_path}")
         
         # Consolidate results
-        result = self._consolidate_results(frame_analyses, fps, total_frames)
-        result['frames_processed'] = frame_count
+        with timer.stage('consolidation'):
+            result = self._consolidate_results(frame_analyses, fps, window_frames, nominal_gap)
+        result['memory'] = frame_analyses.report()
+        frame_analyses.close()
+        if recorder:
+            result['detection_store'] = self._save_detections(
+                recorder, video_path, fps, start_frame, window_frames, settings, region, nominal_gap
+            )
+        result['frames_processed'] = frame_count - start_frame
+        result['quality'] = settings
+        if start_time is not None or end_time is not None:
+            result['time_range'] = {'start': start_frame / fps, 'end': end_frame / fps}
+        if region:
+            result['roi'] = region.describe()
+        if tiler:
+            result['tiling'] = dict(tiler.stats)
+        if sampler:
+            result['sampling'] = sampler.report()
+        if deadline is not None:
+            result.update(self._coverage(partial, frame_count - start_frame, window_frames))
+        if emitter:
+            result['provisional_emitted'] = emitter.emitted
+        result['timings'] = timer.breakdown()
         return result
     
-    def analyze_short_clip(self, video_path: str) -> Dict:
+    def analyze_short_clip(self, video_path: str, scheduler_job=None, quality: Optional[Dict] = None,
+                           deadline: Optional[float] = None, timer: Optional[StageTimer] = None) -> Dict:
         """
         Quick analysis optimized for 5-second clips from auto-capture
         
         Args:
             video_path: Path to short video file
+            scheduler_job: Optional ScheduledStream that runs frame inference
+            quality: Optional QualityController settings snapshot
+            deadline: Optional time.monotonic() value to stop analyzing at
+            timer: Optional StageTimer collecting per-stage timings
             
         Returns:
             dict with quick analysis results including has_relevant_data flag
         """
-        cap = cv2.VideoCapture(video_path)
+        timer = timer or StageTimer()
+        with timer.stage('open'):
+            cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             raise ValueError(f"Could not open video file: {video_path}")
@@ -107,17 +225,29 @@ class TrafficAnalyzer:
         frame_analyses = []
         
         # Process every 2nd frame for faster analysis
-        frame_skip = 2
+        settings = self._quality_settings(2, quality)
+        next_sample = 0
+        partial = False
+        early_exit = False
         
         while cap.isOpened():
-            ret, frame = cap.read()
+            with timer.stage('decode'):
+                ret, frame = cap.read()
             if not ret:
                 break
             
-            if frame_count % frame_skip == 0:
-                analysis = self._analyze_frame(frame, frame_count)
+            if frame_count >= next_sample:
+                if self._past_deadline(deadline, frame_analyses):
+                    partial = True
+                    break
+                analysis = self._run_frame(scheduler_job, frame, frame_count, settings['imgsz'], timer=timer)
                 if analysis:
                     frame_analyses.append(analysis)
+                # Stop once the first sampled frames show empty road
+                if clearly_irrelevant(frame_analyses):
+                    early_exit = True
+                    break
+                next_sample = frame_count + self._sample_stride(settings['frame_skip'], scheduler_job)
             
             frame_count += 1
         
@@ -127,17 +257,26 @@ class TrafficAnalyzer:
         has_relevant_data = self._has_relevant_traffic_data(frame_analyses)
         
         if not has_relevant_data:
-            return {
+            result = {
                 'incident_detected': False,
                 'has_relevant_data': False,
                 'incident_type': 'none',
                 'confidence': 0.0,
                 'vehicle_count': 0,
+                'frames_analyzed': len(frame_analyses),
+                'quality': settings,
             }
-        
-        # Full analysis if relevant data found
-        result = self._consolidate_results(frame_analyses, fps, total_frames)
-        result['has_relevant_data'] = True
+        else:
+            # Full analysis if relevant data found
+            with timer.stage('consolidation'):
+                result = self._consolidate_results(frame_analyses, fps, total_frames)
+            result['has_relevant_data'] = True
+            result['quality'] = settings
+        
+        result['early_exit'] = early_exit
+        if deadline is not None:
+            result.update(self._coverage(partial, frame_count, total_frames))
+        result['timings'] = timer.breakdown()
         
         return result
     
@@ -164,25 +303,142 @@ class TrafficAnalyzer:
         # - OR max vehicles >= 5 (peak traffic moment)
         return avg_vehicles >= 3 or max_vehicles >= 5
     
-    def _analyze_frame(self, frame: np.ndarray, frame_id: int) -> Dict:
-        """Analyze a single frame"""
-        # Run YOLOv8 detection
-        results = self.model(frame, imgsz=self.input_size, verbose=False)
-        
-        if not results or len(results) == 0:
+    def _run_frame(self, scheduler_job, frame: np.ndarray, frame_id: int, imgsz: Optional[int] = None,
+                   region: Optional[RegionOfInterest] = None, tiler: Optional[TiledDetector] = None,
+                   timer: Optional[StageTimer] = None) -> Dict:
+        """Analyze a frame directly or through the inference scheduler"""
+        if scheduler_job is None:
+            return self._analyze_frame(frame, frame_id, imgsz, region, tiler, timer)
+        return scheduler_job.run(self._analyze_frame, frame, frame_id, imgsz, region, tiler, timer)
+    
+    def _make_tiler(self, width: int, height: int,
+                    region: Optional[RegionOfInterest] = None) -> Optional[TiledDetector]:
+        """Tiled detector for one video, if tiling is on and the analyzed area is large"""
+        if region is not None:
+            width, height = region.w, region.h
+        if not self.tiled_inference or max(width, height) < TILE_MIN_FRAME:
             return None
+        mask = region.mask if region is not None and not region.is_rectangle else None
+        # Only vehicles above the confidence threshold take part in the cross-tile merge
+        return TiledDetector(width, height, mask=mask, classes=self.vehicle_classes,
+                             min_confidence=self.min_confidence)
+    
+    def _past_deadline(self, deadline: Optional[float], frame_analyses: List[Dict]) -> bool:
+        """True once the deadline has passed (always analyze at least one frame)"""
+        return deadline is not None and bool(frame_analyses) and time.monotonic() >= deadline
+    
+    def _coverage(self, partial: bool, frames_read: int, total_frames: int) -> Dict:
+        """How much of the video a deadline-bounded analysis covered"""
+        return {
+            'partial': partial,
+            'coverage': round(min(1.0, frames_read / total_frames), 3) if total_frames > 0 else 1.0,
+        }
+    
+    def _quality_settings(self, frame_skip: int, quality: Optional[Dict] = None) -> Dict:
+        """Resolve a quality snapshot into the settings this analysis uses"""
+        quality = quality or {}
+        return {
+            'level': quality.get('level', 0),
+            'reason': quality.get('reason'),
+            'frame_skip': frame_skip * quality.get('frame_skip_factor', 1),
+            'imgsz': min(self.input_size, quality.get('imgsz', self.input_size)),
+        }
+    
+    def _save_detections(self, recorder: DetectionRecorder, video_path: str, fps: float, start_frame: int,
+                         window_frames: int, settings: Dict, region: Optional[RegionOfInterest],
+                         nominal_gap: Optional[int]) -> Optional[str]:
+        """Store the recorded detections with what re-consolidation needs (None if writing fails)"""
+        meta = {
+            'analyzer': type(self).__name__,
+            'model': self.model_path,
+            'fps': fps,
+            'start_frame': start_frame,
+            'total_frames': window_frames,
+            'frame_skip': self.frame_skip,
+            'nominal_gap': nominal_gap,
+            'imgsz': settings['imgsz'],
+            'roi': region.describe() if region else None,
+            'min_confidence': self.min_confidence,
+            'congestion_vehicle_threshold': self.congestion_vehicle_threshold,
+            'congestion_speed_threshold': self.congestion_speed_threshold,
+            'accident_stationary_threshold': self.accident_stationary_threshold,
+        }
+        try:
+            return recorder.save(video_path, meta)
+        except OSError as e:
+            logger.warning("⚠️ Detections not stored: %s", e)
+            return None
+    
+    def _sample_stride(self, frame_skip: int, scheduler_job=None) -> int:
+        """Frames to advance before the next analyzed frame"""
+        if scheduler_job is None:
+            return frame_skip
+        return frame_skip * scheduler_job.stride
+    
+    def _analyze_frame(self, frame: np.ndarray, frame_id: int, imgsz: Optional[int] = None,
+                       region: Optional[RegionOfInterest] = None,
+                       tiler: Optional[TiledDetector] = None,
+                       timer: Optional[StageTimer] = None) -> Dict:
+        """
+        Analyze a single frame (imgsz overrides INPUT_RESOLUTION)
+        
+        With a region, only its crop is analyzed and boxes are returned in
+        full-frame coordinates. With a tiler, the frame is detected tile by
+        tile at imgsz instead of being downscaled as a whole (tile splitting
+        and merging count as inference time). Waiting for the model lock is
+        timed as model_wait, not inference.
+        """
+        timer = timer or NULL_TIMER
+        if region is not None:
+            with timer.stage('preprocess'):
+                frame = region.crop(frame)
+        imgsz = imgsz or self.input_size
+        
+        if tiler is not None:
+            def predict(tiles):
+                return self.model(tiles, imgsz=imgsz, verbose=False)
+            with self._locked_model(timer), timer.stage('inference'):
+                detections = tiler.detect(frame, predict)
+        else:
+            # Run YOLOv8 detection
+            with self._locked_model(timer), timer.stage('inference'):
+                results = self.model(frame, imgsz=imgsz, verbose=False)
+            
+            if not results or len(results) == 0:
+                return None
+            detections = results[0].boxes
         
-        # Extract detections
-        detections = results[0].boxes
+        with timer.stage('postprocess'):
+            return self._frame_result(frame_id, detections, region)
+    
+    @contextmanager
+    def _locked_model(self, timer: StageTimer):
+        """Hold the model lock, timing the wait for it as the model_wait stage"""
+        with timer.stage('model_wait'):
+            self._model_lock.acquire()
+        try:
+            yield
+        finally:
+            self._model_lock.release()
+    
+    def _frame_result(self, frame_id: int, detections, region: Optional[RegionOfInterest]) -> Dict:
+        """
+        Vehicle-only frame analysis from ultralytics boxes or from merged
+        tile detections given as (class, confidence, bbox) tuples
+        """
+        if not isinstance(detections, list):
+            detections = [
+                (int(box.cls[0]), float(box.conf[0]), box.xyxy[0].tolist()) for box in detections
+            ]
         
         # Filter for vehicles only
         vehicles = []
-        for i, box in enumerate(detections):
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            
+        for cls, conf, (x1, y1, x2, y2) in detections:
             if cls in self.vehicle_classes and conf >= self.min_confidence:
-                x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                if region is not None:
+                    x1, y1, x2, y2 = region.to_frame([x1, y1, x2, y2])
+                    if not region.contains((x1 + x2) / 2, (y1 + y2) / 2):
+                        continue
                 vehicles.append({
                     'class': cls,
                     'confidence': conf,
@@ -196,8 +452,14 @@ class TrafficAnalyzer:
             'vehicles': vehicles,
         }
     
-    def _consolidate_results(self, frame_analyses: List[Dict], fps: float, total_frames: int) -> Dict:
-        """Consolidate frame-level analyses into video-level results"""
+    def _consolidate_results(self, frame_analyses: List[Dict], fps: float, total_frames: int,
+                             nominal_gap: Optional[int] = None) -> Dict:
+        """
+        Consolidate frame-level analyses into video-level results
+        
+        nominal_gap is the base sampling stride when frames were sampled at
+        varying gaps (adaptive sampling); see _estimate_speed.
+        """
         
         if not frame_analyses:
             return {
@@ -215,7 +477,7 @@ class TrafficAnalyzer:
         max_vehicle_count = np.max(vehicle_counts)
         
         # Estimate traffic speed (simplified)
-        avg_speed = self._estimate_speed(frame_analyses)
+        avg_speed = self._estimate_speed(frame_analyses, nominal_gap)
         
         # Detect incidents
         incident_type = 'none'
@@ -249,10 +511,14 @@ class TrafficAnalyzer:
             'total_frames': total_frames,
         }
     
-    def _estimate_speed(self, frame_analyses: List[Dict]) -> float:
+    def _estimate_speed(self, frame_analyses: List[Dict], nominal_gap: Optional[int] = None) -> float:
         """
         Estimate average traffic speed (simplified)
         Based on vehicle movement between frames
+        
+        With a nominal_gap, each movement is scaled from its actual frame
+        gap to that stride. Without one, frames are taken to be evenly
+        sampled and movements are used as measured.
         """
         if len(frame_analyses) < 2:
             return 10.0  # Default speed
@@ -271,6 +537,9 @@ class TrafficAnalyzer:
                     next_frame['vehicles']
                 )
                 if movement > 0:
+                    if nominal_gap:
+                        gap = max(1, next_frame['frame_id'] - current_frame['frame_id'])
+                        movement = movement * nominal_gap / gap
                     movements.append(movement)
         
         if not movements:
@@ -2,21 +2,26 @@ import os
 import cv2
 import numpy as np
 
-def load_video_dataset(video_path):
+def load_video_dataset(video_path, max_frames=None):
+    # Frames are yielded one at a time so long videos are never held in memory
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"Video file not found: {video_path}")
 
+    return _iter_frames(video_path, max_frames)
+
+def _iter_frames(video_path, max_frames=None):
     cap = cv2.VideoCapture(video_path)
-    frames = []
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
+    count = 0
     
-    cap.release()
-    return frames
+    try:
+        while cap.isOpened() and (max_frames is None or count < max_frames):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield frame
+    finally:
+        cap.release()
 
 def load_annotation_file(annotation_path):
     if not os.path.exists(annotation_path):
@@ -40,8 +45,9 @@ def prepare_dataset(video_path, annotation_path):
     frames = load_video_dataset(video_path)
     annotations = load_annotation_file(annotation_path)
     
-    # Prepare data for training (e.g., resizing, normalization)
-    processed_frames = [preprocess_frame(frame) for frame in frames]
+    # Prepare data for training (e.g., resizing, normalization), lazily:
+    # a list of 640x640 float32 frames would grow by ~5 MB per frame
+    processed_frames = (preprocess_frame(frame) for frame in frames)
     
     return processed_frames, annotations
 
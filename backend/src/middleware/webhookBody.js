@@ -0,0 +1,72 @@
+const zlib = require('zlib');
+const msgpack = require('../utils/msgpack');
+
+const MAX_WEBHOOK_BYTES = 10 * 1024 * 1024;
+
+// Content-Encoding values the AI service may send (zstd needs Node >= 22.15)
+const decompressors = {
+    identity: (body) => body,
+    gzip: zlib.gunzipSync,
+    deflate: zlib.inflateSync,
+    br: zlib.brotliDecompressSync,
+};
+if (typeof zlib.zstdDecompressSync === 'function') {
+    decompressors.zstd = zlib.zstdDecompressSync;
+}
+
+/**
+ * Parse AI service webhook bodies: JSON or MessagePack, optionally
+ * gzip/deflate/br/zstd-compressed. Mounted before express.json(), which
+ * skips requests this has already parsed.
+ */
+const parseWebhookBody = (req, res, next) => {
+    if (req.method !== 'POST') return next();
+
+    const encoding = (req.get('Content-Encoding') || 'identity').toLowerCase();
+    const decompress = decompressors[encoding];
+    if (!decompress) {
+        return res.status(415).json({ success: false, error: `Unsupported Content-Encoding: ${encoding}` });
+    }
+
+    const chunks = [];
+    let size = 0;
+    let aborted = false;
+
+    req.on('data', (chunk) => {
+        size += chunk.length;
+        if (size > MAX_WEBHOOK_BYTES && !aborted) {
+            aborted = true;
+            res.status(413).json({ success: false, error: 'Webhook body too large' });
+            req.destroy();
+            return;
+        }
+        chunks.push(chunk);
+    });
+
+    req.on('end', () => {
+        if (aborted) return;
+        try {
+            const body = decompress(Buffer.concat(chunks));
+            if (req.is('application/msgpack') || req.is('application/x-msgpack')) {
+                req.body = msgpack.decode(body);
+            } else if (body.length === 0) {
+                req.body = {};
+            } else {
+                req.body = JSON.parse(body.toString('utf8'));
+            }
+        } catch (error) {
+            return res.status(400).json({ success: false, error: `Invalid webhook body: ${error.message}` });
+        }
+        if (!req.body || typeof req.body !== 'object') {
+            return res.status(400).json({ success: false, error: 'Webhook body must be an object' });
+        }
+        req._body = true; // body-parser skips already-parsed requests
+        next();
+    });
+
+    req.on('error', next);
+};
+
+module.exports = {
+    parseWebhookBody,
+};
@@ -10,6 +10,7 @@ require('dotenv').config();
 
 // Services
 const socketManager = require('./services/socketManager');
+const { parseWebhookBody } = require('./middleware/webhookBody');
 
 // Routes
 const authRoutes = require('./routes/auth');
@@ -55,6 +56,8 @@ app.use(cors({
 // Handle preflight requests
 app.options('*', cors());
 
+// AI service webhooks may be MessagePack and/or compressed - parsed before express.json()
+app.use('/webhook', parseWebhookBody);
 app.use(express.json({ limit: '100mb' })); // Increased limit for video uploads
 app.use(express.urlencoded({ extended: true, limit: '100mb' })); // Increased limit
 app.use(morgan('dev')); // Logging
@@ -84,10 +87,39 @@ app.use('/api/police', require('./routes/police'));
 app.use('/api/admin', require('./routes/admin'));
 app.use('/api/dashboard', require('./routes/dashboard'));
 
+// Recently delivered AI notifications - the AI service replays its outbox
+// after outages, so the same result can arrive more than once
+const seenIdempotencyKeys = new Set();
+const MAX_IDEMPOTENCY_KEYS = 10000;
+
+function isDuplicateNotification(key) {
+    return Boolean(key) && seenIdempotencyKeys.has(key);
+}
+
+// Called only once a notification was emitted, so a failed emit can be retried
+function rememberNotification(key) {
+    if (!key) return;
+
+    seenIdempotencyKeys.add(key);
+    if (seenIdempotencyKeys.size > MAX_IDEMPOTENCY_KEYS) {
+        // Sets iterate in insertion order - evict the oldest key
+        seenIdempotencyKeys.delete(seenIdempotencyKeys.values().next().value);
+    }
+}
+
 // Webhook endpoint for AI service analysis callbacks
 app.post('/webhook/analysis-complete', async (req, res) => {
     try {
         const { incident_id, result, confidence, vehicle_count, incident_detected, detected_type } = req.body;
+        const idempotencyKey = req.get('Idempotency-Key') || req.body.idempotency_key;
+
+        if (incident_id === undefined || result === undefined) {
+            return res.status(400).json({ success: false, error: 'incident_id and result are required' });
+        }
+
+        if (isDuplicateNotification(idempotencyKey)) {
+            return res.json({ success: true, message: 'Duplicate notification ignored' });
+        }
 
         console.log(`🤖 AI Analysis webhook received for incident ${incident_id}`);
 
@@ -100,6 +132,7 @@ app.post('/webhook/analysis-complete', async (req, res) => {
             incident_detected,
             detected_type,
         });
+        rememberNotification(idempotencyKey);
 
         res.json({ success: true, message: 'Analysis notification sent' });
     } catch (error) {
@@ -108,6 +141,39 @@ app.post('/webhook/analysis-complete', async (req, res) => {
     }
 });
 
+// Batched webhook endpoint - AI service groups several results per POST
+app.post('/webhook/analysis-complete/batch', async (req, res) => {
+    try {
+        const { notifications } = req.body;
+
+        if (!Array.isArray(notifications)) {
+            return res.status(400).json({ success: false, error: 'notifications must be an array' });
+        }
+
+        console.log(`🤖 AI Analysis batch webhook received (${notifications.length} results)`);
+
+        for (const notification of notifications) {
+            if (isDuplicateNotification(notification.idempotency_key)) continue;
+
+            const { incident_id, result, confidence, vehicle_count, incident_detected, detected_type } = notification;
+            socketManager.emitAnalysisComplete({
+                incident_id,
+                result,
+                confidence,
+                vehicle_count,
+                incident_detected,
+                detected_type,
+            });
+            rememberNotification(notification.idempotency_key);
+        }
+
+        res.json({ success: true, message: `${notifications.length} analysis notifications sent` });
+    } catch (error) {
+        console.error('Batch webhook error:', error);
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
 // Health check endpoint
 app.get('/health', (req, res) => {
     res.json({
@@ -0,0 +1,82 @@
+/**
+ * Minimal MessagePack decoder for AI service webhook bodies
+ * (nil, booleans, integers, floats, strings, binary, arrays and maps)
+ */
+const decode = (buffer) => {
+    let offset = 0;
+
+    const read = (length) => {
+        if (offset + length > buffer.length) {
+            throw new Error('Truncated MessagePack data');
+        }
+        const start = offset;
+        offset += length;
+        return start;
+    };
+
+    const readArray = (length) => {
+        const items = new Array(length);
+        for (let i = 0; i < length; i++) items[i] = readValue();
+        return items;
+    };
+
+    const readMap = (length) => {
+        const map = {};
+        for (let i = 0; i < length; i++) {
+            const key = readValue();
+            map[key] = readValue();
+        }
+        return map;
+    };
+
+    const readString = (length) => buffer.toString('utf8', read(length), offset);
+    const readBinary = (length) => Buffer.from(buffer.subarray(read(length), offset));
+
+    const readValue = () => {
+        const type = buffer[read(1)];
+
+        if (type <= 0x7f) return type;                       // positive fixint
+        if (type >= 0xe0) return type - 0x100;               // negative fixint
+        if (type >= 0x80 && type <= 0x8f) return readMap(type & 0x0f);
+        if (type >= 0x90 && type <= 0x9f) return readArray(type & 0x0f);
+        if (type >= 0xa0 && type <= 0xbf) return readString(type & 0x1f);
+
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return readBinary(buffer.readUInt8(read(1)));
+            case 0xc5: return readBinary(buffer.readUInt16BE(read(2)));
+            case 0xc6: return readBinary(buffer.readUInt32BE(read(4)));
+            case 0xca: return buffer.readFloatBE(read(4));
+            case 0xcb: return buffer.readDoubleBE(read(8));
+            case 0xcc: return buffer.readUInt8(read(1));
+            case 0xcd: return buffer.readUInt16BE(read(2));
+            case 0xce: return buffer.readUInt32BE(read(4));
+            case 0xcf: return Number(buffer.readBigUInt64BE(read(8)));
+            case 0xd0: return buffer.readInt8(read(1));
+            case 0xd1: return buffer.readInt16BE(read(2));
+            case 0xd2: return buffer.readInt32BE(read(4));
+            case 0xd3: return Number(buffer.readBigInt64BE(read(8)));
+            case 0xd9: return readString(buffer.readUInt8(read(1)));
+            case 0xda: return readString(buffer.readUInt16BE(read(2)));
+            case 0xdb: return readString(buffer.readUInt32BE(read(4)));
+            case 0xdc: return readArray(buffer.readUInt16BE(read(2)));
+            case 0xdd: return readArray(buffer.readUInt32BE(read(4)));
+            case 0xde: return readMap(buffer.readUInt16BE(read(2)));
+            case 0xdf: return readMap(buffer.readUInt32BE(read(4)));
+            default:
+                throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+        }
+    };
+
+    const value = readValue();
+    if (offset !== buffer.length) {
+        throw new Error('Trailing bytes after MessagePack value');
+    }
+    return value;
+};
+
+module.exports = {
+    decode,
+};